@@ -0,0 +1,242 @@
+"""
+Crawl Sandbox - chạy crawler trong subprocess có thể kill cứng
+
+Selenium/Playwright crawlers running in threads cannot be killed when they
+hang, so Chrome processes and threads pile up in the API process. This module
+keeps a small pool of warm worker processes instead:
+
+  - every worker calls ``os.setsid()`` so it leads its own process group;
+    browsers it launches inherit that group,
+  - workers import ``run_all_crawlers`` (and with it every crawler module)
+    once at start-up, so a task does not pay for a cold import,
+  - tasks and results travel over a ``multiprocessing.Pipe``,
+  - when a task overruns its deadline the whole process group is SIGKILLed
+    and the worker is replaced by a fresh warm one.
+
+Enable it with ``CRAWL_ISOLATION=process`` (see ``run_all_crawlers``).
+"""
+
+import atexit
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+from typing import List, Optional, Tuple
+
+from crawl_telemetry import CrawlTimings
+
+CRAWL_DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds a freshly spawned worker may spend importing crawler modules.
+WORKER_STARTUP_TIMEOUT = float(os.getenv("CRAWL_SANDBOX_STARTUP_TIMEOUT", "60"))
+# Recycle a worker after this many tasks to bound leaked browser memory.
+MAX_TASKS_PER_WORKER = int(os.getenv("CRAWL_SANDBOX_MAX_TASKS", "50"))
+
+
+class CrawlTimeoutError(Exception):
+    """Crawler vượt quá thời hạn và đã bị kill"""
+
+
+class CrawlWorkerError(Exception):
+    """Worker process chết hoặc crawler raise exception"""
+
+
+def _worker_main(conn, crawl_dir: str):
+    """Entry point of a sandbox worker process."""
+    if hasattr(os, "setsid"):
+        try:
+            os.setsid()
+        except OSError:
+            pass
+    if crawl_dir not in sys.path:
+        sys.path.insert(0, crawl_dir)
+
+    # Warm start: pay for Selenium/Playwright/bs4 imports once per worker
+    import run_all_crawlers as runners
+
+    conn.send(("ready", None, None, None))
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        task_id, runner_name, platform, product_name = task
+        timings = CrawlTimings(platform)
+        try:
+            products = getattr(runners, runner_name)(product_name, timings)
+            timings.finish(len(products))
+            conn.send((task_id, "ok", products, timings))
+        except Exception as e:
+            timings.finish(0)
+            conn.send((task_id, "error", f"{type(e).__name__}: {e}", timings))
+
+
+class _Worker:
+    def __init__(self, ctx, crawl_dir: str):
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, crawl_dir), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.ready = False
+        self.tasks_done = 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        if self.ready:
+            return True
+        if self.conn.poll(timeout):
+            try:
+                status = self.conn.recv()[0]
+            except (EOFError, OSError):
+                return False
+            self.ready = status == "ready"
+        return self.ready
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        """SIGKILL the worker's whole process group (worker + browsers)."""
+        pid = self.process.pid
+        try:
+            if hasattr(os, "killpg") and pid:
+                os.killpg(pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError, OSError):
+            try:
+                self.process.kill()
+            except Exception:
+                pass
+        self.process.join(timeout=5)
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.kill()
+
+
+class CrawlerSandboxPool:
+    """Pool of warm, process-isolated crawler workers"""
+
+    def __init__(self, size: int = 4, crawl_dir: str = CRAWL_DATA_DIR,
+                 max_tasks_per_worker: int = MAX_TASKS_PER_WORKER):
+        self.size = size
+        self.crawl_dir = crawl_dir
+        self.max_tasks_per_worker = max_tasks_per_worker
+        # spawn: never fork a multi-threaded API process
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._task_counter = 0
+        self._workers = 0
+        self._closed = False
+        self.kills = 0
+
+    def start(self):
+        """Spawn ``size`` workers up front so their imports happen off the request path."""
+        with self._lock:
+            while self._workers < self.size:
+                self._idle.put(_Worker(self._ctx, self.crawl_dir))
+                self._workers += 1
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            if self._closed:
+                raise CrawlWorkerError("sandbox pool is shut down")
+            if self._idle.empty() and self._workers < self.size:
+                self._workers += 1
+                return _Worker(self._ctx, self.crawl_dir)
+        return self._idle.get()
+
+    def _release(self, worker: _Worker):
+        if self._closed or worker.tasks_done >= self.max_tasks_per_worker or not worker.is_alive():
+            worker.close()
+            self._replace()
+            return
+        self._idle.put(worker)
+
+    def _replace(self):
+        with self._lock:
+            if self._closed:
+                self._workers -= 1
+                return
+        # Warm replacement keeps the pool size constant
+        self._idle.put(_Worker(self._ctx, self.crawl_dir))
+
+    def run(self, runner_name: str, platform: str, product_name: str,
+            timeout: float) -> Tuple[List, CrawlTimings]:
+        """Run ``run_all_crawlers.<runner_name>`` in a worker; kill it on overrun."""
+        worker = self._acquire()
+        if not worker.wait_ready(WORKER_STARTUP_TIMEOUT):
+            worker.kill()
+            self._replace()
+            raise CrawlWorkerError(f"sandbox worker for {platform} failed to start")
+
+        with self._lock:
+            self._task_counter += 1
+            task_id = self._task_counter
+
+        try:
+            worker.conn.send((task_id, runner_name, platform, product_name))
+            if not worker.conn.poll(timeout):
+                worker.kill()
+                self.kills += 1
+                self._replace()
+                raise CrawlTimeoutError(f"{platform} crawl exceeded {timeout:.0f}s and was killed")
+            _, status, payload, timings = worker.conn.recv()
+        except (EOFError, BrokenPipeError, OSError) as e:
+            worker.kill()
+            self._replace()
+            raise CrawlWorkerError(f"sandbox worker for {platform} died: {e}")
+
+        worker.tasks_done += 1
+        self._release(worker)
+        if status != "ok":
+            raise CrawlWorkerError(payload)
+        return payload, timings
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.close()
+
+
+_pool: Optional[CrawlerSandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> CrawlerSandboxPool:
+    """Return the process-wide sandbox pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CrawlerSandboxPool(size=int(os.getenv("CRAWL_SANDBOX_WORKERS", "4")))
+            _pool.start()
+            atexit.register(shutdown_sandbox_pool)
+        return _pool
+
+
+def shutdown_sandbox_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
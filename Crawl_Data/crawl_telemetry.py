@@ -0,0 +1,181 @@
+"""
+Crawl Telemetry - đo thời gian từng giai đoạn crawl
+
+Each crawler receives a ``CrawlTimings`` and wraps its phases in
+``timings.stage(...)``:
+
+    acquire     browser / driver / HTTP session acquisition
+    navigation  loading the search page or API response
+    wait        explicit waits, sleeps and scrolling for client rendering
+    extraction  reading the DOM or JSON payload
+    parse       turning raw items into ProductRecord
+
+Crawlers with more than one extraction strategy also set ``timings.path``
+(``"http"`` or ``"browser"``) so hit rates per path are tracked.
+
+Long linear blocks (Playwright pages) can use ``timings.mark()`` followed by
+``timings.lap("stage")`` instead, which charges the time since the previous
+mark to that stage.
+
+``run_all_crawlers_parallel`` records every finished ``CrawlTimings`` into the
+process-wide ``telemetry`` object, which keeps rolling histograms per
+platform and stage for the admin endpoint and the CLI summary.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+STAGES = ("acquire", "navigation", "wait", "extraction", "parse")
+
+# Bucket upper bounds in seconds; the last bucket is open-ended.
+HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+# Number of most recent crawls kept per platform/stage.
+ROLLING_WINDOW = 200
+
+
+class CrawlTimings:
+    """Thời gian các giai đoạn của một lần crawl trên một platform"""
+
+    def __init__(self, platform: str):
+        self.platform = platform
+        self.stages: Dict[str, float] = {}
+        self.product_count = 0
+        self.total_seconds: Optional[float] = None
+        # Extraction path that served the crawl ("http", "browser", ...), if any
+        self.path: Optional[str] = None
+        self._started = time.perf_counter()
+        self._last_mark = self._started
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def mark(self):
+        self._last_mark = time.perf_counter()
+
+    def lap(self, name: str):
+        now = time.perf_counter()
+        self.add(name, now - self._last_mark)
+        self._last_mark = now
+
+    def finish(self, product_count: int) -> "CrawlTimings":
+        self.product_count = product_count
+        self.total_seconds = time.perf_counter() - self._started
+        return self
+
+    def to_dict(self) -> Dict:
+        return {
+            "platform": self.platform,
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            "total_seconds": round(self.total_seconds, 3) if self.total_seconds is not None else None,
+            "product_count": self.product_count,
+            "path": self.path,
+        }
+
+
+class RollingHistogram:
+    """Histogram over the last ``window`` samples (seconds)"""
+
+    def __init__(self, window: int = ROLLING_WINDOW):
+        self._samples = deque(maxlen=window)
+
+    def add(self, value: float):
+        self._samples.append(value)
+
+    def summary(self, with_buckets: bool = True) -> Dict:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(p: float) -> float:
+            idx = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+            return round(samples[idx], 3)
+
+        result = {
+            "count": len(samples),
+            "mean": round(sum(samples) / len(samples), 3),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "max": round(samples[-1], 3),
+        }
+        if with_buckets:
+            buckets = {}
+            for bound in HISTOGRAM_BUCKETS:
+                buckets[f"le_{bound:g}s"] = sum(1 for s in samples if s <= bound)
+            buckets["le_inf"] = len(samples)
+            result["buckets"] = buckets
+        return result
+
+
+class CrawlTelemetry:
+    """Tổng hợp CrawlTimings theo platform (thread-safe)"""
+
+    def __init__(self, window: int = ROLLING_WINDOW):
+        self._window = window
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[str, RollingHistogram]] = {}
+        self._product_counts: Dict[str, RollingHistogram] = {}
+        self._runs: Dict[str, int] = {}
+        self._paths: Dict[str, Dict[str, int]] = {}
+
+    def _histogram(self, platform: str, stage: str) -> RollingHistogram:
+        per_platform = self._histograms.setdefault(platform, {})
+        if stage not in per_platform:
+            per_platform[stage] = RollingHistogram(self._window)
+        return per_platform[stage]
+
+    def record(self, timings: CrawlTimings):
+        with self._lock:
+            platform = timings.platform
+            self._runs[platform] = self._runs.get(platform, 0) + 1
+            for stage, seconds in timings.stages.items():
+                self._histogram(platform, stage).add(seconds)
+            if timings.total_seconds is not None:
+                self._histogram(platform, "total").add(timings.total_seconds)
+            if platform not in self._product_counts:
+                self._product_counts[platform] = RollingHistogram(self._window)
+            self._product_counts[platform].add(float(timings.product_count))
+            if timings.path:
+                per_platform = self._paths.setdefault(platform, {})
+                per_platform[timings.path] = per_platform.get(timings.path, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            platforms = {}
+            for platform, stages in self._histograms.items():
+                counts = self._product_counts.get(platform)
+                platforms[platform] = {
+                    "runs": self._runs.get(platform, 0),
+                    "stages": {stage: hist.summary() for stage, hist in stages.items()},
+                    "product_count": counts.summary(with_buckets=False) if counts else {"count": 0},
+                }
+            paths = {}
+            for platform, counts in self._paths.items():
+                total = sum(counts.values())
+                paths[platform] = {
+                    "counts": dict(counts),
+                    "hit_rates": {path: round(n / total, 3) for path, n in counts.items()},
+                }
+            return {"window": self._window, "platforms": platforms, "paths": paths}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._product_counts.clear()
+            self._runs.clear()
+            self._paths.clear()
+
+
+# Process-wide telemetry shared by run_all_crawlers and the admin API
+telemetry = CrawlTelemetry()
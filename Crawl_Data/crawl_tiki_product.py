@@ -1,18 +1,70 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import requests
 from datetime import datetime
 
+try:
+    from product_record import Platform, ProductRecord
+    from crawl_telemetry import CrawlTimings
+except ImportError:
+    from Crawl_Data.product_record import Platform, ProductRecord
+    from Crawl_Data.crawl_telemetry import CrawlTimings
+
 # Tiki API configuration (copied so this module is independent)
 TIKI_API_URL = "https://tiki.vn/api/v2/products"
 headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 
-def crawl_tiki_product(product_name: str) -> List[Dict]:
+def _parse_tiki_items(items: List[Dict], current_time: str) -> List[ProductRecord]:
+    """Convert Tiki API items into ProductRecord, skipping incomplete ones"""
+    products = []
+    for idx, item in enumerate(items, 1):
+        # Skip invalid or incomplete products
+        required_fields = ["name", "price", "url_path"]
+        if not all(item.get(field) for field in required_fields):
+            continue
+        
+        # Process price information
+        current_price = item.get('price', 0)
+        original_price = item.get('original_price', current_price)
+        discount_rate = item.get('discount_rate', 0)
+        
+        # Process seller information
+        seller_info = item.get("seller", {})
+        seller_name = seller_info.get("name", item.get("seller_name", "Unknown Seller"))
+        
+        # Create unique product ID
+        product_id = f"tiki_{int(datetime.now().timestamp())}_{idx}"
+        
+        # Badges/promotions and shipping text are optional on Tiki
+        badges = item.get("badge", {})
+        product = ProductRecord(
+            id=product_id,
+            name=item.get("name").strip(),
+            price=int(current_price or 0),
+            original_price=int(original_price or 0),
+            discount_rate=int(discount_rate or 0),
+            seller=seller_name,
+            rating=float(item.get('rating_average', 0) or 0),
+            review_count=int(item.get("review_count", 0) or 0),
+            sold_count=int((item.get("quantity_sold") or {}).get("value", 0) or 0),
+            url=f"https://tiki.vn/{item.get('url_path')}",
+            timestamp=current_time,
+            platform=Platform.TIKI,
+            image=item.get("thumbnail_url") or None,
+            badges=tuple(badge.get("text", "") for badge in badges if badge.get("text")) if badges else (),
+            shipping=item.get("shipping_text") or None,
+        )
+        products.append(product)
+    return products
+
+
+def crawl_tiki_product(product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
     """
     Crawl product information from Tiki API and process it directly
     Returns a list of processed products ready for vector database and analysis
     """
+    timings = timings or CrawlTimings(Platform.TIKI.value)
     params = {
         "q": product_name,
         "limit": 5,  # Increased for better coverage
@@ -21,55 +73,15 @@ def crawl_tiki_product(product_name: str) -> List[Dict]:
     }
     
     try:
-        response = requests.get(TIKI_API_URL, headers=headers, params=params)
+        with timings.stage("navigation"):
+            response = requests.get(TIKI_API_URL, headers=headers, params=params)
         if response.status_code == 200:
-            data = response.json()
-            products = []
+            with timings.stage("extraction"):
+                data = response.json()
             current_time = datetime.now().isoformat()
             
-            for idx, item in enumerate(data.get("data", []), 1):
-                # Skip invalid or incomplete products
-                required_fields = ["name", "price", "url_path"]
-                if not all(item.get(field) for field in required_fields):
-                    continue
-                
-                # Process price information
-                current_price = item.get('price', 0)
-                original_price = item.get('original_price', current_price)
-                discount_rate = item.get('discount_rate', 0)
-                
-                # Process seller information
-                seller_info = item.get("seller", {})
-                seller_name = seller_info.get("name", item.get("seller_name", "Unknown Seller"))
-                
-                # Create unique product ID
-                product_id = f"tiki_{int(datetime.now().timestamp())}_{idx}"
-                
-                # Build product information dictionary
-                product = {
-                    "id": product_id,  # Add unique ID
-                    "name": item.get("name").strip(),
-                    "price": current_price,
-                    "original_price": original_price,
-                    "discount": f"-{discount_rate}%" if discount_rate > 0 else "Không giảm giá",
-                    "seller": seller_name,
-                    "rating": f"{item.get('rating_average', 0):.1f}",
-                    "review_count": item.get("review_count", 0),
-                    "url": f"https://tiki.vn/{item.get('url_path')}",
-                    "timestamp": current_time,
-                    "platform": "tiki"
-                }
-                
-                # Add badges and promotions if available
-                badges = item.get("badge", {})
-                if badges:
-                    product["badges"] = [badge.get("text", "") for badge in badges if badge.get("text")]
-                    
-                # Add shipping info if available
-                if item.get("shipping_text"):
-                    product["shipping"] = item.get("shipping_text")
-                
-                products.append(product)
+            with timings.stage("parse"):
+                products = _parse_tiki_items(data.get("data", []), current_time)
             
             if products:
                 print(f"Tìm thấy {len(products)} sản phẩm phù hợp trên Tiki")
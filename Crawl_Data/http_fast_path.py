@@ -0,0 +1,287 @@
+"""
+HTTP Fast Path - lấy sản phẩm từ HTML server-side, không cần Chromium
+
+CellphoneS and Điện Thoại Vui were always rendered in headless Chromium even
+though the search page HTML usually already carries the product list, either
+as embedded JSON (JSON-LD, ``__NEXT_DATA__``, ``__NUXT_DATA__``/initial-state
+blobs) or as static markup. ``fast_scrape`` fetches the page with a pooled
+``requests.Session`` and tries those sources in that order. It returns raw
+items in the same shape as the Playwright ``scrape`` functions
+(title/url/price/image/rating/review_count/sold_count), so callers can fall
+back to the browser when it yields too few items.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+try:
+    from crawl_telemetry import CrawlTimings
+    from product_record import parse_count, parse_rating
+except ImportError:
+    from Crawl_Data.crawl_telemetry import CrawlTimings
+    from Crawl_Data.product_record import parse_count, parse_rating
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept-Language": "vi-VN,vi;q=0.9,en;q=0.8",
+}
+
+# Dùng fast path khi có ít nhất số sản phẩm này; ít hơn thì fallback Playwright
+FAST_PATH_MIN_ITEMS = int(os.getenv("CRAWL_FAST_PATH_MIN_ITEMS", "3"))
+FAST_PATH_ENABLED = os.getenv("CRAWL_HTTP_FAST_PATH", "1") != "0"
+FAST_PATH_TIMEOUT = float(os.getenv("CRAWL_FAST_PATH_TIMEOUT", "8"))
+
+_PRICE_RE = re.compile(r"(\d{1,3}(?:[\.,]\d{3})+|\d{5,})\s*(?:đ|₫|vnđ|vnd)?", re.I)
+_STATE_RE = re.compile(
+    r"(?:window\.__(?:INITIAL_STATE|PRELOADED_STATE|APOLLO_STATE)__|window\.__NUXT__)\s*=\s*",
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Pooled keep-alive session shared by all fast-path fetches."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=1)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+
+def extract_price(text) -> Optional[float]:
+    """Return the first VND amount in ``text`` (numbers pass through)."""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text) if text > 0 else None
+    m = _PRICE_RE.search(str(text).replace('\xa0', ' '))
+    if not m:
+        return None
+    try:
+        return float(m.group(1).replace('.', '').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _first_str(obj: Dict, keys: Iterable[str]) -> Optional[str]:
+    for key in keys:
+        value = obj.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+        if isinstance(value, list) and value and isinstance(value[0], str):
+            return value[0]
+        if isinstance(value, dict):
+            nested = value.get("url") or value.get("src")
+            if isinstance(nested, str):
+                return nested
+    return None
+
+
+def _absolute(base_url: str, url: Optional[str]) -> Optional[str]:
+    return urljoin(base_url, url) if url else None
+
+
+def _item(title, url, price, image=None, rating=0.0, review_count=0, sold_count="0") -> Dict:
+    return {
+        'title': title,
+        'url': url,
+        'price': price,
+        'image': image,
+        'rating': rating or 0.0,
+        'review_count': review_count or 0,
+        'sold_count': sold_count or "0",
+    }
+
+
+def _items_from_jsonld(soup: BeautifulSoup, base_url: str) -> List[Dict]:
+    items = []
+
+    def walk(node):
+        if isinstance(node, list):
+            for child in node:
+                walk(child)
+            return
+        if not isinstance(node, dict):
+            return
+        types = node.get("@type")
+        types = types if isinstance(types, list) else [types]
+        if "Product" in types and node.get("name"):
+            offers = node.get("offers") or {}
+            if isinstance(offers, list):
+                offers = offers[0] if offers else {}
+            rating = node.get("aggregateRating") or {}
+            url = node.get("url") or offers.get("url")
+            if url:
+                items.append(_item(
+                    str(node["name"]).strip(),
+                    urljoin(base_url, url),
+                    extract_price(offers.get("price") or offers.get("lowPrice")),
+                    _absolute(base_url, _first_str(node, ("image",))),
+                    parse_rating(rating.get("ratingValue")),
+                    parse_count(rating.get("reviewCount") or rating.get("ratingCount")),
+                ))
+        for key in ("itemListElement", "item", "@graph", "mainEntity"):
+            if key in node:
+                walk(node[key])
+
+    for script in soup.select('script[type="application/ld+json"]'):
+        try:
+            walk(json.loads(script.string or script.get_text() or ""))
+        except (ValueError, TypeError):
+            continue
+    return items
+
+
+def _items_from_state(obj, base_url: str) -> List[Dict]:
+    """Walk an embedded app-state blob and pick product-looking dicts."""
+    items = []
+
+    def walk(node, depth=0):
+        if depth > 25:
+            return
+        if isinstance(node, list):
+            for child in node:
+                walk(child, depth + 1)
+            return
+        if not isinstance(node, dict):
+            return
+        title = _first_str(node, ("name", "title", "product_name"))
+        url = _first_str(node, ("url", "url_path", "link", "product_url", "slug", "url_key"))
+        price = None
+        for key in ("special_price", "price", "final_price", "sale_price", "current_price"):
+            value = node.get(key)
+            if isinstance(value, dict):
+                value = value.get("value") or value.get("amount")
+            price = extract_price(value)
+            if price:
+                break
+        if title and url and price:
+            if not url.startswith(("http", "/")):
+                # slug / url_key values are site-root relative
+                url = "/" + url
+                if "." not in url.rsplit("/", 1)[-1]:
+                    url += ".html"
+            items.append(_item(
+                title,
+                urljoin(base_url, url),
+                price,
+                _absolute(base_url, _first_str(node, ("thumbnail", "image", "image_url", "thumbnail_url"))),
+                parse_rating(node.get("rating_average") or node.get("rating")),
+                parse_count(node.get("review_count") or node.get("total_review")),
+            ))
+            return
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                walk(value, depth + 1)
+
+    walk(obj)
+    return items
+
+
+def _state_blobs(html: str, soup: BeautifulSoup) -> List:
+    blobs = []
+    for selector in ('script#__NEXT_DATA__', 'script#__NUXT_DATA__', 'script[type="application/json"]'):
+        for script in soup.select(selector):
+            try:
+                blobs.append(json.loads(script.string or script.get_text() or ""))
+            except (ValueError, TypeError):
+                continue
+    decoder = json.JSONDecoder()
+    for m in _STATE_RE.finditer(html):
+        try:
+            blob, _ = decoder.raw_decode(html, m.end())
+            blobs.append(blob)
+        except ValueError:
+            continue
+    return blobs
+
+
+def _items_from_markup(soup: BeautifulSoup, base_url: str, markup: Dict[str, List[str]]) -> List[Dict]:
+    items = []
+    containers = []
+    for selector in markup.get("item", []):
+        containers = soup.select(selector)
+        if containers:
+            break
+    for el in containers:
+        a = el.select_one('a[href]')
+        if not a:
+            continue
+        title_el = None
+        for selector in markup.get("title", []):
+            title_el = el.select_one(selector)
+            if title_el:
+                break
+        title = (title_el or a).get_text(" ", strip=True)
+        price = None
+        for selector in markup.get("price", []):
+            node = el.select_one(selector)
+            if node:
+                price = extract_price(node.get('data-price') or node.get_text(" ", strip=True))
+                if price:
+                    break
+        if price is None:
+            price = extract_price(el.get_text(" ", strip=True))
+        img_el = el.select_one('img')
+        img = None
+        if img_el:
+            src = img_el.get('src') or img_el.get('data-src') or img_el.get('data-lazy-src')
+            if src and not src.startswith('data:'):
+                img = urljoin(base_url, src)
+        if title:
+            items.append(_item(title, urljoin(base_url, a['href']), price, img))
+    return items
+
+
+def fast_scrape(search_url: str, limit: Optional[int] = None, markup: Optional[Dict[str, List[str]]] = None,
+                timings: Optional[CrawlTimings] = None) -> List[Dict]:
+    """Fetch ``search_url`` over plain HTTP and extract products without a browser.
+
+    Returns an empty list (never raises) when the page cannot be fetched or
+    nothing product-like is found, so the caller can fall back to Playwright.
+    """
+    if not FAST_PATH_ENABLED:
+        return []
+    timings = timings or CrawlTimings("http")
+    try:
+        with timings.stage("navigation"):
+            response = get_session().get(search_url, timeout=FAST_PATH_TIMEOUT)
+        if response.status_code != 200:
+            return []
+        with timings.stage("extraction"):
+            html = response.text
+            soup = BeautifulSoup(html, "html.parser")
+            candidates = _items_from_jsonld(soup, search_url)
+            if len(candidates) < FAST_PATH_MIN_ITEMS:
+                for blob in _state_blobs(html, soup):
+                    candidates.extend(_items_from_state(blob, search_url))
+            if len(candidates) < FAST_PATH_MIN_ITEMS and markup:
+                candidates.extend(_items_from_markup(soup, search_url, markup))
+    except Exception as e:
+        print(f"HTTP fast path lỗi cho {search_url}: {e}")
+        return []
+
+    results = []
+    seen = set()
+    for item in candidates:
+        if not item.get('title') or item.get('price') is None or item['url'] in seen:
+            continue
+        seen.add(item['url'])
+        results.append(item)
+        if limit is not None and len(results) >= limit:
+            break
+    return results
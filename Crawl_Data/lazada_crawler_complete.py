@@ -15,7 +15,22 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from time import sleep
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+try:
+    from product_record import Platform, ProductRecord, parse_count, parse_price, parse_rating
+    from crawl_telemetry import CrawlTimings
+    from http_fast_path import get_session
+except ImportError:
+    from Crawl_Data.product_record import Platform, ProductRecord, parse_count, parse_price, parse_rating
+    from Crawl_Data.crawl_telemetry import CrawlTimings
+    from Crawl_Data.http_fast_path import get_session
+
+# "json" (mặc định): gọi catalog listing JSON trước, chỉ dùng Selenium khi thất bại
+# "selenium": luôn render bằng Chrome như trước
+LAZADA_CRAWL_MODE = os.getenv("LAZADA_CRAWL_MODE", "json")
+LAZADA_JSON_TIMEOUT = float(os.getenv("LAZADA_JSON_TIMEOUT", "10"))
+PRODUCT_LIMIT = 5
 
 # Simplified logging
 def print_log(message):
@@ -27,6 +42,7 @@ class LazadaCrawler:
     
     def __init__(self):
         self.base_url = "https://www.lazada.vn/catalog/?q={keyword}&page={page}"
+        self.listing_url = "https://www.lazada.vn/catalog/?ajax=true&q={keyword}&page={page}"
         self.domain = "https://www.lazada.vn"
         
     def filter_keyword(self, keyword: str) -> str:
@@ -49,8 +65,9 @@ class LazadaCrawler:
         ts = ct.timestamp()
         return str(int(ts))
     
-    def create_web_driver(self, url: str) -> WebDriver:
+    def create_web_driver(self, url: str, timings: Optional[CrawlTimings] = None) -> WebDriver:
         """Tạo Chrome WebDriver ở chế độ headless"""
+        timings = timings or CrawlTimings(Platform.LAZADA.value)
         chrome_options = Options()
         chrome_options.add_argument("--headless")
         chrome_options.add_argument("--no-sandbox")
@@ -65,14 +82,17 @@ class LazadaCrawler:
             "profile.default_content_setting_values.notifications": 2
         })
         
-        driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()), 
-            options=chrome_options
-        )
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        driver.get(url)
-        WebDriverWait(driver, 5)
-        sleep(2)
+        with timings.stage("acquire"):
+            driver = webdriver.Chrome(
+                service=Service(ChromeDriverManager().install()), 
+                options=chrome_options
+            )
+            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        with timings.stage("navigation"):
+            driver.get(url)
+        with timings.stage("wait"):
+            WebDriverWait(driver, 5)
+            sleep(2)
         return driver
     
     def get_product_names(self, soup: BeautifulSoup) -> ResultSet:
@@ -159,8 +179,8 @@ class LazadaCrawler:
         except (IndexError, AttributeError, ValueError):
             return 0
     
-    def get_product_info_json(self, soup: BeautifulSoup):
-        """Trích xuất thông tin sản phẩm và trả về list dict với format giống crawl_tiki_product"""
+    def get_product_info_json(self, soup: BeautifulSoup) -> List[ProductRecord]:
+        """Trích xuất thông tin sản phẩm và trả về list ProductRecord giống crawl_tiki_product"""
         name_items = self.get_product_names(soup)
         price_items = self.get_price_items(soup)
         sold_items = self.get_historical_sold(soup)
@@ -179,17 +199,7 @@ class LazadaCrawler:
                 
                 # Xử lý giá
                 price_text = price_items[index].text.strip() if index < len(price_items) else "0"
-                # Trích xuất số từ text giá (loại bỏ ký tự không phải số)
-                import re
-                price_numbers = re.findall(r'[\d,\.]+', price_text.replace('₫', '').replace('đ', ''))
-                current_price = 0
-                if price_numbers:
-                    try:
-                        # Lấy số đầu tiên, loại bỏ dấu phẩy/chấm
-                        price_str = price_numbers[0].replace(',', '').replace('.', '')
-                        current_price = int(price_str)
-                    except (ValueError, IndexError):
-                        current_price = 0
+                current_price = parse_price(price_text)
                 
                 sold = self.get_sold_item_at_index(index, sold_items)
                 origin = product_origin[index].text.strip() if index < len(product_origin) else "Unknown Seller"
@@ -199,33 +209,24 @@ class LazadaCrawler:
                 review_count = self.get_review_count_at_index(index, review_items)
                 
                 # Lấy link sản phẩm
-                link = name_items[index].get('href', '').strip()
-                if link:
-                    if link.startswith('/'):
-                        link = self.domain + link
-                    elif link.startswith('//'):
-                        link = 'https:' + link
-                else:
-                    link = 'N/A'
+                link = self.normalize_link(name_items[index].get('href', ''))
                 
                 # Tạo unique product ID
                 product_id = f"lazada_{int(datetime.datetime.now().timestamp())}_{index}"
                 
-                # Tạo product dict với format giống crawl_tiki_product
-                product = {
-                    "id": product_id,
-                    "name": name,
-                    "price": current_price,
-                    "original_price": current_price,  # Lazada không có giá gốc rõ ràng
-                    "discount": "Không giảm giá",  # Có thể cập nhật sau nếu có thông tin
-                    "seller": origin,
-                    "rating": f"{rating:.1f}",
-                    "review_count": review_count,
-                    "url": link,
-                    "timestamp": current_time,
-                    "platform": "lazada",
-                    "sold_count": sold
-                }
+                product = ProductRecord(
+                    id=product_id,
+                    name=name,
+                    price=current_price,
+                    original_price=current_price,  # Lazada không có giá gốc rõ ràng
+                    seller=origin,
+                    rating=rating,
+                    review_count=review_count,
+                    sold_count=parse_count(sold),
+                    url=link,
+                    timestamp=current_time,
+                    platform=Platform.LAZADA,
+                )
                 products.append(product)
                 
             except (IndexError, AttributeError) as e:
@@ -234,6 +235,86 @@ class LazadaCrawler:
         
         return products
 
+    def normalize_link(self, link: str) -> str:
+        """Chuẩn hóa link sản phẩm về URL tuyệt đối"""
+        link = (link or '').strip()
+        if not link:
+            return 'N/A'
+        if link.startswith('//'):
+            return 'https:' + link
+        if link.startswith('/'):
+            return self.domain + link
+        return link
+
+    def get_product_info_from_listing(self, data: Dict) -> List[ProductRecord]:
+        """Map catalog listing JSON (``?ajax=true``) sang ProductRecord giống get_product_info_json"""
+        items = ((data or {}).get('mods') or {}).get('listItems') or []
+        products = []
+        current_time = datetime.datetime.now().isoformat()
+        
+        for index, item in enumerate(items):
+            name = (item.get('name') or '').strip()
+            if not name:
+                continue
+            
+            current_price = parse_price(str(item.get('price') or '0').split('.')[0]) or parse_price(item.get('priceShow'))
+            original_price = parse_price(str(item.get('originalPrice') or '0').split('.')[0]) or current_price
+            discount_rate = parse_count(item.get('discount')) if str(item.get('discount') or '').strip().startswith('-') else 0
+            
+            product = ProductRecord(
+                id=f"lazada_{item.get('itemId') or int(datetime.datetime.now().timestamp())}_{index}",
+                name=name,
+                price=current_price,
+                original_price=original_price,
+                discount_rate=discount_rate,
+                seller=item.get('sellerName') or item.get('location') or "Unknown Seller",
+                rating=parse_rating(item.get('ratingScore')),
+                review_count=parse_count(item.get('review')),
+                sold_count=parse_count(item.get('itemSoldCntShow')),
+                url=self.normalize_link(item.get('itemUrl') or item.get('productUrl')),
+                timestamp=current_time,
+                platform=Platform.LAZADA,
+                image=item.get('image') or None,
+            )
+            products.append(product)
+        
+        return products
+
+    def fetch_listing_json(self, keyword: str, page: int, timings: Optional[CrawlTimings] = None) -> Dict:
+        """Gọi catalog listing JSON qua HTTP session dùng chung (không cần Chrome)"""
+        timings = timings or CrawlTimings(Platform.LAZADA.value)
+        url = self.listing_url.format(keyword=keyword, page=page)
+        with timings.stage("navigation"):
+            response = get_session().get(
+                url,
+                headers={
+                    "Accept": "application/json, text/plain, */*",
+                    "X-Requested-With": "XMLHttpRequest",
+                    "Referer": self.base_url.format(keyword=keyword, page=page),
+                },
+                timeout=LAZADA_JSON_TIMEOUT,
+            )
+        response.raise_for_status()
+        with timings.stage("extraction"):
+            # Lazada trả về trang HTML (captcha/punish) thay vì JSON khi bị chặn
+            return response.json()
+
+    def crawl_lazada_products_json(self, product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
+        """Crawl bằng catalog listing JSON; raise nếu endpoint không trả về JSON hợp lệ"""
+        timings = timings or CrawlTimings(Platform.LAZADA.value)
+        filtered_keyword = self.filter_keyword(product_name)
+        all_products = []
+        
+        for page in range(1, 3):  # Crawl tối đa 2 trang
+            data = self.fetch_listing_json(filtered_keyword, page, timings)
+            with timings.stage("parse"):
+                products = self.get_product_info_from_listing(data)
+            all_products.extend(products[:PRODUCT_LIMIT - len(all_products)])
+            if len(all_products) >= PRODUCT_LIMIT or not products:
+                break
+        
+        return all_products
+
     def get_product_info(self, soup: BeautifulSoup):
         """Trích xuất toàn bộ thông tin sản phẩm (CSV format - legacy)"""
         name_items = self.get_product_names(soup)
@@ -249,14 +330,7 @@ class LazadaCrawler:
                 origin = product_origin[index].text.strip() if index < len(product_origin) else "N/A"
                 
                 # Lấy link sản phẩm
-                link = name_items[index].get('href', '').strip()
-                if link:
-                    if link.startswith('/'):
-                        link = self.domain + link
-                    elif link.startswith('//'):
-                        link = 'https:' + link
-                else:
-                    link = 'N/A'
+                link = self.normalize_link(name_items[index].get('href', ''))
                 
                 product_info = f"{name} | {price} | {sold} | {origin} | {link}\n"
                 yield product_info
@@ -264,11 +338,31 @@ class LazadaCrawler:
             except (AttributeError, IndexError):
                 continue
     
-    def crawl_lazada_products(self, product_name: str) -> List[Dict]:
+    def crawl_lazada_products(self, product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
         """
-        Crawl sản phẩm từ Lazada và trả về list dict với format giống crawl_tiki_product
+        Crawl sản phẩm từ Lazada và trả về list ProductRecord giống crawl_tiki_product
         Giới hạn chỉ lấy 5 sản phẩm
+
+        Ở chế độ "json" thử catalog listing JSON trước; Selenium chỉ chạy khi
+        JSON lỗi hoặc không có sản phẩm.
         """
+        timings = timings or CrawlTimings(Platform.LAZADA.value)
+        if LAZADA_CRAWL_MODE == "json":
+            try:
+                products = self.crawl_lazada_products_json(product_name, timings)
+                if products:
+                    timings.path = "json"
+                    print(f"Tìm thấy {len(products)} sản phẩm từ Lazada (JSON)")
+                    return products
+                print("Lazada JSON không có sản phẩm, chuyển sang Selenium")
+            except Exception as e:
+                print(f"Lazada JSON lỗi ({e}), chuyển sang Selenium")
+        timings.path = "browser"
+        return self.crawl_lazada_products_selenium(product_name, timings)
+
+    def crawl_lazada_products_selenium(self, product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
+        """Crawl bằng headless Chrome và đọc DOM (CSS class bị obfuscate)"""
+        timings = timings or CrawlTimings(Platform.LAZADA.value)
         try:
             filtered_keyword = self.filter_keyword(product_name)
             all_products = []
@@ -276,11 +370,13 @@ class LazadaCrawler:
             for page in range(1, 3):  # Crawl tối đa 2 trang
                 url = self.base_url.format(keyword=filtered_keyword, page=page)
                 
-                driver = self.create_web_driver(url)
-                html = driver.execute_script("return document.getElementsByTagName('html')[0].innerHTML")
-                soup = BeautifulSoup(html, "html.parser")
+                driver = self.create_web_driver(url, timings)
+                with timings.stage("extraction"):
+                    html = driver.execute_script("return document.getElementsByTagName('html')[0].innerHTML")
+                    soup = BeautifulSoup(html, "html.parser")
                 
-                products = self.get_product_info_json(soup)
+                with timings.stage("parse"):
+                    products = self.get_product_info_json(soup)
                 
                 # Thêm từng sản phẩm và kiểm tra giới hạn
                 for product in products:
@@ -295,7 +391,8 @@ class LazadaCrawler:
                     break
                 
                 if page < 2:
-                    sleep(2)
+                    with timings.stage("wait"):
+                        sleep(2)
             
             # Đảm bảo chỉ trả về tối đa 5 sản phẩm
             all_products = all_products[:5]
@@ -365,8 +462,24 @@ class LazadaCrawler:
 
 
 def main():
-    """Hàm main để chạy chương trình"""
+    """Hàm main để chạy chương trình
+
+    ``--fixture path.json`` map một listing JSON đã lưu (không cần mạng),
+    tiện để kiểm tra get_product_info_from_listing khi Lazada đổi format.
+    """
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fixture', required=False)
+    args = parser.parse_args()
+
     crawler = LazadaCrawler()
+    if args.fixture:
+        with open(args.fixture, 'r', encoding='utf-8') as f:
+            products = crawler.get_product_info_from_listing(json.load(f))
+        sys.stdout.buffer.write(json.dumps([p.to_dict() for p in products], ensure_ascii=False, indent=2).encode('utf-8'))
+        return
     crawler.run_interactive()
 
 
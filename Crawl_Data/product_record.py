@@ -0,0 +1,250 @@
+"""
+Product Record - kiểu dữ liệu sản phẩm dùng chung cho tất cả crawler
+
+Every crawler used to build a loose dict with ``rating`` as a formatted
+string, ``sold_count`` as free text and ``price`` as int or float, so every
+consumer had to re-parse those fields. ``ProductRecord`` keeps them numeric
+from the moment a crawler parses the page until an edge (JSON output, LLM
+prompt, SQL row, vector metadata) asks for a serialized form.
+"""
+
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
+NO_DISCOUNT_TEXT = "Không giảm giá"
+# Tham số query xác định biến thể listing (spid của Tiki); còn lại là tracking
+KEY_QUERY_PARAMS = ("spid", "sku", "id", "product_id")
+# Đổi theo mỗi lần crawl (id "<platform>_<epoch>_<idx>", timestamp, link ảnh CDN, dòng giao hàng):
+# không đưa vào text embed, nếu không sản phẩm không đổi vẫn bị embed lại mỗi lần crawl
+PER_CRAWL_FIELDS = ("id", "timestamp", "image", "shipping")
+
+
+class Platform(str, Enum):
+    """Sàn thương mại điện tử nguồn của sản phẩm"""
+
+    TIKI = "tiki"
+    LAZADA = "lazada"
+    CELLPHONES = "cellphones"
+    DIENTHOAIVUI = "dienthoaivui"
+    UNKNOWN = "unknown"
+
+    @classmethod
+    def parse(cls, value: Any) -> "Platform":
+        if isinstance(value, cls):
+            return value
+        try:
+            return cls(str(value or "").strip().lower())
+        except ValueError:
+            return cls.UNKNOWN
+
+
+def parse_price(value: Any) -> int:
+    """Parse a VND price (``15990000``, ``"15.990.000₫"``, ``1.599e7``) into an int."""
+    if value is None or isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    numbers = re.findall(r'[\d,\.]+', str(value).replace('₫', '').replace('đ', ''))
+    if not numbers:
+        return 0
+    try:
+        return int(numbers[0].replace(',', '').replace('.', ''))
+    except ValueError:
+        return 0
+
+
+def parse_rating(value: Any) -> float:
+    """Parse a 0-5 rating from a number or text such as ``"4.5"`` or ``"4,5 sao"``."""
+    if value is None or isinstance(value, bool):
+        return 0.0
+    if isinstance(value, (int, float)):
+        rating = float(value)
+    else:
+        m = re.search(r'(\d+(?:[\.,]\d+)?)', str(value))
+        if not m:
+            return 0.0
+        rating = float(m.group(1).replace(',', '.'))
+    return rating if 0 <= rating <= 5 else 0.0
+
+
+def parse_count(value: Any) -> int:
+    """Parse counts such as ``"1,2k đã bán"``, ``"Đã bán 350"`` or ``"2.5tr"`` into an int."""
+    if value is None or isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().lower()
+    m = re.search(r'(\d+(?:[\.,]\d+)*)\s*(k|tr|triệu|m)?\b', text)
+    if not m:
+        return 0
+    number, unit = m.group(1), m.group(2)
+    if unit:
+        # "1,2k" / "1.2k" dùng dấu phân cách thập phân
+        base = float(number.replace(',', '.')) if number.count(',') + number.count('.') <= 1 else float(number.replace(',', '').replace('.', ''))
+        multiplier = 1000 if unit == 'k' else 1000000
+        return int(round(base * multiplier))
+    # "1.234" / "1,234" là dấu phân cách hàng nghìn
+    try:
+        return int(number.replace(',', '').replace('.', ''))
+    except ValueError:
+        return 0
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    """Một sản phẩm đã crawl, với các trường số đã được parse sẵn"""
+
+    id: str
+    name: str
+    price: int
+    url: str
+    platform: Platform
+    timestamp: str
+    original_price: int = 0
+    discount_rate: int = 0
+    seller: str = ""
+    rating: float = 0.0
+    review_count: int = 0
+    sold_count: int = 0
+    image: Optional[str] = None
+    badges: Tuple[str, ...] = field(default_factory=tuple)
+    shipping: Optional[str] = None
+
+    @property
+    def discount(self) -> str:
+        return f"-{self.discount_rate}%" if self.discount_rate > 0 else NO_DISCOUNT_TEXT
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ProductRecord":
+        """Build a record from a legacy product dict (any crawler or API shape)."""
+        price = parse_price(data.get('price'))
+        discount_rate = data.get('discount_rate')
+        if discount_rate is None:
+            discount_rate = parse_count(data.get('discount')) if str(data.get('discount') or '').startswith('-') else 0
+        badges = data.get('badges') or ()
+        return cls(
+            id=str(data.get('id') or data.get('url') or data.get('link') or ''),
+            name=str(data.get('name') or data.get('title') or data.get('product_name') or '').strip(),
+            price=price,
+            url=str(data.get('url') or data.get('link') or ''),
+            platform=Platform.parse(data.get('platform')),
+            timestamp=str(data.get('timestamp') or data.get('created_at') or ''),
+            original_price=parse_price(data.get('original_price')) or price,
+            discount_rate=int(discount_rate or 0),
+            seller=str(data.get('seller') or ''),
+            rating=parse_rating(data.get('rating')),
+            review_count=parse_count(data.get('review_count')),
+            sold_count=parse_count(data.get('sold_count')),
+            image=data.get('image') or None,
+            badges=tuple(badges),
+            shipping=data.get('shipping') or None,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for JSON output and LLM context (edge conversion only)."""
+        product = {
+            "id": self.id,
+            "name": self.name,
+            "price": self.price,
+            "original_price": self.original_price,
+            "discount": self.discount,
+            "seller": self.seller,
+            "rating": self.rating,
+            "review_count": self.review_count,
+            "sold_count": self.sold_count,
+            "url": self.url,
+            "timestamp": self.timestamp,
+            "platform": self.platform.value,
+        }
+        if self.image:
+            product["image"] = self.image
+        if self.badges:
+            product["badges"] = list(self.badges)
+        if self.shipping:
+            product["shipping"] = self.shipping
+        return product
+
+    def to_db_row(self) -> tuple:
+        """Row for ``INSERT INTO products (id, name, price, url, image, rating, review_count, metadata, created_at)``."""
+        metadata = json.dumps({
+            "platform": self.platform.value,
+            "seller": self.seller,
+            "original_price": self.original_price,
+            "discount_rate": self.discount_rate,
+            "sold_count": self.sold_count,
+        }, ensure_ascii=False)
+        return (
+            self.id or self.url, self.name, self.price, self.url, self.image,
+            self.rating, self.review_count, metadata, self.timestamp,
+        )
+
+    @property
+    def key(self) -> str:
+        """Stable id for upserts into the vector store (see ``product_key``)."""
+        return product_key(self.platform, self.url, self.name)
+
+    def to_document_text(self) -> str:
+        """Text that is embedded into the vector database.
+
+        Listing fields only: an unchanged product re-crawled later gives the
+        same text, so its embedding comes from the cache. ``PER_CRAWL_FIELDS``
+        are kept in ``to_metadata`` instead.
+        """
+        listing = {k: v for k, v in self.to_dict().items() if k not in PER_CRAWL_FIELDS}
+        return json.dumps(listing, ensure_ascii=False)
+
+    def to_metadata(self) -> Dict[str, Any]:
+        """Vector-store metadata; Chroma only accepts scalar, non-null values."""
+        return {
+            "name": self.name,
+            "price": self.price,
+            "url": self.url,
+            "rating": self.rating,
+            "review_count": self.review_count,
+            "sold_count": self.sold_count,
+            "platform": self.platform.value,
+            "timestamp": self.timestamp,
+            "product_key": self.key,
+            "id": self.id,
+            # Chroma không nhận None
+            **({"image": self.image} if self.image else {}),
+            **({"shipping": self.shipping} if self.shipping else {}),
+        }
+
+
+def canonical_url(url: str) -> str:
+    """Host + path (+ identifying query params), without scheme, ``www.`` or tracking params."""
+    if not url or url == "N/A":
+        return ""
+    parts = urlsplit(url if "//" in url else "//" + url)
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if k in KEY_QUERY_PARAMS))
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+def product_key(platform: Any, url: str, name: str = "") -> str:
+    """Stable vector-store id of a listing: same platform + canonical URL -> same key.
+
+    Listings without a URL fall back to the normalized name.
+    """
+    platform = Platform.parse(platform).value
+    identity = canonical_url(url) or "name:" + " ".join(str(name or "").lower().split())
+    return f"{platform}-{hashlib.sha1(f'{platform}|{identity}'.encode('utf-8')).hexdigest()[:24]}"
+
+
+def as_product_record(product: Any) -> ProductRecord:
+    """Return ``product`` as a record, converting legacy dicts on the way in."""
+    if isinstance(product, Mapping):
+        return ProductRecord.from_dict(product)
+    return product
+
+
+def products_to_dicts(products) -> list:
+    """Convert a list of records (or already-plain dicts) for JSON output."""
+    return [p.to_dict() if hasattr(p, 'to_dict') else dict(p) for p in products]
@@ -5,10 +5,12 @@ Công cụ chạy đồng thời tất cả crawler và tổng hợp kết quả
 """
 
 import asyncio
+import functools
 import json
+import os
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime
 
 # Import các crawler modules
@@ -16,61 +18,88 @@ from crawl_tiki_product import crawl_tiki_product
 from lazada_crawler_complete import LazadaCrawler
 from scrape_cellphones_playwright import scrape_cellphones_products
 from scrape_dienthoaivui_playwright_search import scrape_dienthoaivui_products
+from product_record import Platform, ProductRecord, products_to_dicts
+from crawl_telemetry import CrawlTimings, STAGES, telemetry
 
+# "thread" (mặc định) chạy crawler trong ThreadPoolExecutor của process hiện tại;
+# "process" chạy mỗi crawler trong sandbox subprocess và kill cứng khi quá hạn.
+CRAWL_ISOLATION = os.getenv("CRAWL_ISOLATION", "thread")
+CRAWL_TIMEOUT_SECONDS = float(os.getenv("CRAWL_TIMEOUT_SECONDS", "90"))
+# Số lần crawl đồng thời tối đa khi gọi từ event loop (mỗi lần đã dùng 4 threads)
+CRAWL_MAX_CONCURRENT = int(os.getenv("CRAWL_MAX_CONCURRENT", "2"))
 
-def run_tiki_crawler(product_name: str) -> List[Dict]:
+_crawl_executor = None
+
+
+def run_tiki_crawler(product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
     """Chạy Tiki crawler"""
     try:
         print("Bắt đầu crawl từ Tiki...")
-        return crawl_tiki_product(product_name)
+        return crawl_tiki_product(product_name, timings)
     except Exception as e:
         print(f"Lỗi khi crawl từ Tiki: {e}")
         return []
 
 
-def run_lazada_crawler(product_name: str) -> List[Dict]:
+def run_lazada_crawler(product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
     """Chạy Lazada crawler"""
     try:
         print("Bắt đầu crawl từ Lazada...")
         crawler = LazadaCrawler()
-        return crawler.crawl_lazada_products(product_name)
+        return crawler.crawl_lazada_products(product_name, timings)
     except Exception as e:
         print(f"Lỗi khi crawl từ Lazada: {e}")
         return []
 
 
-def run_cellphones_crawler(product_name: str) -> List[Dict]:
+def run_cellphones_crawler(product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
     """Chạy CellphoneS crawler"""
     try:
         print("Bắt đầu crawl từ CellphoneS...")
-        return scrape_cellphones_products(product_name)
+        return scrape_cellphones_products(product_name, timings)
     except Exception as e:
         print(f"Lỗi khi crawl từ CellphoneS: {e}")
         return []
 
 
-def run_dienthoaivui_crawler(product_name: str) -> List[Dict]:
+def run_dienthoaivui_crawler(product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
     """Chạy Điện Thoại Vui crawler"""
     try:
         print("Bắt đầu crawl từ Điện Thoại Vui...")
-        return scrape_dienthoaivui_products(product_name)
+        return scrape_dienthoaivui_products(product_name, timings)
     except Exception as e:
         print(f"Lỗi khi crawl từ Điện Thoại Vui: {e}")
         return []
 
 
-def run_all_crawlers_parallel(product_name: str) -> Dict:
+def run_in_sandbox(runner_name: str, product_name: str, timings: CrawlTimings) -> List[ProductRecord]:
+    """Chạy một runner trong sandbox subprocess, kill cả process group khi quá hạn"""
+    from crawl_sandbox import get_sandbox_pool
+
+    with timings.stage("acquire"):
+        pool = get_sandbox_pool()
+    products, worker_timings = pool.run(runner_name, timings.platform, product_name, timeout=CRAWL_TIMEOUT_SECONDS)
+    for stage, seconds in worker_timings.stages.items():
+        timings.add(stage, seconds)
+    timings.path = worker_timings.path
+    return products
+
+
+def run_all_crawlers_parallel(product_name: str, isolation: Optional[str] = None) -> Dict:
     """
     Chạy tất cả crawler đồng thời và tổng hợp kết quả
+
+    isolation: "thread" hoặc "process" (mặc định lấy từ CRAWL_ISOLATION)
     """
     start_time = time.time()
+    isolation = isolation or CRAWL_ISOLATION
     
     # Danh sách các crawler functions
     crawlers = [
-        ("Tiki", run_tiki_crawler),
-        ("Lazada", run_lazada_crawler),
-        ("CellphoneS", run_cellphones_crawler),
-        ("Điện Thoại Vui", run_dienthoaivui_crawler)
+        ("Tiki", Platform.TIKI, run_tiki_crawler),
+        ("Lazada", Platform.LAZADA, run_lazada_crawler),
+        ("CellphoneS", Platform.CELLPHONES, run_cellphones_crawler),
+        ("Điện Thoại Vui", Platform.DIENTHOAIVUI, run_dienthoaivui_crawler)
     ]
     
     all_products = []
@@ -80,28 +109,36 @@ def run_all_crawlers_parallel(product_name: str) -> Dict:
     
     # Chạy đồng thời tất cả crawler
     with ThreadPoolExecutor(max_workers=4) as executor:
-        # Submit tất cả tasks
-        future_to_crawler = {
-            executor.submit(crawler_func, product_name): name 
-            for name, crawler_func in crawlers
-        }
+        # Submit tất cả tasks, mỗi crawler có CrawlTimings riêng
+        future_to_crawler = {}
+        for name, platform, crawler_func in crawlers:
+            timings = CrawlTimings(platform.value)
+            if isolation == "process":
+                crawler_func = functools.partial(run_in_sandbox, crawler_func.__name__)
+            future_to_crawler[executor.submit(crawler_func, product_name, timings)] = (name, timings)
         
         # Thu thập kết quả
         for future in as_completed(future_to_crawler):
-            crawler_name = future_to_crawler[future]
+            crawler_name, timings = future_to_crawler[future]
             try:
                 result = future.result()
+                timings.finish(len(result))
+                telemetry.record(timings)
                 crawler_results[crawler_name] = {
                     "count": len(result),
-                    "products": result
+                    "products": result,
+                    "timings": timings.to_dict()
                 }
                 all_products.extend(result)
                 print(f"Hoàn thành crawl từ {crawler_name}: {len(result)} sản phẩm")
             except Exception as e:
                 print(f"Lỗi khi crawl từ {crawler_name}: {e}")
+                timings.finish(0)
+                telemetry.record(timings)
                 crawler_results[crawler_name] = {
                     "count": 0,
                     "products": [],
+                    "timings": timings.to_dict(),
                     "error": str(e)
                 }
     
@@ -125,6 +162,17 @@ def run_all_crawlers_parallel(product_name: str) -> Dict:
     return summary
 
 
+def results_to_json_dict(results: Dict) -> Dict:
+    """Chuyển ProductRecord trong báo cáo sang dict thuần để ghi JSON"""
+    serializable = dict(results)
+    serializable["products"] = products_to_dicts(results.get("products", []))
+    serializable["crawler_results"] = {
+        name: {**crawler_result, "products": products_to_dicts(crawler_result.get("products", []))}
+        for name, crawler_result in results.get("crawler_results", {}).items()
+    }
+    return serializable
+
+
 def save_results_to_file(results: Dict, product_name: str) -> str:
     """Lưu kết quả vào file JSON"""
     try:
@@ -136,7 +184,7 @@ def save_results_to_file(results: Dict, product_name: str) -> str:
         filename = f"../csv/all_crawlers_{product_name.replace(' ', '_')}_{timestamp}.json"
         
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+            json.dump(results_to_json_dict(results), f, ensure_ascii=False, indent=2)
         
         print(f"Đã lưu kết quả vào file: {filename}")
         return filename
@@ -159,18 +207,22 @@ def print_summary(results: Dict):
         status = "✓" if crawler_result['count'] > 0 else "✗"
         error_info = f" (Lỗi: {crawler_result.get('error', 'N/A')})" if 'error' in crawler_result else ""
         print(f"{status} {crawler_name:15}: {crawler_result['count']:3} sản phẩm{error_info}")
+        stages = (crawler_result.get('timings') or {}).get('stages') or {}
+        if stages:
+            stage_info = "  ".join(f"{stage}={stages[stage]:.2f}s" for stage in STAGES if stage in stages)
+            print(f"  {'':15}  {stage_info}")
     
     print("="*60)
+    print_telemetry_summary()
     
     # Hiển thị một số sản phẩm mẫu
     if results['products']:
         print("\nMột số sản phẩm tìm thấy:")
         print("-"*60)
         for i, product in enumerate(results['products'][:5], 1):
-            platform = product.get('platform', 'unknown')
-            platform_display = platform.upper()
-            name = product.get('name', 'N/A')[:50]
-            price = product.get('price', 0)
+            platform_display = product.platform.value.upper()
+            name = (product.name or 'N/A')[:50]
+            price = product.price
             if price:
                 price_str = f"{price:,}đ"
             else:
@@ -181,6 +233,25 @@ def print_summary(results: Dict):
             print(f"... và {len(results['products']) - 5} sản phẩm khác")
 
 
+def print_telemetry_summary():
+    """In histogram thời gian (p50/p95) theo platform và giai đoạn"""
+    snapshot = telemetry.snapshot()
+    if not snapshot["platforms"]:
+        return
+    print(f"Thời gian theo giai đoạn ({snapshot['window']} lần crawl gần nhất, p50/p95):")
+    for platform, data in snapshot["platforms"].items():
+        parts = []
+        for stage in STAGES + ("total",):
+            hist = data["stages"].get(stage)
+            if hist and hist.get("count"):
+                parts.append(f"{stage} {hist['p50']:.2f}/{hist['p95']:.2f}s")
+        print(f"  {platform:13} ({data['runs']} lần): " + ", ".join(parts))
+    for platform, data in snapshot["paths"].items():
+        rates = ", ".join(f"{path} {rate:.0%}" for path, rate in data["hit_rates"].items())
+        print(f"  {platform:13} tỉ lệ theo đường lấy dữ liệu: {rates}")
+    print("="*60)
+
+
 def run_interactive():
     """Chạy chương trình với giao diện tương tác"""
     print("="*60)
@@ -219,7 +290,7 @@ def run_interactive():
         print(f"Lỗi: {e}")
 
 
-def crawl_all_platforms(product_name: str, limit: int = 5) -> List[Dict]:
+def crawl_all_platforms(product_name: str, limit: int = 5) -> List[ProductRecord]:
     """
     Wrapper function để tương thích với chatbot.py
     Chạy tất cả crawler và trả về danh sách sản phẩm
@@ -238,6 +309,22 @@ def crawl_all_platforms(product_name: str, limit: int = 5) -> List[Dict]:
         return []
 
 
+def _get_crawl_executor() -> ThreadPoolExecutor:
+    global _crawl_executor
+    if _crawl_executor is None:
+        _crawl_executor = ThreadPoolExecutor(max_workers=CRAWL_MAX_CONCURRENT, thread_name_prefix="crawl")
+    return _crawl_executor
+
+
+async def acrawl_all_platforms(product_name: str, limit: int = 5) -> List[ProductRecord]:
+    """
+    Bản awaitable của crawl_all_platforms cho code async (FastAPI)
+    Crawl chạy trong executor riêng, tối đa CRAWL_MAX_CONCURRENT lần cùng lúc
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_crawl_executor(), crawl_all_platforms, product_name, limit)
+
+
 def main():
     """Hàm main"""
     import sys
@@ -246,7 +333,7 @@ def main():
         # Chạy với tham số command line
         product_name = ' '.join(sys.argv[1:])
         results = run_all_crawlers_parallel(product_name)
-        print(json.dumps(results, ensure_ascii=False, indent=2))
+        print(json.dumps(results_to_json_dict(results), ensure_ascii=False, indent=2))
     else:
         # Chạy interactive mode
         run_interactive()
@@ -16,9 +16,25 @@ import json
 from urllib.parse import urljoin
 import sys
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime
 
+try:
+    from product_record import Platform, ProductRecord, parse_count, parse_price, parse_rating
+    from crawl_telemetry import CrawlTimings
+    from http_fast_path import FAST_PATH_MIN_ITEMS, fast_scrape
+except ImportError:
+    from Crawl_Data.product_record import Platform, ProductRecord, parse_count, parse_price, parse_rating
+    from Crawl_Data.crawl_telemetry import CrawlTimings
+    from Crawl_Data.http_fast_path import FAST_PATH_MIN_ITEMS, fast_scrape
+
+# Selectors cho HTTP fast path (HTML tĩnh, không render)
+CELLPHONES_MARKUP = {
+    "item": [".product-info-container .product-info", ".product-item", ".product-info", ".product-card"],
+    "title": [".product__name h3", ".product__name", ".product-item-link", "h3"],
+    "price": [".product__price--show", ".price-final_price", ".price", "[data-price]"],
+}
+
 # Removed logger dependencies
 
 # Note: on Windows the default event loop may not support subprocesses used by
@@ -28,15 +44,23 @@ from datetime import datetime
 # effects when the module is imported but Playwright isn't available.
 
 
-def scrape_cellphones_products(product_name: str) -> List[Dict]:
+def scrape_cellphones_products(product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
     """
-    Crawl sản phẩm từ CellphoneS và trả về list dict với format giống crawl_tiki_product
+    Crawl sản phẩm từ CellphoneS và trả về list ProductRecord giống crawl_tiki_product
     Giới hạn chỉ lấy 5 sản phẩm
     """
+    timings = timings or CrawlTimings(Platform.CELLPHONES.value)
     try:
         search_url = f"https://cellphones.com.vn/catalogsearch/result?q={product_name}"
-        raw_results = scrape(search_url, limit=5)  # Giới hạn 5 sản phẩm
+        # Thử HTTP trước; chỉ mở Chromium khi HTML tĩnh không đủ sản phẩm
+        raw_results = fast_scrape(search_url, limit=5, markup=CELLPHONES_MARKUP, timings=timings)
+        if len(raw_results) >= FAST_PATH_MIN_ITEMS:
+            timings.path = "http"
+        else:
+            timings.path = "browser"
+            raw_results = scrape(search_url, limit=5, timings=timings)  # Giới hạn 5 sản phẩm
         
+        timings.mark()
         products = []
         current_time = datetime.now().isoformat()
         
@@ -44,46 +68,32 @@ def scrape_cellphones_products(product_name: str) -> List[Dict]:
             if not item.get('title'):
                 continue
             
-            # Xử lý giá
-            price = item.get('price', 0)
-            if isinstance(price, str):
-                # Trích xuất số từ string
-                import re
-                price_numbers = re.findall(r'[\d,\.]+', price.replace('₫', '').replace('đ', ''))
-                if price_numbers:
-                    try:
-                        price_str = price_numbers[0].replace(',', '').replace('.', '')
-                        price = int(price_str)
-                    except (ValueError, IndexError):
-                        price = 0
+            # Giá có thể là float (từ DOM) hoặc chuỗi có ký hiệu tiền tệ
+            price = parse_price(item.get('price'))
             
             # Tạo unique product ID
             product_id = f"cellphones_{int(datetime.now().timestamp())}_{idx}"
             
-            # Tạo product dict với format giống crawl_tiki_product
-            product = {
-                "id": product_id,
-                "name": item.get('title', '').strip(),
-                "price": price or 0,
-                "original_price": price or 0,
-                "discount": "Không giảm giá",
-                "seller": "CellphoneS",
-                "rating": f"{item.get('rating', 0.0):.1f}",
-                "review_count": item.get('review_count', 0),
-                "url": item.get('url', ''),
-                "timestamp": current_time,
-                "platform": "cellphones",
-                "sold_count": item.get('sold_count', "0")
-            }
-            
-            # Thêm thông tin ảnh nếu có
-            if item.get('image'):
-                product["image"] = item.get('image')
+            product = ProductRecord(
+                id=product_id,
+                name=item.get('title', '').strip(),
+                price=price,
+                original_price=price,
+                seller="CellphoneS",
+                rating=parse_rating(item.get('rating')),
+                review_count=parse_count(item.get('review_count')),
+                sold_count=parse_count(item.get('sold_count')),
+                url=item.get('url', ''),
+                timestamp=current_time,
+                platform=Platform.CELLPHONES,
+                image=item.get('image') or None,
+            )
             
             products.append(product)
         
         # Đảm bảo chỉ trả về tối đa 5 sản phẩm
         products = products[:5]
+        timings.lap("parse")
         
         if products:
             print(f"Tìm thấy {len(products)} sản phẩm từ CellphoneS")
@@ -97,8 +107,9 @@ def scrape_cellphones_products(product_name: str) -> List[Dict]:
         return []
 
 
-def scrape(search_url, limit=None):
+def scrape(search_url, limit=None, timings: Optional[CrawlTimings] = None):
     results = []
+    timings = timings or CrawlTimings(Platform.CELLPHONES.value)
 
     # On Windows ensure Proactor event loop policy so subprocess support exists.
     if sys.platform.startswith("win"):
@@ -112,10 +123,13 @@ def scrape(search_url, limit=None):
     # import time in environments without Playwright installed.
     from playwright.sync_api import sync_playwright
 
+    timings.mark()
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
+        timings.lap("acquire")
         page.goto(search_url, timeout=60000)
+        timings.lap("navigation")
 
         # Wait for some product-like elements to appear. Try several selectors.
         selectors = [".product-item", "a.product-item-link", "div.product-item-info", ".product-card"]
@@ -127,6 +141,7 @@ def scrape(search_url, limit=None):
                 break
             except Exception:
                 continue
+        timings.lap("wait")
 
         # If none found, still proceed and try to collect anchors
         # Prefer selecting whole product items and then extracting details inside each item
@@ -312,6 +327,7 @@ def scrape(search_url, limit=None):
                     'sold_count': sold_count
                 })
 
+        timings.lap("extraction")
         browser.close()
     return results
 
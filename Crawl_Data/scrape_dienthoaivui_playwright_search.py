@@ -14,18 +14,42 @@ import json
 import sys
 import re
 from urllib.parse import urljoin
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime
 
-def scrape_dienthoaivui_products(product_name: str) -> List[Dict]:
+try:
+    from product_record import Platform, ProductRecord, parse_count, parse_price, parse_rating
+    from crawl_telemetry import CrawlTimings
+    from http_fast_path import FAST_PATH_MIN_ITEMS, fast_scrape
+except ImportError:
+    from Crawl_Data.product_record import Platform, ProductRecord, parse_count, parse_price, parse_rating
+    from Crawl_Data.crawl_telemetry import CrawlTimings
+    from Crawl_Data.http_fast_path import FAST_PATH_MIN_ITEMS, fast_scrape
+
+# Selectors cho HTTP fast path (HTML tĩnh, không render)
+DIENTHOAIVUI_MARKUP = {
+    "item": [".product-item", ".product-card", "div.product", "li.product", ".product-item-wrap"],
+    "title": [".name-product", ".product-name", ".name", ".title", "h3", "h2"],
+    "price": [".price", ".product-price", ".gia", "[data-price]"],
+}
+
+def scrape_dienthoaivui_products(product_name: str, timings: Optional[CrawlTimings] = None) -> List[ProductRecord]:
     """
-    Crawl sản phẩm từ Điện Thoại Vui và trả về list dict với format giống crawl_tiki_product
+    Crawl sản phẩm từ Điện Thoại Vui và trả về list ProductRecord giống crawl_tiki_product
     Giới hạn chỉ lấy 5 sản phẩm
     """
+    timings = timings or CrawlTimings(Platform.DIENTHOAIVUI.value)
     try:
         search_url = f"https://dienthoaivui.com.vn/tim-kiem?_tim_kiem={product_name}"
-        raw_results = scrape(search_url, limit=10)  # Lấy 10 để có đủ data filter
+        # Thử HTTP trước; chỉ mở Chromium khi HTML tĩnh không đủ sản phẩm
+        raw_results = fast_scrape(search_url, limit=10, markup=DIENTHOAIVUI_MARKUP, timings=timings)
+        if len(raw_results) >= FAST_PATH_MIN_ITEMS:
+            timings.path = "http"
+        else:
+            timings.path = "browser"
+            raw_results = scrape(search_url, limit=10, timings=timings)  # Lấy 10 để có đủ data filter
         
+        timings.mark()
         products = []
         current_time = datetime.now().isoformat()
         
@@ -36,43 +60,29 @@ def scrape_dienthoaivui_products(product_name: str) -> List[Dict]:
             if not item.get('title'):
                 continue
             
-            # Xử lý giá
-            price = item.get('price', 0)
-            if isinstance(price, str):
-                # Trích xuất số từ string
-                import re
-                price_numbers = re.findall(r'[\d,\.]+', price.replace('₫', '').replace('đ', ''))
-                if price_numbers:
-                    try:
-                        price_str = price_numbers[0].replace(',', '').replace('.', '')
-                        price = int(price_str)
-                    except (ValueError, IndexError):
-                        price = 0
+            # Giá có thể là float (từ DOM) hoặc chuỗi có ký hiệu tiền tệ
+            price = parse_price(item.get('price'))
             
             # Tạo unique product ID
             product_id = f"dienthoaivui_{int(datetime.now().timestamp())}_{len(products)+1}"
             
-            # Tạo product dict với format giống crawl_tiki_product
-            product = {
-                "id": product_id,
-                "name": item.get('title', '').strip(),
-                "price": price or 0,
-                "original_price": price or 0,
-                "discount": "Không giảm giá",
-                "seller": "Điện Thoại Vui",
-                "rating": f"{item.get('rating', 0.0):.1f}",
-                "review_count": item.get('review_count', 0),
-                "url": item.get('url', ''),
-                "timestamp": current_time,
-                "platform": "dienthoaivui",
-                "sold_count": item.get('sold_count', "0")
-            }
-            
-            # Thêm thông tin ảnh nếu có
-            if item.get('image'):
-                product["image"] = item.get('image')
+            product = ProductRecord(
+                id=product_id,
+                name=item.get('title', '').strip(),
+                price=price,
+                original_price=price,
+                seller="Điện Thoại Vui",
+                rating=parse_rating(item.get('rating')),
+                review_count=parse_count(item.get('review_count')),
+                sold_count=parse_count(item.get('sold_count')),
+                url=item.get('url', ''),
+                timestamp=current_time,
+                platform=Platform.DIENTHOAIVUI,
+                image=item.get('image') or None,
+            )
             
             products.append(product)
+        timings.lap("parse")
         
         if products:
             print(f"Tìm thấy {len(products)} sản phẩm từ Điện Thoại Vui")
@@ -107,8 +117,9 @@ def _clean_price_text(text: str):
     except Exception:
         return None
 
-def scrape(search_url, limit=None):
+def scrape(search_url, limit=None, timings: Optional[CrawlTimings] = None):
     results = []
+    timings = timings or CrawlTimings(Platform.DIENTHOAIVUI.value)
     try:
         import platform
         import asyncio
@@ -122,10 +133,13 @@ def scrape(search_url, limit=None):
 
     from playwright.sync_api import sync_playwright
 
+    timings.mark()
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
+        timings.lap("acquire")
         page.goto(search_url, timeout=60000)
+        timings.lap("navigation")
         # wait and scroll to trigger client-side rendering and lazy-load images
         page.wait_for_timeout(800)
         page.evaluate("() => { window.scrollTo(0, 0); }")
@@ -134,6 +148,7 @@ def scrape(search_url, limit=None):
         page.wait_for_timeout(800)
         page.evaluate("() => { window.scrollTo(0, document.body.scrollHeight); }")
         page.wait_for_timeout(1200)
+        timings.lap("wait")
 
         # Prioritize anchors approach: DTV tends to render product links as anchors with images and prices
         anchors = page.query_selector_all('a[href]')
@@ -499,6 +514,7 @@ def scrape(search_url, limit=None):
                     except Exception:
                         continue
 
+        timings.lap("extraction")
         try:
             browser.close()
         except Exception:
@@ -0,0 +1,403 @@
+"""Bounded conversation memory for the chat pipeline.
+
+``process_user_query`` used to see only the current message, so a follow-up
+such as "còn bản 256GB thì sao?" went through a fresh LLM classification and
+usually a crawl for "256GB". Sending the whole ``messages`` history instead
+would grow the prompt with every turn. ``ConversationMemory`` keeps, per
+conversation:
+
+  - a rolling summary of older turns, cached in memory (LRU) and persisted in
+    the ``conversation_memory`` table with a watermark (``messages`` rowid),
+  - the raw messages after the watermark; prompts get the newest
+    ``MEMORY_RECENT_TURNS`` turns, each message cut to
+    ``MEMORY_MESSAGE_TOKENS`` and the whole block (summary included) kept under
+    ``MEMORY_TOKEN_BUDGET`` tokens,
+  - the product name and filters of the last product question.
+
+After each turn ``update`` stores the product context and schedules a
+background fold: messages beyond the recent window are merged into the summary
+with one LLM call that sees only the previous summary and those messages, so
+the cost per turn stays constant. If the LLM fails the messages are appended
+to the summary in short form instead, so the watermark always advances.
+
+``resolve_follow_up`` rewrites a follow-up that names no product of its own
+onto the remembered product ("iPhone 15 128GB" + "còn bản 256GB thì sao?" ->
+"iPhone 15 256GB"), keeping earlier filters, without an LLM call.
+
+Usage:
+    from backend.conversation_memory import get_conversation_memory
+    memory = get_conversation_memory().load(conversation_id)
+    answer = chatbot.process_user_query(message, memory=memory)
+    get_conversation_memory().update(memory, message, answer)
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from intent_classifier import BRANDS, CATEGORIES, FILLER_WORDS, strip_accents
+from logger_config import get_logger
+from query_filters import QueryFilters, extract_filters
+
+from .database import get_db
+
+logger = get_logger(__name__)
+
+RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "3"))
+TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "600"))
+SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "200"))
+MESSAGE_TOKENS = int(os.getenv("MEMORY_MESSAGE_TOKENS", "120"))
+CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "1024"))
+
+ROLE_LABELS = {"user": "Người dùng", "assistant": "Sophie"}
+
+_STORAGE_RE = re.compile(r"\b(\d{1,4})\s?(gb|tb)\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Biến thể nêu trong câu tiếp nối. Màu so khớp có dấu: bỏ dấu thì "đen", "đỏ", "tím"
+# trùng với "đến", "đó", "tìm"
+MODEL_VARIANTS = {"pro", "max", "plus", "mini", "ultra", "lite", "fe"}
+COLOR_VARIANTS = {"đen", "trắng", "xanh", "đỏ", "vàng", "tím", "hồng", "bạc", "xám", "titan"}
+# Câu nhắc lại sản phẩm trước: "còn bản 256GB thì sao?", "loại màu xanh"
+_ANAPHORA_RE = re.compile(r"(?<!\w)(?:còn|bản|phiên bản|loại|thì sao|thế còn|vậy còn)(?!\w)")
+# Từ (bỏ dấu) được phép còn lại trong câu tiếp nối ngoài biến thể / bộ lọc / FILLER_WORDS
+FOLLOW_UP_WORDS = {"thi", "sao", "vay", "nua", "khac", "mau", "phien", "dung", "luong", "bo", "nho",
+                   "lai", "neu", "va", "hoac", "hon", "lon", "thoi", "day", "kia", "gi", "gb", "tb"}
+
+SUMMARY_PROMPT = """Bạn là Sophie, trợ lý mua sắm. Cập nhật bản tóm tắt hội thoại dưới đây với các tin nhắn mới.
+Giữ lại: sản phẩm người dùng đang quan tâm (tên, dung lượng, màu), khoảng giá, sàn, các lựa chọn Sophie đã đề xuất và quyết định của người dùng.
+Viết tiếng Việt, tối đa {max_words} từ, chỉ trả về bản tóm tắt.
+
+Tóm tắt hiện tại:
+{summary}
+
+Tin nhắn mới:
+{messages}
+"""
+
+
+def count_tokens(text: str) -> int:
+    # context_serializer kéo theo Crawl_Data.product_record: import lúc dùng, không lúc server khởi động
+    from context_serializer import count_tokens as _count_tokens
+    return _count_tokens(text)
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut ``text`` to at most ``max_tokens`` tokens (``keep="tail"`` keeps the end)."""
+    text = (text or "").strip()
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    size = max_tokens * 4
+    while size > 0:
+        cut = text[:size] if keep == "head" else text[-size:]
+        if count_tokens(cut) <= max_tokens - 1:
+            return cut + "…" if keep == "head" else "…" + cut
+        size = int(size * 0.8)
+    return ""
+
+
+@dataclass
+class ConversationContext:
+    """What one turn of the chat pipeline knows about the earlier turns."""
+
+    conversation_id: Optional[str] = None
+    summary: str = ""
+    # (role, content) từ cũ đến mới, đã cắt theo ngân sách token
+    turns: List[Tuple[str, str]] = field(default_factory=list)
+    product_name: Optional[str] = None
+    filters: Optional[QueryFilters] = None
+
+    def is_empty(self) -> bool:
+        return not (self.summary or self.turns or self.product_name)
+
+    def render(self) -> str:
+        """Prompt block: summary, current product and recent turns."""
+        lines = []
+        if self.summary:
+            lines.append(f"Tóm tắt: {self.summary}")
+        if self.product_name:
+            filters = self.filters.describe() if self.filters else ""
+            lines.append(f"Sản phẩm đang hỏi: {self.product_name}{filters}")
+        lines.extend(f"{ROLE_LABELS.get(role, role)}: {content}" for role, content in self.turns)
+        return "\n".join(lines)
+
+    def add_turn(self, user_message: str, answer: str, recent_turns: int = RECENT_TURNS):
+        """In-process history without a ``messages`` table (CLI): keep the newest turns only."""
+        self.turns = (self.turns + [("user", truncate_tokens(user_message, MESSAGE_TOKENS)),
+                                    ("assistant", truncate_tokens(answer, MESSAGE_TOKENS))])[-2 * recent_turns:]
+
+
+def resolve_follow_up(query: str, context: Optional[ConversationContext]) -> Optional[Tuple[str, QueryFilters]]:
+    """(product_name, filters) for a follow-up about the remembered product, else ``None``.
+
+    Only applies when the query names no brand / category of its own,
+    changes something concrete (a variant: capacity, Pro/Max, color; or a
+    filter: price, platform, rating, freshness) and either refers back
+    explicitly ("còn", "bản", "thì sao") or has no other words left.
+    "nồi chiên không dầu dưới 2 triệu" is a new product, not the old one
+    under 2 triệu, so it goes to the LLM with the memory.
+    """
+    if context is None or not context.product_name:
+        return None
+    filters, remainder = extract_filters(query)
+    plain = " ".join(_WORD_RE.findall(strip_accents(remainder)))
+    padded = f" {plain} "
+    if any(word in BRANDS for word in plain.split()) or any(f" {c} " in padded for c in CATEGORIES):
+        return None
+
+    product_name = context.product_name
+    storage = _STORAGE_RE.search(plain)
+    if storage:
+        capacity = f"{storage.group(1)}{storage.group(2).upper()}"
+        if _STORAGE_RE.search(product_name):
+            product_name = _STORAGE_RE.sub(capacity, product_name, count=1)
+        else:
+            product_name = f"{product_name} {capacity}"
+    known = set(_WORD_RE.findall(product_name.lower()))
+    leftover = []
+    for token in _WORD_RE.findall(_STORAGE_RE.sub(" ", remainder)):
+        word = token.lower()
+        if word in COLOR_VARIANTS or strip_accents(word) in MODEL_VARIANTS:
+            if word not in known:
+                known.add(word)
+                product_name = f"{product_name} {token}"
+        elif strip_accents(word) not in FILLER_WORDS and strip_accents(word) not in FOLLOW_UP_WORDS:
+            leftover.append(token)
+    if leftover and not _ANAPHORA_RE.search(query.lower()):
+        return None
+
+    if product_name == context.product_name and filters.is_empty():
+        return None
+    previous = context.filters
+    if previous is not None and (filters.min_price is not None or filters.max_price is not None):
+        # Khoảng giá mới thay cho khoảng giá cũ, không giao với nó
+        previous = previous.model_copy(update={"min_price": None, "max_price": None})
+    return product_name, filters.merge(previous)
+
+
+@dataclass
+class _MemoryState:
+    summary: str = ""
+    summarized_rowid: int = 0
+    product_name: Optional[str] = None
+    filters: Optional[str] = None  # QueryFilters JSON
+
+
+class ConversationMemory:
+    """Rolling summary + recent turns per conversation, folded in the background."""
+
+    def __init__(self, db_factory: Callable = get_db, recent_turns: int = RECENT_TURNS,
+                 token_budget: int = TOKEN_BUDGET, summary_tokens: int = SUMMARY_TOKENS,
+                 message_tokens: int = MESSAGE_TOKENS, cache_size: int = CACHE_SIZE):
+        self.db_factory = db_factory
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.message_tokens = message_tokens
+        self.cache_size = cache_size
+        self._states: "OrderedDict[str, _MemoryState]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Một worker: các lần fold của cùng hội thoại chạy tuần tự
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-memory")
+        self._pending = set()
+        self._stats = {"loads": 0, "cache_hits": 0, "folds": 0, "folded_messages": 0,
+                       "fallback_folds": 0, "failed": 0}
+        self._fold_seconds: List[float] = []
+
+    # ---- state -----------------------------------------------------------
+    def _state(self, conversation_id: str) -> _MemoryState:
+        with self._lock:
+            state = self._states.get(conversation_id)
+            if state is not None:
+                self._states.move_to_end(conversation_id)
+                self._stats["cache_hits"] += 1
+                return state
+        conn = self.db_factory()
+        try:
+            row = conn.execute(
+                "SELECT summary, summarized_rowid, product_name, filters FROM conversation_memory "
+                "WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        state = _MemoryState(*row) if row else _MemoryState()
+        with self._lock:
+            state = self._states.setdefault(conversation_id, state)
+            while len(self._states) > self.cache_size:
+                self._states.popitem(last=False)
+        return state
+
+    def _save(self, conversation_id: str, state: _MemoryState):
+        conn = self.db_factory()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO conversation_memory "
+                "(conversation_id, summary, summarized_rowid, product_name, filters, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, state.summary, state.summarized_rowid, state.product_name, state.filters,
+                 datetime.utcnow().isoformat()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _unsummarized(self, conversation_id: str, after_rowid: int) -> List[Tuple[int, str, str]]:
+        conn = self.db_factory()
+        try:
+            return [tuple(row) for row in conn.execute(
+                "SELECT rowid, role, content FROM messages WHERE conversation_id = ? AND rowid > ? ORDER BY rowid",
+                (conversation_id, after_rowid),
+            ).fetchall()]
+        finally:
+            conn.close()
+
+    # ---- public API --------------------------------------------------------
+    def load(self, conversation_id: Optional[str]) -> ConversationContext:
+        """Context for the next turn: call it before the new user message is saved."""
+        if not conversation_id:
+            return ConversationContext()
+        with self._lock:
+            self._stats["loads"] += 1
+        state = self._state(conversation_id)
+        summary = truncate_tokens(state.summary, self.summary_tokens, keep="tail")
+        budget = self.token_budget - count_tokens(summary) - count_tokens(state.product_name or "")
+        turns: List[Tuple[str, str]] = []
+        messages = self._unsummarized(conversation_id, state.summarized_rowid)
+        # Từ mới đến cũ, dừng khi hết số lượt hoặc hết ngân sách token
+        for _, role, content in reversed(messages[-2 * self.recent_turns:]):
+            content = truncate_tokens(content, self.message_tokens)
+            cost = count_tokens(content) + 4
+            if cost > budget:
+                break
+            turns.insert(0, (role, content))
+            budget -= cost
+        filters = QueryFilters.model_validate_json(state.filters) if state.filters else None
+        return ConversationContext(conversation_id, summary, turns, state.product_name, filters)
+
+    def update(self, context: ConversationContext, user_message: str = "", answer: str = ""):
+        """After a turn: store the product context, fold old messages into the summary in the background."""
+        conversation_id = context.conversation_id
+        if not conversation_id:
+            context.add_turn(user_message, answer, self.recent_turns)
+            return
+        state = self._state(conversation_id)
+        filters = context.filters.model_dump_json() if context.filters and not context.filters.is_empty() else None
+        with self._lock:
+            changed = (state.product_name, state.filters) != (context.product_name, filters)
+            state.product_name, state.filters = context.product_name, filters
+        if changed:
+            try:
+                self._save(conversation_id, state)
+            except Exception as e:
+                logger.warning("Conversation memory: cannot save product context for %s: %s", conversation_id, e)
+        with self._lock:
+            if conversation_id in self._pending:
+                return
+            self._pending.add(conversation_id)
+        try:
+            self._pool.submit(self._fold, conversation_id)
+        except RuntimeError as e:
+            # Executor đã shutdown (đang tắt server)
+            logger.warning("Conversation memory: cannot schedule summary for %s: %s", conversation_id, e)
+            with self._lock:
+                self._pending.discard(conversation_id)
+
+    def forget(self, conversation_id: str):
+        with self._lock:
+            self._states.pop(conversation_id, None)
+        conn = self.db_factory()
+        try:
+            conn.execute("DELETE FROM conversation_memory WHERE conversation_id = ?", (conversation_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---- background fold -------------------------------------------------
+    def _summarize(self, summary: str, messages: List[Tuple[int, str, str]]) -> str:
+        from client_registry import get_chat_model
+
+        lines = "\n".join(f"{ROLE_LABELS.get(role, role)}: {truncate_tokens(content, self.message_tokens)}"
+                          for _, role, content in messages)
+        prompt = SUMMARY_PROMPT.format(max_words=self.summary_tokens // 2, summary=summary or "(chưa có)",
+                                       messages=lines)
+        return str(get_chat_model().invoke(prompt).content).strip()
+
+    def _fold(self, conversation_id: str):
+        with self._lock:
+            self._pending.discard(conversation_id)
+        started = time.monotonic()
+        try:
+            state = self._state(conversation_id)
+            messages = self._unsummarized(conversation_id, state.summarized_rowid)
+            overflow = messages[:-2 * self.recent_turns] if len(messages) > 2 * self.recent_turns else []
+            if not overflow:
+                return
+            try:
+                summary = self._summarize(state.summary, overflow)
+            except Exception as e:
+                logger.warning("Conversation memory: summary LLM call failed for %s (%s); appending instead",
+                               conversation_id, e)
+                summary = "\n".join([state.summary] + [
+                    f"{ROLE_LABELS.get(role, role)}: {truncate_tokens(content, 30)}" for _, role, content in overflow
+                ]).strip()
+                with self._lock:
+                    self._stats["fallback_folds"] += 1
+            with self._lock:
+                state.summary = truncate_tokens(summary, self.summary_tokens, keep="tail")
+                state.summarized_rowid = overflow[-1][0]
+            self._save(conversation_id, state)
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._stats["folds"] += 1
+                self._stats["folded_messages"] += len(overflow)
+                self._fold_seconds = (self._fold_seconds + [elapsed])[-200:]
+            logger.info("Conversation memory: folded %d messages of %s into the summary in %.2fs",
+                        len(overflow), conversation_id, elapsed)
+        except Exception as e:
+            with self._lock:
+                self._stats["failed"] += 1
+            logger.error("Conversation memory: fold failed for %s: %s", conversation_id, e)
+
+    def stop(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_conversations"] = len(self._states)
+            stats["pending_folds"] = len(self._pending)
+            durations = sorted(self._fold_seconds)
+        stats.update({"recent_turns": self.recent_turns, "token_budget": self.token_budget,
+                      "summary_tokens": self.summary_tokens})
+        if durations:
+            stats["fold_p50_seconds"] = round(durations[len(durations) // 2], 2)
+            stats["fold_max_seconds"] = round(durations[-1], 2)
+        return stats
+
+
+# Module-level memory instance
+_memory: Optional[ConversationMemory] = None
+_memory_lock = threading.Lock()
+
+
+def get_conversation_memory() -> ConversationMemory:
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = ConversationMemory()
+        return _memory
+
+
+def stop_conversation_memory(wait: bool = False):
+    if _memory is not None:
+        _memory.stop(wait)
+
+
+def get_conversation_memory_stats() -> Dict:
+    return get_conversation_memory().stats()
@@ -78,6 +78,20 @@ def init_database():
         )
     """)
     
+    # Ngữ cảnh hội thoại (backend.conversation_memory): tóm tắt các tin nhắn đến summarized_rowid
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_memory (
+            conversation_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL DEFAULT '',
+            summarized_rowid INTEGER NOT NULL DEFAULT 0,
+            product_name TEXT,
+            filters TEXT,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id)")
+    
     # Platforms table (for admin)
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS platforms (
@@ -157,8 +171,19 @@ def init_database():
     logger.info("Database initialized successfully")
 
 
+def _product_row(product) -> tuple:
+    """Return the products-table row for a ProductRecord or a legacy product dict."""
+    if not hasattr(product, 'to_db_row'):
+        try:
+            from product_record import ProductRecord
+        except ImportError:
+            from Crawl_Data.product_record import ProductRecord
+        product = ProductRecord.from_dict(product)
+    return product.to_db_row()
+
+
 def save_products(products: list) -> int:
-    """Save a list of product dicts into the products table.
+    """Save a list of products (ProductRecord or dict) into the products table.
 
     Uses INSERT OR IGNORE on url uniqueness to avoid duplicates. Returns
     the number of rows inserted.
@@ -204,19 +229,12 @@ def save_products(products: list) -> int:
     inserted = 0
     for p in products:
         try:
-            prod_id = str(uuid.uuid4())
-            name = p.get('name') or p.get('title') or p.get('product_name') or ''
-            price = p.get('price')
-            url = p.get('url') or p.get('link') or ''
-            image = p.get('image')
-            rating = p.get('rating')
-            review_count = p.get('review_count')
-            metadata = None
-            try:
-                metadata = json.dumps(p.get('metadata') or {})
-            except Exception:
-                metadata = json.dumps({})
-            created_at = datetime.utcnow().isoformat()
+            row = _product_row(p)
+            if not row[0]:
+                row = (str(uuid.uuid4()),) + row[1:]
+            if not row[-1]:
+                row = row[:-1] + (datetime.utcnow().isoformat(),)
+            name, url = row[1], row[3]
 
             try:
                 cursor.execute(
@@ -225,7 +243,7 @@ def save_products(products: list) -> int:
                     (id, name, price, url, image, rating, review_count, metadata, created_at)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """,
-                    (prod_id, name, price, url, image, rating, review_count, metadata, created_at)
+                    row
                 )
                 if cursor.rowcount > 0:
                     inserted += 1
@@ -239,7 +257,7 @@ def save_products(products: list) -> int:
                 logger.warning("OperationalError saving product '%s': %s", name, oe)
                 continue
         except Exception as e:
-            logger.error("Failed to save product %s: %s", p.get('name'), e)
+            logger.error("Failed to save product %s: %s", p.get('name') if isinstance(p, dict) else getattr(p, 'name', None), e)
             continue
 
     conn.commit()
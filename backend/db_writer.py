@@ -7,9 +7,10 @@ into a single thread/connection to avoid concurrent writers causing
 Usage:
     from backend.db_writer import enqueue_products, start_db_writer, stop_db_writer
     start_db_writer()
-    enqueue_products(list_of_product_dicts)
+    enqueue_products(list_of_product_records)
     stop_db_writer()
 """
+import os
 import threading
 import queue
 import sqlite3
@@ -17,6 +18,7 @@ import time
 from typing import List
 from logger_config import get_logger
 from backend.config import DB_PATH
+from backend.database import _product_row
 
 logger = get_logger(__name__)
 
@@ -43,8 +45,8 @@ class DBWriter:
         self._stop.set()
         self._thread.join(timeout=wait)
 
-    def enqueue(self, products: List[dict]):
-        # Queue one batch (list of dicts) at a time
+    def enqueue(self, products: List["ProductRecord"]):
+        # Queue one batch (list of ProductRecord or legacy dicts) at a time
         try:
             before = self._queue.qsize()
         except Exception:
@@ -81,15 +83,8 @@ class DBWriter:
 
             for p in batch:
                 try:
-                    prod_id = p.get('id') or p.get('url')
-                    name = p.get('name')
-                    price = p.get('price')
-                    url = p.get('url')
-                    image = p.get('image')
-                    rating = p.get('rating')
-                    review_count = p.get('review_count')
-                    metadata = p.get('metadata') or ''
-                    created_at = p.get('timestamp')
+                    row = _product_row(p)
+                    name, url = row[1], row[3]
 
                     cur.execute(
                         """
@@ -97,7 +92,7 @@ class DBWriter:
                         (id, name, price, url, image, rating, review_count, metadata, created_at)
                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                         """,
-                        (prod_id, name, price, url, image, rating, review_count, metadata, created_at)
+                        row
                     )
                     # Log per-product insertion success
                     try:
@@ -109,7 +104,7 @@ class DBWriter:
                         # rowcount access may not always be supported; ignore errors here
                         pass
                 except sqlite3.OperationalError as oe:
-                    logger.warning("DBWriter OperationalError saving product '%s': %s", p.get('name'), oe)
+                    logger.warning("DBWriter OperationalError saving product '%s': %s", name, oe)
                     # skip this product
                     continue
                 except Exception as e:
@@ -143,8 +138,8 @@ def stop_db_writer():
     _writer.stop()
 
 
-def enqueue_products(products: List[dict]):
-    """Enqueue a list of product dicts for background writing.
+def enqueue_products(products: List["ProductRecord"]):
+    """Enqueue a list of products (ProductRecord or dict) for background writing.
 
     This function starts the writer if it isn't running yet.
     """
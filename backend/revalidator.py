@@ -0,0 +1,124 @@
+"""Background re-crawls for stale-while-revalidate serving.
+
+When ``product_retrieval`` finds hits that are past the soft TTL, the chat path
+answers from them immediately and calls ``schedule_revalidation``; the re-crawl
+and re-index then run here, off the request.
+
+  - at most one re-crawl per product runs at a time; further requests for the
+    same key while it is in flight are counted as deduplicated,
+  - after a re-crawl finishes the key is not scheduled again for
+    ``REVALIDATE_COOLDOWN_SECONDS``, which covers the time the vector indexer
+    needs to make the new documents searchable,
+  - ``REVALIDATE_MAX_CONCURRENT`` bounds how many re-crawls (browsers) run at
+    once; extra requests wait in the executor queue.
+
+Usage:
+    from backend.revalidator import schedule_revalidation
+    schedule_revalidation("iphone 15", lambda: refresh("iphone 15"))
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+MAX_CONCURRENT = int(os.getenv("REVALIDATE_MAX_CONCURRENT", "2"))
+COOLDOWN_SECONDS = float(os.getenv("REVALIDATE_COOLDOWN_SECONDS", "600"))
+
+
+class Revalidator:
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT, cooldown_seconds: float = COOLDOWN_SECONDS):
+        self.cooldown_seconds = cooldown_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="revalidator")
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, float] = {}
+        self._finished: Dict[str, float] = {}
+        self._stats = {"scheduled": 0, "deduplicated": 0, "cooling_down": 0, "completed": 0, "failed": 0}
+        self._durations = []
+
+    def schedule(self, key: str, refresh: Callable[[], object]) -> bool:
+        """Run ``refresh`` in the background unless ``key`` is in flight or cooling down."""
+        now = time.monotonic()
+        with self._lock:
+            if key in self._in_flight:
+                self._stats["deduplicated"] += 1
+                return False
+            finished_at = self._finished.get(key)
+            if finished_at is not None and now - finished_at < self.cooldown_seconds:
+                self._stats["cooling_down"] += 1
+                return False
+            self._in_flight[key] = now
+            self._stats["scheduled"] += 1
+        logger.info("Revalidator: scheduled background re-crawl for %r", key)
+        try:
+            self._pool.submit(self._run, key, refresh)
+        except RuntimeError as e:
+            # Executor đã shutdown (đang tắt server)
+            logger.warning("Revalidator: cannot schedule %r: %s", key, e)
+            with self._lock:
+                self._in_flight.pop(key, None)
+            return False
+        return True
+
+    def _run(self, key: str, refresh: Callable[[], object]):
+        started = time.monotonic()
+        ok = True
+        try:
+            refresh()
+        except Exception as e:
+            ok = False
+            logger.error("Revalidator: re-crawl for %r failed: %s", key, e)
+        finished = time.monotonic()
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._finished[key] = finished
+            self._stats["completed" if ok else "failed"] += 1
+            self._durations = (self._durations + [finished - started])[-200:]
+            # Dọn các key đã hết cooldown
+            for stale_key in [k for k, t in self._finished.items() if finished - t > self.cooldown_seconds]:
+                del self._finished[stale_key]
+        logger.info("Revalidator: re-crawl for %r finished in %.1fs", key, finished - started)
+
+    def stop(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = sorted(self._in_flight)
+            stats["cooling_down_keys"] = len(self._finished)
+            durations = sorted(self._durations)
+        if durations:
+            stats["duration_p50_seconds"] = round(durations[len(durations) // 2], 2)
+            stats["duration_max_seconds"] = round(durations[-1], 2)
+        return stats
+
+
+# Module-level revalidator instance
+_revalidator: Optional[Revalidator] = None
+_revalidator_lock = threading.Lock()
+
+
+def _get_revalidator() -> Revalidator:
+    global _revalidator
+    with _revalidator_lock:
+        if _revalidator is None:
+            _revalidator = Revalidator()
+        return _revalidator
+
+
+def schedule_revalidation(key: str, refresh: Callable[[], object]) -> bool:
+    return _get_revalidator().schedule(key, refresh)
+
+
+def stop_revalidator():
+    if _revalidator is not None:
+        _revalidator.stop()
+
+
+def get_revalidator_stats() -> Dict:
+    return _get_revalidator().stats()
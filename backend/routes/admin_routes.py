@@ -1,4 +1,6 @@
 """Admin routes - giữ nguyên từ main.py"""
+import os
+import sys
 import uuid
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -18,6 +20,21 @@ from ..models import User, Platform, PlatformCreate
 
 router = APIRouter()
 
+CRAWL_DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'Crawl_Data'))
+
+
+def _get_crawl_telemetry():
+    """Return the process-wide crawl telemetry.
+
+    Crawler modules import each other by flat name (``crawl_telemetry``), so
+    import it the same way to share the singleton instead of creating a
+    second ``Crawl_Data.crawl_telemetry`` module.
+    """
+    if CRAWL_DATA_DIR not in sys.path:
+        sys.path.append(CRAWL_DATA_DIR)
+    from crawl_telemetry import telemetry
+    return telemetry
+
 @router.get("/admin/users/", response_model=List[User])
 async def get_all_users(current_user: Dict = Depends(get_current_user)):
     """Get all users (admin only)"""
@@ -127,6 +144,89 @@ async def get_stats(current_user: Dict = Depends(get_current_user)):
         "total_platforms": total_platforms
     }
 
+@router.get("/admin/crawl-telemetry")
+async def get_crawl_telemetry(current_user: Dict = Depends(get_current_user)):
+    """Rolling per-platform, per-stage crawl timing histograms (admin only)"""
+    if not current_user["is_admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view crawl telemetry"
+        )
+
+    return _get_crawl_telemetry().snapshot()
+
+@router.get("/admin/intent-stats")
+async def get_intent_stats(current_user: Dict = Depends(get_current_user)):
+    """Local intent classifier counters, including LLM calls avoided (admin only)"""
+    if not current_user["is_admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view intent classifier stats"
+        )
+
+    from intent_classifier import get_intent_classifier
+    return get_intent_classifier().stats()
+
+@router.get("/admin/semantic-cache")
+async def get_semantic_cache_stats(current_user: Dict = Depends(get_current_user)):
+    """Semantic answer cache hit ratio and size (admin only)"""
+    if not current_user["is_admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view semantic cache stats"
+        )
+
+    from semantic_cache import get_semantic_cache
+    return get_semantic_cache().stats()
+
+@router.get("/admin/vector-indexer")
+async def get_vector_indexer_stats(current_user: Dict = Depends(get_current_user)):
+    """Background vector indexer queue depth, throughput and lag (admin only)"""
+    if not current_user["is_admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view vector indexer stats"
+        )
+
+    from ..vector_indexer import get_indexer_stats
+    return get_indexer_stats()
+
+@router.get("/admin/revalidation")
+async def get_revalidation_stats(current_user: Dict = Depends(get_current_user)):
+    """Stale-while-revalidate background re-crawls: in flight, deduplicated, failed (admin only)"""
+    if not current_user["is_admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view revalidation stats"
+        )
+
+    from ..revalidator import get_revalidator_stats
+    return get_revalidator_stats()
+
+@router.get("/admin/conversation-memory")
+async def get_conversation_memory_stats(current_user: Dict = Depends(get_current_user)):
+    """Conversation memory: cached conversations, background summary folds and budgets (admin only)"""
+    if not current_user["is_admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view conversation memory stats"
+        )
+
+    from ..conversation_memory import get_conversation_memory_stats
+    return get_conversation_memory_stats()
+
+@router.get("/admin/clients")
+async def get_clients_stats(current_user: Dict = Depends(get_current_user)):
+    """Shared LLM / embedding / Chroma clients: which are open and the connection limits (admin only)"""
+    if not current_user["is_admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view client stats"
+        )
+
+    from client_registry import get_client_stats
+    return get_client_stats()
+
 @router.get("/platforms/", response_model=List[Platform])
 async def get_platforms(current_user: Dict = Depends(get_current_user)):
     """Get all platforms (admin feature)"""
@@ -1,7 +1,10 @@
 """Conversation & Message routes - giữ nguyên từ main.py"""
+import json
+import threading
 import uuid
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from typing import Dict, List
 
 try:
@@ -12,18 +15,40 @@ except ImportError:
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
-# Import chatbot
-try:
-    from chatbot import process_user_query
-    CHATBOT_AVAILABLE = True
-except ImportError as e:
-    CHATBOT_AVAILABLE = False
-    print(f"Warning: Chatbot not available: {e}")
-    def process_user_query(query: str) -> str:
+# Chatbot kéo theo LangChain, OpenAI, Chroma và các crawler: import ở lần chat đầu tiên
+# (main warm-up nền sẵn), không chặn server khởi động
+_chatbot = None
+_chatbot_lock = threading.Lock()
+
+
+class _ChatbotUnavailable:
+    def process_user_query(self, query: str, memory=None) -> str:
         return "Chatbot is not configured. Please check dependencies."
 
+    async def aprocess_user_query(self, query: str, memory=None) -> str:
+        return self.process_user_query(query)
+
+    async def astream_user_query(self, query: str, memory=None):
+        yield "token", self.process_user_query(query)
+
+
+def get_chatbot():
+    """Import ``chatbot`` on first use; a stand-in answers if its dependencies are missing."""
+    global _chatbot
+    if _chatbot is None:
+        with _chatbot_lock:
+            if _chatbot is None:
+                try:
+                    import chatbot
+                    _chatbot = chatbot
+                except ImportError as e:
+                    print(f"Warning: Chatbot not available: {e}")
+                    _chatbot = _ChatbotUnavailable()
+    return _chatbot
+
 from ..database import get_db
 from ..auth import get_current_user
+from ..conversation_memory import get_conversation_memory
 from ..models import ConversationCreate, Conversation, Message, ChatRequest, ChatResponse
 
 router = APIRouter()
@@ -142,6 +167,7 @@ async def delete_conversation(
     
     conn.commit()
     conn.close()
+    get_conversation_memory().forget(conversation_id)
     
     logger.info(f"Conversation deleted: {conversation_id}")
     return None
@@ -213,6 +239,9 @@ async def chat(
             detail="Conversation not found"
         )
     
+    # Summary + recent turns, read before this message is saved
+    memory = get_conversation_memory().load(conversation_id)
+
     # Save user message
     user_message_id = str(uuid.uuid4())
     created_at = datetime.utcnow().isoformat()
@@ -224,7 +253,8 @@ async def chat(
     
     # Get AI response using chatbot
     try:
-        ai_response = process_user_query(chat_request.message)
+        # Async pipeline: không chặn event loop trong lúc chờ LLM/crawl
+        ai_response = await get_chatbot().aprocess_user_query(chat_request.message, memory=memory)
     except Exception as e:
         # Log full exception with stack trace and context to help debugging
         try:
@@ -255,6 +285,8 @@ async def chat(
     
     conn.commit()
     conn.close()
+    # Lưu sản phẩm đang hỏi, tóm tắt các lượt cũ ở nền
+    get_conversation_memory().update(memory, chat_request.message, ai_response)
     
     logger.info(f"Chat message processed in conversation {conversation_id}")
     
@@ -263,3 +295,102 @@ async def chat(
         conversation_id=conversation_id,
         message_id=assistant_message_id
     )
+
+
+def _sse(event: str, data: Dict) -> str:
+    """Format one server-sent event (data is JSON so newlines in tokens are safe)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _save_assistant_message(conversation_id: str, content: str) -> str:
+    """Persist an assistant message and bump the conversation's updated_at"""
+    conn = get_db()
+    cursor = conn.cursor()
+    message_id = str(uuid.uuid4())
+    created_at = datetime.utcnow().isoformat()
+    cursor.execute("""
+        INSERT INTO messages (id, conversation_id, role, content, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (message_id, conversation_id, "assistant", content, created_at))
+    cursor.execute("""
+        UPDATE conversations 
+        SET updated_at = ? 
+        WHERE id = ?
+    """, (created_at, conversation_id))
+    conn.commit()
+    conn.close()
+    return message_id
+
+
+@router.post("/conversations/{conversation_id}/chat/stream")
+async def chat_stream(
+    conversation_id: str,
+    chat_request: ChatRequest,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Send a message and stream the answer as server-sent events.
+
+    Events: ``status`` ({"text"}) for long steps such as crawling, ``token``
+    ({"text"}) for answer chunks, and a final ``done`` ({"message_id",
+    "conversation_id"}) once the full answer has been saved to ``messages``.
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    # Verify conversation belongs to user
+    cursor.execute("""
+        SELECT * FROM conversations 
+        WHERE id = ? AND user_id = ?
+    """, (conversation_id, current_user["id"]))
+    conversation = cursor.fetchone()
+    
+    if not conversation:
+        conn.close()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    
+    memory = get_conversation_memory().load(conversation_id)
+
+    # Save user message before streaming starts
+    cursor.execute("""
+        INSERT INTO messages (id, conversation_id, role, content, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (str(uuid.uuid4()), conversation_id, "user", chat_request.message, datetime.utcnow().isoformat()))
+    conn.commit()
+    conn.close()
+
+    async def event_stream():
+        parts = []
+        completed = False
+        try:
+            async for kind, text in get_chatbot().astream_user_query(chat_request.message, memory=memory):
+                if kind == "token":
+                    parts.append(text)
+                yield _sse(kind, {"text": text})
+            completed = True
+        except Exception as e:
+            logger.exception(
+                "Error streaming query for conversation %s user %s: %s",
+                conversation_id, current_user.get('username'), str(e)
+            )
+            if not parts:
+                parts.append("Xin lỗi, đã có lỗi xảy ra khi xử lý yêu cầu của bạn.")
+                yield _sse("token", {"text": parts[-1]})
+            completed = True
+        finally:
+            # Persist whatever was generated, even if the client disconnected mid-stream
+            ai_response = "".join(parts)
+            message_id = _save_assistant_message(conversation_id, ai_response) if ai_response else None
+            if ai_response:
+                get_conversation_memory().update(memory, chat_request.message, ai_response)
+            logger.info(f"Streamed chat message processed in conversation {conversation_id}")
+        if completed:
+            yield _sse("done", {"message_id": message_id, "conversation_id": conversation_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
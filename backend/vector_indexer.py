@@ -0,0 +1,286 @@
+"""Background write-behind indexer for the products vector store.
+
+After a crawl, ``process_user_query`` used to call
+``products_vector_db.add_documents`` before returning, so embedding latency
+was added to the user's wait. The chat path now only enqueues documents; this
+module batches them across requests and upserts them into Chroma from a
+background thread.
+
+  - the queue is bounded (``VECTOR_INDEX_QUEUE_SIZE`` documents); when it is
+    full new documents are dropped and counted instead of blocking the chat,
+  - a batch is flushed when ``VECTOR_INDEX_BATCH_SIZE`` documents are pending
+    or ``VECTOR_INDEX_FLUSH_SECONDS`` after its first document arrived,
+  - a batch is split into chunks embedded concurrently by
+    ``VECTOR_INDEX_CONCURRENCY`` threads, and chunk starts are spaced so no
+    more than ``VECTOR_INDEX_RATE_PER_SECOND`` embedding requests are issued,
+  - ids are assigned at enqueue time (callers pass stable product keys, see
+    ``ProductRecord.key``), so re-crawls and retried chunks upsert instead of
+    duplicating; within one batch only the newest document per id is kept,
+  - after a chunk is upserted into Chroma it is written with the same ids to
+    the FTS5 lexical index used by ``hybrid_retrieval``,
+  - every document gets an ``indexed_at`` epoch in its metadata so searches
+    can filter on freshness.
+
+Usage:
+    from backend.vector_indexer import enqueue_documents, start_vector_indexer, stop_vector_indexer
+    start_vector_indexer()
+    enqueue_documents(list_of_documents)
+    stop_vector_indexer()
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+QUEUE_SIZE = int(os.getenv("VECTOR_INDEX_QUEUE_SIZE", "5000"))
+BATCH_SIZE = int(os.getenv("VECTOR_INDEX_BATCH_SIZE", "64"))
+FLUSH_SECONDS = float(os.getenv("VECTOR_INDEX_FLUSH_SECONDS", "1.0"))
+CONCURRENCY = int(os.getenv("VECTOR_INDEX_CONCURRENCY", "4"))
+CHUNK_SIZE = int(os.getenv("VECTOR_INDEX_CHUNK_SIZE", "16"))
+RATE_PER_SECOND = float(os.getenv("VECTOR_INDEX_RATE_PER_SECOND", "5"))
+MAX_RETRIES = int(os.getenv("VECTOR_INDEX_MAX_RETRIES", "3"))
+
+
+class _RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart (thread-safe)"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class VectorIndexer:
+    def __init__(self, get_store: Callable, get_lexical_index: Optional[Callable] = None, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_seconds: float = FLUSH_SECONDS, concurrency: int = CONCURRENCY,
+                 chunk_size: int = CHUNK_SIZE, rate_per_second: float = RATE_PER_SECOND,
+                 max_retries: int = MAX_RETRIES):
+        # get_store is called lazily in the worker so importing this module never opens Chroma
+        self._get_store = get_store
+        self._get_lexical_index = get_lexical_index
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._limiter = _RateLimiter(rate_per_second)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="vector-indexer")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._lags = deque(maxlen=500)
+        self._stats = {"enqueued": 0, "indexed": 0, "failed": 0, "dropped": 0, "retries": 0, "batches": 0,
+                       "superseded": 0}
+        self._last_batch_seconds: Optional[float] = None
+        self._last_indexed_at: Optional[float] = None
+
+    def start(self):
+        if not self._thread.is_alive():
+            logger.info("Starting VectorIndexer thread")
+            try:
+                self._thread.start()
+            except Exception as e:
+                logger.exception("Failed to start VectorIndexer thread: %s", e)
+        else:
+            logger.debug("VectorIndexer thread already running")
+
+    def stop(self, wait: float = 10.0):
+        logger.info("Stopping VectorIndexer thread (pending=%d)", self._queue.qsize())
+        self._stop.set()
+        self._thread.join(timeout=wait)
+        if self._thread.is_alive():
+            # _run vẫn đang xử lý batch: nó tự đóng pool khi thoát, đóng ở đây sẽ làm mất batch
+            logger.warning("VectorIndexer still flushing after %.1fs (pending=%d); pool closes when it exits",
+                           wait, self._queue.qsize())
+            return
+        self._pool.shutdown(wait=False)
+
+    def enqueue(self, documents: List, ids: Optional[List[str]] = None) -> int:
+        """Queue documents for indexing without blocking; returns how many were accepted."""
+        if self._stop.is_set():
+            # Không còn thread nào lấy hàng đợi ra (và không start lại được)
+            with self._lock:
+                self._stats["dropped"] += len(documents)
+            logger.warning("VectorIndexer is stopped: dropped %d documents", len(documents))
+            return 0
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        accepted = 0
+        now = time.monotonic()
+        indexed_at = int(time.time())
+        for doc_id, document in zip(ids, documents):
+            # Epoch số để lọc độ mới bằng Chroma where (query_filters.to_chroma_where)
+            document.metadata = {**(document.metadata or {}), "indexed_at": indexed_at}
+            try:
+                self._queue.put_nowait((doc_id, document, now))
+                accepted += 1
+            except queue.Full:
+                break
+        with self._lock:
+            self._stats["enqueued"] += accepted
+            self._stats["dropped"] += len(documents) - accepted
+        if accepted < len(documents):
+            logger.warning("VectorIndexer queue full: dropped %d documents", len(documents) - accepted)
+        logger.info("Enqueued %d documents for vector indexing (pending=%d)", accepted, self._queue.qsize())
+        # Ensure thread is running
+        if not self._thread.is_alive():
+            self.start()
+        return accepted
+
+    def _next_batch(self) -> List:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _index_chunk(self, store, chunk: List) -> bool:
+        ids = [item[0] for item in chunk]
+        documents = [item[1] for item in chunk]
+        for attempt in range(1, self.max_retries + 1):
+            self._limiter.acquire()
+            try:
+                # langchain_chroma upserts when ids are given
+                store.add_documents(documents, ids=ids)
+                self._index_lexical(documents, ids)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("VectorIndexer: chunk of %d documents failed after %d attempts: %s",
+                                 len(chunk), attempt, e)
+                    return False
+                with self._lock:
+                    self._stats["retries"] += 1
+                backoff = 0.5 * 2 ** (attempt - 1)
+                logger.warning("VectorIndexer: upsert failed (%s); retrying in %.1fs", e, backoff)
+                time.sleep(backoff)
+        return False
+
+    def _index_lexical(self, documents: List, ids: List[str]):
+        if self._get_lexical_index is None:
+            return
+        try:
+            self._get_lexical_index().add(documents, ids)
+        except Exception as e:
+            # Chroma đã có dữ liệu; lexical index có thể rebuild sau (hybrid_retrieval --rebuild)
+            logger.error("VectorIndexer: lexical index write failed: %s", e)
+
+    def _run(self):
+        try:
+            self._drain()
+        finally:
+            self._pool.shutdown(wait=False)
+        logger.info("VectorIndexer stopped")
+
+    def _drain(self):
+        try:
+            store = self._get_store()
+        except Exception as e:
+            logger.exception("VectorIndexer failed to open vector store: %s", e)
+            return
+        logger.info("VectorIndexer started")
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            started = time.monotonic()
+            # Chroma từ chối ids trùng trong một lần upsert: giữ bản mới nhất của mỗi id
+            latest = {item[0]: item for item in batch}
+            unique = list(latest.values())
+            chunks = [unique[i:i + self.chunk_size] for i in range(0, len(unique), self.chunk_size)]
+            results = list(self._pool.map(lambda chunk: self._index_chunk(store, chunk), chunks))
+            finished = time.monotonic()
+
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["superseded"] += len(batch) - len(unique)
+                self._last_batch_seconds = finished - started
+                for chunk, ok in zip(chunks, results):
+                    if ok:
+                        self._stats["indexed"] += len(chunk)
+                        self._lags.extend(finished - item[2] for item in chunk)
+                    else:
+                        self._stats["failed"] += len(chunk)
+                self._last_indexed_at = time.time()
+            logger.info("VectorIndexer: indexed batch of %d documents in %.2fs", len(batch), finished - started)
+            for _ in batch:
+                self._queue.task_done()
+
+    def stats(self) -> Dict:
+        """Counters plus lag (seconds from enqueue to indexed) for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+            lags = sorted(self._lags)
+            stats["last_batch_seconds"] = round(self._last_batch_seconds, 3) if self._last_batch_seconds else None
+            stats["last_indexed_at"] = self._last_indexed_at
+        # Đọc phần tử đầu dưới mutex của Queue: worker có thể lấy mất nó giữa qsize() và [0]
+        with self._queue.mutex:
+            stats["pending"] = len(self._queue.queue)
+            oldest = self._queue.queue[0][2] if self._queue.queue else None
+        stats["oldest_pending_seconds"] = round(time.monotonic() - oldest, 3) if oldest else 0.0
+        if lags:
+            stats["lag_p50_seconds"] = round(lags[len(lags) // 2], 3)
+            stats["lag_p95_seconds"] = round(lags[min(len(lags) - 1, int(len(lags) * 0.95))], 3)
+            stats["lag_max_seconds"] = round(lags[-1], 3)
+        stats["running"] = self._thread.is_alive()
+        return stats
+
+
+def _products_vector_db():
+    from client_registry import get_vector_db
+    return get_vector_db()
+
+
+def _lexical_index():
+    from hybrid_retrieval import get_lexical_index
+    return get_lexical_index()
+
+
+# Module-level indexer instance
+_indexer = VectorIndexer(_products_vector_db, _lexical_index)
+
+
+def start_vector_indexer():
+    _indexer.start()
+
+
+def stop_vector_indexer():
+    _indexer.stop()
+
+
+def enqueue_documents(documents: List, ids: Optional[List[str]] = None) -> int:
+    """Enqueue LangChain Documents for background upsert into the products vector store.
+
+    This function starts the indexer if it isn't running yet.
+    """
+    return _indexer.enqueue(documents, ids)
+
+
+def get_indexer_stats() -> Dict:
+    return _indexer.stats()
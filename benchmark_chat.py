@@ -0,0 +1,159 @@
+"""Offline latency benchmark of the chat pipeline (``process_user_query`` / ``astream_user_query``).
+
+Runs with the stand-ins from ``offline_models`` (``CHAT_BACKEND=scripted``,
+``EMBEDDING_BACKEND=hashing`` unless set otherwise), so it needs no API key
+or network and repeated runs give comparable numbers:
+
+  1. a temporary Chroma directory and FTS5 index are seeded from a catalog JSON
+     (``iphones_tiki.json`` by default); ``chroma_data/`` is never touched,
+  2. ``--requests`` price questions about catalog products are sent either
+     one by one through ``process_user_query`` (``--mode sync``) or through
+     ``astream_user_query`` with ``--concurrency`` in flight (``--mode stream``),
+  3. latency p50 / p95 / max, time to first token (stream) and throughput are
+     printed, with the number of retrieval misses. Misses are not crawled
+     unless ``--allow-crawl`` is given.
+
+Latency and token rate of the scripted model come from
+``OFFLINE_CHAT_LATENCY_MS`` / ``OFFLINE_CHAT_TOKENS_PER_SECOND``.
+
+Usage:
+    python benchmark_chat.py
+    python benchmark_chat.py --mode stream --requests 200 --concurrency 16 --no-semantic-cache
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(values)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def _print_row(label: str, values_ms: List[float]):
+    stats = _percentiles(values_ms)
+    print(f"{label:<20}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['max']:>10.1f}")
+
+
+def seed_store(catalog_path: str) -> int:
+    from client_registry import get_vector_db
+    from create_vector_database import create_documents_from_products, keyed_documents
+    from hybrid_retrieval import get_lexical_index
+
+    with open(catalog_path, "r", encoding="utf-8") as f:
+        products = json.load(f)
+    ids, documents = keyed_documents(create_documents_from_products(products))
+    get_vector_db().add_documents(documents, ids=ids)
+    get_lexical_index().add(documents, ids)
+    return len(documents)
+
+
+def build_questions(catalog_path: str, count: int) -> List[str]:
+    with open(catalog_path, "r", encoding="utf-8") as f:
+        titles = list(dict.fromkeys(product.get("title", "") for product in json.load(f) if product.get("title")))
+    return [f"giá {titles[i % len(titles)]}" for i in range(count)]
+
+
+def run_sync(chatbot, questions: List[str]) -> Dict:
+    latencies = []
+    started = time.perf_counter()
+    for question in questions:
+        t0 = time.perf_counter()
+        chatbot.process_user_query(question)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return {"latency": latencies, "wall": time.perf_counter() - started}
+
+
+async def run_stream(chatbot, questions: List[str], concurrency: int) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, first_tokens = [], []
+
+    async def one(question: str):
+        async with semaphore:
+            t0 = time.perf_counter()
+            first = None
+            async for kind, _ in chatbot.astream_user_query(question):
+                if kind == "token" and first is None:
+                    first = (time.perf_counter() - t0) * 1000
+            latencies.append((time.perf_counter() - t0) * 1000)
+            first_tokens.append(first if first is not None else latencies[-1])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(question) for question in questions))
+    return {"latency": latencies, "first_token": first_tokens, "wall": time.perf_counter() - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default="iphones_tiki.json")
+    parser.add_argument("--mode", choices=["sync", "stream"], default="sync")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight (stream mode)")
+    parser.add_argument("--no-semantic-cache", action="store_true", help="always run retrieval + generation")
+    parser.add_argument("--allow-crawl", action="store_true", help="crawl on retrieval misses (needs network)")
+    args = parser.parse_args()
+
+    # Phải đặt trước khi import module dự án: các backend / đường dẫn đọc env lúc import
+    os.environ.setdefault("CHAT_BACKEND", "scripted")
+    os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+    workdir = tempfile.mkdtemp(prefix="benchmark_chat_")
+    os.environ.setdefault("PRODUCTS_CHROMA_PATH", os.path.join(workdir, "chroma"))
+    os.environ.setdefault("LEXICAL_INDEX_PATH", os.path.join(workdir, "lexical_index.db"))
+
+    import chatbot
+    from client_registry import get_chat_model, get_client_stats
+
+    seeded = seed_store(args.catalog)
+    questions = build_questions(args.catalog, args.requests)
+
+    misses = []
+    if not args.allow_crawl:
+        # Miss -> không crawl (cần mạng), chỉ đếm
+        def no_crawl(product_name, limit=None):
+            misses.append(product_name)
+            return []
+
+        async def ano_crawl(product_name, limit=None):
+            return no_crawl(product_name, limit)
+
+        chatbot.crawl_all_platforms, chatbot.acrawl_all_platforms = no_crawl, ano_crawl
+    if args.no_semantic_cache:
+        chatbot.semantic_cache.threshold = float("inf")
+
+    stats = get_client_stats()
+    print(f"backends: chat={stats['chat_backend']} embeddings={stats['embedding_backend']} "
+          f"vectors={stats['vector_backend']}; "
+          f"seeded {seeded} products into {workdir}")
+    if args.mode == "sync":
+        result = run_sync(chatbot, questions)
+    else:
+        result = asyncio.run(run_stream(chatbot, questions, args.concurrency))
+
+    print(f"\n{args.requests} requests, mode={args.mode}"
+          f"{f', concurrency={args.concurrency}' if args.mode == 'stream' else ''}")
+    print(f"{'':<20}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    _print_row("latency", result["latency"])
+    if "first_token" in result:
+        _print_row("time to first token", result["first_token"])
+    print(f"throughput: {args.requests / result['wall']:.2f} req/s")
+    print(f"retrieval misses: {len(misses)}; LLM calls: {getattr(get_chat_model(), 'calls', '-')}; "
+          f"semantic cache: {chatbot.semantic_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
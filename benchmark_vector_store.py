@@ -0,0 +1,191 @@
+"""Latency / recall / memory benchmark of the vector store backends.
+
+Compares Chroma (``langchain_chroma``'s default HNSW, l2 space) with
+``NumpyVectorStore`` in exact mode and in IVF mode, on synthetic clustered
+unit vectors so that no API key or network is needed and runs are repeatable
+(``--seed``):
+
+  1. ``--n`` catalog vectors and ``--queries`` query vectors (noisy copies of
+     catalog vectors) of dimension ``--dim`` are generated, and the exact
+     float32 top ``--k`` of each query is the ground truth,
+  2. each backend is built from them in its own subprocess (build time),
+  3. each backend is then opened from disk in a fresh subprocess that runs
+     every query one at a time: open time, query p50 / p95, recall@k against
+     the ground truth, and the resident memory of the serving process
+     (current RSS after the queries and the peak, from ``/proc/self/status``).
+
+Only the serving numbers matter for the API process; builds happen offline.
+The temporary directory is removed at the end unless ``--keep`` is given.
+
+Usage:
+    python benchmark_vector_store.py
+    python benchmark_vector_store.py --n 200000 --dim 1536 --nlist 512 --nprobe 16
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+BACKENDS = ("chroma", "numpy", "numpy-ivf")
+BUILD_BATCH_SIZE = 5000
+
+
+def make_dataset(n: int, dim: int, queries: int, clusters: int, seed: int):
+    """Clustered unit vectors (like product families) and queries near catalog items."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = rng.integers(0, n, queries)
+    noise = rng.standard_normal((queries, dim)).astype(np.float32) * (0.5 / np.sqrt(dim))
+    query_vectors = vectors[picks] + noise
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    top = [np.argpartition(-(query_block @ vectors.T), k - 1, axis=1)[:, :k]
+           for query_block in np.array_split(queries, max(1, len(queries) // 64))]
+    return np.concatenate(top)
+
+
+def _rss_mb() -> Dict[str, float]:
+    # VmHWM thay cho ru_maxrss: ru_maxrss giữ nguyên qua execve nên tính cả RSS của tiến trình cha
+    with open("/proc/self/status") as f:
+        status = dict(line.split(":", 1) for line in f if ":" in line)
+    return {"rss_mb": int(status["VmRSS"].split()[0]) / 1024, "peak_rss_mb": int(status["VmHWM"].split()[0]) / 1024}
+
+
+def _ids(n: int) -> List[str]:
+    return [f"item-{i}" for i in range(n)]
+
+
+def worker_build(backend: str, workdir: str, nlist: int) -> Dict:
+    vectors = np.load(os.path.join(workdir, "vectors.npy"), mmap_mode="r")
+    ids = _ids(len(vectors))
+    started = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=os.path.join(workdir, "chroma")).create_collection("bench")
+        for start in range(0, len(vectors), BUILD_BATCH_SIZE):
+            end = start + BUILD_BATCH_SIZE
+            collection.add(ids=ids[start:end], embeddings=np.asarray(vectors[start:end]),
+                           metadatas=[{"i": i} for i in range(start, min(end, len(vectors)))])
+    else:
+        from numpy_vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(os.path.join(workdir, backend))
+        for start in range(0, len(vectors), BUILD_BATCH_SIZE):
+            end = start + BUILD_BATCH_SIZE
+            store.upsert_embeddings(ids[start:end], vectors[start:end], None,
+                                    [{"i": i} for i in range(start, min(end, len(vectors)))])
+        if backend == "numpy-ivf":
+            store.build_ivf(nlist)
+        store.close()
+    return {"build_s": time.perf_counter() - started}
+
+
+def worker_serve(backend: str, workdir: str, k: int, nprobe: int) -> Dict:
+    queries = np.load(os.path.join(workdir, "queries.npy"))
+    started = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=os.path.join(workdir, "chroma")).get_collection("bench")
+        collection.count()
+
+        def search(query):
+            return [int(doc_id.split("-")[1]) for doc_id in
+                    collection.query(query_embeddings=[query], n_results=k, include=[])["ids"][0]]
+    else:
+        from numpy_vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(os.path.join(workdir, backend), nprobe=nprobe)
+        store.count()
+
+        def search(query):
+            # row == thứ tự thêm vào (không có delete), nên row chính là chỉ số item
+            return [row for row, _ in store.search_by_vectors([query], k)[0]]
+    open_s = time.perf_counter() - started
+
+    latencies, results = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        results.append(search(query.tolist()))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return {"open_s": open_s, "latency_ms": latencies, "results": results, **_rss_mb()}
+
+
+def run_worker(mode: str, backend: str, args) -> Dict:
+    command = [sys.executable, os.path.abspath(__file__), "--worker", mode, "--backend", backend,
+               "--workdir", args.workdir, "--k", str(args.k), "--nlist", str(args.nlist),
+               "--nprobe", str(args.nprobe)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{backend} {mode} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory")
+    parser.add_argument("--worker", choices=["build", "serve"], help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        if args.worker == "build":
+            output = worker_build(args.backend, args.workdir, args.nlist)
+        else:
+            output = worker_serve(args.backend, args.workdir, args.k, args.nprobe)
+        print(json.dumps(output))
+        return
+
+    args.workdir = tempfile.mkdtemp(prefix="benchmark_vector_store_")
+    try:
+        vectors, queries = make_dataset(args.n, args.dim, args.queries, args.clusters, args.seed)
+        np.save(os.path.join(args.workdir, "vectors.npy"), vectors)
+        np.save(os.path.join(args.workdir, "queries.npy"), queries)
+        truth = [set(row) for row in exact_top_k(vectors, queries, args.k).tolist()]
+        del vectors
+        print(f"{args.n} vectors x {args.dim} dims, {args.queries} queries, k={args.k} "
+              f"(IVF nlist={args.nlist}, nprobe={args.nprobe}) in {args.workdir}\n")
+        print(f"{'backend':<11}{'build s':>9}{'open ms':>9}{'p50 ms':>9}{'p95 ms':>9}"
+              f"{'recall':>8}{'rss MB':>9}{'peak MB':>9}{'disk MB':>9}")
+        for backend in args.backends.split(","):
+            build = run_worker("build", backend, args)
+            serve = run_worker("serve", backend, args)
+            recall = statistics.mean(len(truth[i] & set(found)) / args.k for i, found in enumerate(serve["results"]))
+            latencies = sorted(serve["latency_ms"])
+            path = os.path.join(args.workdir, backend)
+            disk_mb = sum(os.path.getsize(os.path.join(root, name))
+                          for root, _, names in os.walk(path) for name in names) / 2**20
+            print(f"{backend:<11}{build['build_s']:>9.1f}{serve['open_s'] * 1000:>9.0f}"
+                  f"{statistics.median(latencies):>9.2f}{latencies[int(len(latencies) * 0.95)]:>9.2f}"
+                  f"{recall:>8.3f}{serve['rss_mb']:>9.0f}{serve['peak_rss_mb']:>9.0f}{disk_mb:>9.0f}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,137 +1,462 @@
 from dotenv import load_dotenv
 from logger_config import get_logger
-from tool import (
-    product_search_chain,
-    price_comparison_chain,
-    get_vector_db,
-    get_chat_model
-)
+from tool import product_answer_chain, price_comparison_chain
+from client_registry import get_chat_model, get_vector_db
 # Import multi-platform crawler thay cho Tiki only
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'Crawl_Data'))
-from Crawl_Data.run_all_crawlers import crawl_all_platforms
+from intent_classifier import INTENT_CHAT, INTENT_COMPARE, QueryIntent, get_intent_classifier, normalize_query
+from query_filters import QueryFilters, extract_filters
+from semantic_cache import get_semantic_cache
+from product_ranking import rank_products
+from product_retrieval import format_age, retrieve_products
+from context_serializer import format_documents
 
+import asyncio
+import functools
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
 from langchain_core.documents import Document
 load_dotenv()
 logger = get_logger(__name__)
-products_vector_db = get_vector_db()
-chat_model = get_chat_model()
+intent_classifier = get_intent_classifier()
+semantic_cache = get_semantic_cache()
 from backend.database import save_products
-def process_user_query(user_query: str) -> str:
-    logger.info(f"User query: {user_query}")
-    try:
-        intent_prompt = f"""
-        Bạn là một trợ lý AI. Hãy phân loại câu sau thành một trong hai loại:
-        1. "chat" - nếu người dùng chỉ đang trò chuyện, hỏi linh tinh, không yêu cầu so sánh giá.
-        2. "compare" - nếu người dùng đang muốn tìm, xem, hoặc so sánh giá sản phẩm.
+from backend.vector_indexer import enqueue_documents
+from backend.revalidator import schedule_revalidation
+from backend.conversation_memory import ConversationContext, resolve_follow_up
+
+
+_structured_intent_model = None
+
+# Các bước blocking còn lại (SQLite, embedding cho semantic cache) chạy trong
+# executor giới hạn để không chặn event loop của FastAPI
+CHAT_BLOCKING_WORKERS = int(os.getenv("CHAT_BLOCKING_WORKERS", "8"))
+_blocking_executor = ThreadPoolExecutor(max_workers=CHAT_BLOCKING_WORKERS, thread_name_prefix="chat-blocking")
+
+NOT_FOUND_MESSAGE = "Xin lỗi, tôi không tìm thấy thông tin về sản phẩm này trên các sàn thương mại điện tử. Vui lòng thử lại với từ khóa khác."
+ERROR_MESSAGE = "Xin lỗi, đã có lỗi xảy ra khi xử lý yêu cầu của bạn."
 
-        Câu người dùng: "{user_query}"
 
-        Nếu là "chat", chỉ trả về từ "chat".
-        Nếu là "compare", hãy trả về **tên sản phẩm kèm đặc điểm** (ví dụ: "iPhone 14 Pro 128GB").
+async def _run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, functools.partial(func, *args, **kwargs))
+
+
+def _memory_block(memory: Optional[ConversationContext], intro: str) -> str:
+    if memory is None or memory.is_empty():
+        return ""
+    return f"\n        {intro}\n{memory.render()}\n"
+
+
+def _intent_prompt(user_query: str, memory: Optional[ConversationContext] = None) -> str:
+    history = _memory_block(
+        memory, "Ngữ cảnh hội thoại trước (câu hỏi tiếp nối như \"còn bản 256GB thì sao?\" nói về sản phẩm "
+                "trong ngữ cảnh: khi đó product_name là tên đầy đủ của sản phẩm đó kèm thay đổi người dùng nêu):"
+    )
+    return f"""
+        Bạn là Sophie, trợ lý mua sắm AI. Hãy phân tích câu người dùng:
+        - intent = "chat" nếu người dùng chỉ đang trò chuyện, hỏi linh tinh, không yêu cầu so sánh giá.
+          Khi đó hãy viết "reply": phản hồi tự nhiên, thân thiện như một trợ lý AI.
+        - intent = "compare" nếu người dùng đang muốn tìm, xem, hoặc so sánh giá sản phẩm.
+          Khi đó "product_name" là tên sản phẩm kèm đặc điểm (ví dụ: "iPhone 14 Pro 128GB"),
+          và điền "filters" nếu người dùng nêu khoảng giá, sàn (tiki, lazada, cellphones, dienthoaivui), rating
+          hoặc độ mới của dữ liệu (max_age_hours, ví dụ "giá hôm nay" -> 24).
+        {history}
+        Câu người dùng: "{user_query}"
         """
 
-        intent_result = chat_model.invoke(intent_prompt).content.strip()
-        logger.info(f"Detected intent result: {intent_result}")
+
+def _chat_prompt(user_query: str, memory: Optional[ConversationContext] = None) -> str:
+    history = _memory_block(memory, "Hội thoại trước đó:")
+    return f"{history}Người dùng nói: {user_query}. Hãy phản hồi tự nhiên, thân thiện như một trợ lý AI."
+
+
+def _structured_model():
+    global _structured_intent_model
+    if _structured_intent_model is None:
+        _structured_intent_model = get_chat_model().with_structured_output(QueryIntent, method="function_calling")
+    return _structured_intent_model
+
+
+def _parse_intent_text(raw: str) -> QueryIntent:
+    raw = raw.strip()
+    logger.info(f"Detected intent result (LLM): {raw}")
+    try:
+        return QueryIntent.model_validate_json(raw[raw.index("{"):raw.rindex("}") + 1])
+    except ValueError:
+        if raw.lower() == "chat":
+            return QueryIntent(intent=INTENT_CHAT)
+        # Nếu không parse được, coi kết quả là tên sản phẩm cần tìm
+        return QueryIntent(intent=INTENT_COMPARE, product_name=raw)
+
+
+_JSON_INSTRUCTION = "\n        Chỉ trả về JSON với các khóa: intent, product_name, filters, reply."
+
+
+def _classify_intent_with_llm(user_query: str, memory: Optional[ConversationContext] = None) -> QueryIntent:
+    """Fallback khi classifier local không chắc chắn.
+
+    Một lần gọi LLM trả về intent, tên sản phẩm, bộ lọc và câu trả lời (nếu là
+    chat), nên câu chat kết thúc trong một round trip.
+    """
+    prompt = _intent_prompt(user_query, memory)
+    try:
+        parsed = _structured_model().invoke(prompt)
+        logger.info(f"Detected intent result (LLM structured): {parsed}")
+        return parsed
+    except Exception as e:
+        logger.warning(f"Structured intent output failed ({e}); falling back to JSON parsing")
+    return _parse_intent_text(get_chat_model().invoke(prompt + _JSON_INSTRUCTION).content)
+
+
+async def _aclassify_intent_with_llm(user_query: str, memory: Optional[ConversationContext] = None) -> QueryIntent:
+    """Bản async của _classify_intent_with_llm"""
+    prompt = _intent_prompt(user_query, memory)
+    try:
+        parsed = await _structured_model().ainvoke(prompt)
+        logger.info(f"Detected intent result (LLM structured): {parsed}")
+        return parsed
+    except Exception as e:
+        logger.warning(f"Structured intent output failed ({e}); falling back to JSON parsing")
+    return _parse_intent_text((await get_chat_model().ainvoke(prompt + _JSON_INSTRUCTION)).content)
+
+
+def _local_intent(user_query: str):
+    """Classifier local; trả về (intent, product_name, filters) hoặc None nếu cần hỏi LLM"""
+    decision = intent_classifier.classify(user_query)
+    if decision is None:
+        return None
+    logger.info(
+        f"Local intent: {decision.intent} (product={decision.product_name!r}, confidence={decision.confidence:.2f}, "
+        f"source={decision.source}); LLM calls avoided so far: "
+        f"{intent_classifier.stats()['llm_calls_avoided']}"
+    )
+    return decision.intent, decision.product_name, decision.filters
+
+
+def _follow_up_intent(user_query: str, memory: Optional[ConversationContext]):
+    """Câu hỏi tiếp nối về sản phẩm của lượt trước -> (intent, product_name, filters), không gọi LLM"""
+    resolved = resolve_follow_up(user_query, memory)
+    if resolved is None:
+        return None
+    logger.info(f"Follow-up resolved from conversation memory: {memory.product_name!r} -> {resolved[0]!r}")
+    return INTENT_COMPARE, resolved[0], resolved[1]
+
+
+def _remember_llm_intent(user_query: str, parsed: QueryIntent, memory: Optional[ConversationContext] = None):
+    # Bộ lọc trích bằng regex bổ sung các trường LLM bỏ sót
+    filters = (parsed.filters or QueryFilters()).merge(extract_filters(user_query)[0])
+    if memory is None or memory.is_empty():
+        # Kết quả dựa trên ngữ cảnh hội thoại không dùng lại được cho cùng câu ở hội thoại khác
+        intent_classifier.remember(user_query, parsed.intent, parsed.product_name, filters)
+    return parsed.intent, parsed.product_name, filters, parsed.reply
+
+
+# product_answer_chain / price_comparison_chain may be either a chain-like
+# object with an .invoke(...) method or a plain callable (fallback function).
+# Handle both cases to avoid AttributeError when a simple function was
+# returned during initialization.
+def _call_chain(chain, inputs):
+    try:
+        if hasattr(chain, 'invoke') and callable(getattr(chain, 'invoke')):
+            return chain.invoke(inputs)
+        elif callable(chain):
+            return chain(inputs)
+        else:
+            raise ValueError('Provided chain is not callable')
+    except Exception as e:
+        logger.error('Error invoking chain: %s', e, exc_info=True)
+        raise
+
+
+async def _acall_chain(chain, inputs):
+    try:
+        if hasattr(chain, 'ainvoke') and callable(getattr(chain, 'ainvoke')):
+            return await chain.ainvoke(inputs)
+        elif callable(chain):
+            return await _run_blocking(chain, inputs)
+        else:
+            raise ValueError('Provided chain is not callable')
+    except Exception as e:
+        logger.error('Error invoking chain: %s', e, exc_info=True)
+        raise
+
+
+def _cached_answer(search_question: str):
+    try:
+        return semantic_cache.lookup(search_question)
+    except Exception as e:
+        logger.warning(f"Semantic cache lookup failed: {e}")
+        return None
+
+
+def _cache_answer(question: str, answer: str, product_name: str):
+    """Lưu câu trả lời vào semantic cache (bỏ qua câu trả lời lỗi)"""
+    if not answer or answer.startswith("Xin lỗi"):
+        return
+    try:
+        semantic_cache.store(question, answer, canonical=product_name)
+    except Exception as e:
+        logger.warning(f"Semantic cache store failed: {e}")
+
+
+def _store_crawled_products(product_name: str, all_products: list):
+    """Sau khi crawl: bỏ cache cũ, lưu SQL DB và đưa vào hàng đợi vector index"""
+    # Dữ liệu mới -> bỏ các câu trả lời cũ của sản phẩm này
+    try:
+        semantic_cache.invalidate(product_name)
+    except Exception as e:
+        logger.warning(f"Semantic cache invalidation failed: {e}")
+
+    # Persist crawled products to SQL database for long-term storage
+    try:
+        saved_count = save_products(all_products)
+        logger.info(f"Persisted {saved_count} products into SQL DB after crawling.")
+    except Exception as e:
+        logger.error(f"Error saving crawled products to SQL DB: {e}")
+
+    if not all_products:
+        return
+    # Add new products to vector database (background indexer, không chờ embedding)
+    try:
+        documents = [
+            Document(
+                page_content=product.to_document_text(),
+                metadata=product.to_metadata()
+            )
+            for product in all_products
+        ]
+        # Id ổn định theo sản phẩm: crawl lại sẽ upsert thay vì thêm bản trùng
+        enqueue_documents(documents, ids=[product.key for product in all_products])
+    except Exception as e:
+        logger.error(f"Error enqueuing products for vector indexing: {str(e)}")
+        logger.warning("Search data was processed but may not be stored.")
+
+
+def _comparison_inputs(product_name: str, all_products: list, filters: QueryFilters) -> dict:
+    # Xếp hạng sẵn trong Python, LLM chỉ diễn đạt shortlist
+    ranked = rank_products(filters.apply(all_products))
+    context_data = ranked.to_context()
+    logger.info(
+        f"Ranked {len(all_products)} products -> shortlist of {len(ranked.shortlist)} "
+        f"(context {len(context_data)} chars)"
+    )
+    return {
+        "context": context_data,
+        "question": f"So sánh giá {product_name}{filters.describe()} từ các kết quả vừa tìm được"
+    }
+
+
+def _answer_inputs(search_question: str, retrieval) -> dict:
+    return {"context": format_documents(retrieval.documents), "question": search_question}
+
+
+def crawl_all_platforms(product_name: str, limit=None) -> list:
+    # Crawler kéo theo Selenium / Playwright / BeautifulSoup: chỉ import khi thật sự crawl
+    from Crawl_Data.run_all_crawlers import crawl_all_platforms as _crawl_all_platforms
+    return _crawl_all_platforms(product_name, limit=limit)
+
+
+async def acrawl_all_platforms(product_name: str, limit=None) -> list:
+    from Crawl_Data.run_all_crawlers import acrawl_all_platforms as _acrawl_all_platforms
+    return await _acrawl_all_platforms(product_name, limit=limit)
+
+
+def _refresh_product(product_name: str):
+    """Re-crawl chạy nền (stale-while-revalidate): crawl lại rồi lưu như một lần crawl thường"""
+    _store_crawled_products(product_name, crawl_all_platforms(product_name, limit=None))
+
+
+def _revalidate_if_stale(product_name: str, retrieval) -> str:
+    """Schedule a background re-crawl for a stale hit; returns the age note for the answer."""
+    if not retrieval.stale:
+        return ""
+    schedule_revalidation(normalize_query(product_name), functools.partial(_refresh_product, product_name))
+    return (f"\n\n_Giá được cập nhật cách đây {format_age(retrieval.age_hours)}. "
+            f"Sophie đang cập nhật giá mới, bạn hỏi lại sau ít phút để xem giá mới nhất._")
+
+
+def process_user_query(user_query: str, memory: Optional[ConversationContext] = None) -> str:
+    """Answer one message; ``memory`` (from ``backend.conversation_memory``) carries earlier turns.
+
+    The resolved product name and filters are written back to ``memory`` so
+    the caller can persist them for the next turn.
+    """
+    logger.info(f"User query: {user_query}")
+    try:
+        # 🧩 Bước 1: Phân loại intent - câu tiếp nối, rồi classifier local, LLM chỉ khi không chắc chắn
+        reply = None
+        local = _follow_up_intent(user_query, memory) or _local_intent(user_query)
+        if local is not None:
+            intent, product_name, filters = local
+        else:
+            intent, product_name, filters, reply = _remember_llm_intent(
+                user_query, _classify_intent_with_llm(user_query, memory), memory
+            )
+        filters = filters or QueryFilters()
 
         # 🧩 Bước 2: Xử lý intent
-        if intent_result.lower() == "chat":
-            response = chat_model.invoke(
-                f"Người dùng nói: {user_query}. Hãy phản hồi tự nhiên, thân thiện như một trợ lý AI."
-            ).content
-            return response
-
-        # Nếu không phải chat, coi kết quả là tên sản phẩm cần tìm
-        product_name = intent_result
+        if intent == INTENT_CHAT:
+            return reply or get_chat_model().invoke(_chat_prompt(user_query, memory)).content
+
+        product_name = product_name or user_query
         logger.info(f"Extracted product name: {product_name}")
+        if memory is not None:
+            memory.product_name, memory.filters = product_name, filters
 
         # 🔍 Bước 3: Tìm sản phẩm
-        # product_search_chain may be either a chain-like object with an
-        # .invoke(...) method or a plain callable (fallback function). Handle
-        # both cases to avoid AttributeError when a simple function was
-        # returned during initialization.
-        def _call_chain(chain, inputs):
-            try:
-                if hasattr(chain, 'invoke') and callable(getattr(chain, 'invoke')):
-                    return chain.invoke(inputs)
-                elif callable(chain):
-                    return chain(inputs)
-                else:
-                    raise ValueError('Provided chain is not callable')
-            except Exception as e:
-                logger.error('Error invoking chain: %s', e, exc_info=True)
-                raise
-
-        search_result = _call_chain(product_search_chain, {"question": product_name})
-        # If no relevant results found in vector database, crawl from all platforms
-        if "tôi sẽ tìm kiếm" in search_result.lower():
-            logger.info(f"Search result: {search_result}")
-            # Crawl từ tất cả platforms thay vì chỉ Tiki
-            all_products = crawl_all_platforms(product_name, limit=None)
-
-            # Persist crawled products to SQL database for long-term storage
-            try:
-                saved_count = save_products(all_products)
-                logger.info(f"Persisted {saved_count} products into SQL DB after crawling.")
-            except Exception as e:
-                logger.error(f"Error saving crawled products to SQL DB: {e}")
-
-            if all_products:
-                # Start price comparison immediately with crawled data
-                context_data = json.dumps(all_products, ensure_ascii=False)
-                try:
-                    comparison_result = _call_chain(price_comparison_chain, {
-                        "context": context_data,
-                        "question": f"So sánh giá {product_name} từ các kết quả vừa tìm được"
-                    })
-                    if not comparison_result:
-                        comparison_result = "Xin lỗi, không thể phân tích giá sản phẩm lúc này."
-                except Exception as e:
-                    logger.error(f"Error during price comparison: {str(e)}")
-                    comparison_result = "Xin lỗi, có lỗi xảy ra khi phân tích giá sản phẩm."
-                
-                # Add new products to vector database
-                try:
-                    # Convert products to Document objects
-                    documents = []
-                    for product in all_products:
-                        # Convert product dict to string for embedding
-                        product_text = json.dumps(product, ensure_ascii=False)
-                        
-                        # Create Document object with metadata
-                        doc = Document(
-                            page_content=product_text,
-                            metadata={
-                                "name": product["name"],
-                                "price": product["price"],
-                                "url": product["url"],
-                                "rating": product["rating"],
-                                "review_count": product["review_count"],
-                                "timestamp": product["timestamp"]
-                            }
-                        )
-                        documents.append(doc)
-
-                    
-                    # Add documents to vector store
-                    products_vector_db.add_documents(documents)
-                    logger.info("Updated vector database with new products.")
-                except Exception as e:
-                    logger.error(f"Error updating vector database: {str(e)}")
-                    logger.warning("Search data was processed but may not be stored.")
-
-                return comparison_result
-            else:
-                return "Xin lỗi, tôi không tìm thấy thông tin về sản phẩm này trên các sàn thương mại điện tử. Vui lòng thử lại với từ khóa khác."
-        
-        return search_result
-        
+        search_question = product_name + filters.describe()
+        cached_answer = _cached_answer(search_question)
+        if cached_answer:
+            return cached_answer
+
+        # Quyết định hit/miss bằng điểm similarity + metadata, trước khi gọi LLM
+        retrieval = retrieve_products(get_vector_db(), search_question, product_name, filters)
+        if retrieval.hit:
+            # Dữ liệu quá soft TTL: trả lời ngay kèm tuổi dữ liệu, crawl lại nền, không cache
+            age_note = _revalidate_if_stale(product_name, retrieval)
+            answer = _call_chain(product_answer_chain, _answer_inputs(search_question, retrieval))
+            if age_note:
+                return answer + age_note
+            _cache_answer(search_question, answer, product_name)
+            return answer
+
+        # Miss: crawl từ tất cả platforms ngay
+        all_products = crawl_all_platforms(product_name, limit=None)
+        _store_crawled_products(product_name, all_products)
+        if not all_products:
+            return NOT_FOUND_MESSAGE
+
+        # Start price comparison immediately with crawled data
+        try:
+            comparison_result = _call_chain(
+                price_comparison_chain, _comparison_inputs(product_name, all_products, filters)
+            )
+            if not comparison_result:
+                comparison_result = "Xin lỗi, không thể phân tích giá sản phẩm lúc này."
+        except Exception as e:
+            logger.error(f"Error during price comparison: {str(e)}")
+            comparison_result = "Xin lỗi, có lỗi xảy ra khi phân tích giá sản phẩm."
+
+        _cache_answer(search_question, comparison_result, product_name)
+        return comparison_result
+
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
-        return "Xin lỗi, đã có lỗi xảy ra khi xử lý yêu cầu của bạn."
+        return ERROR_MESSAGE
+
+
+async def _astream_chain(chain, inputs):
+    """Yield text chunks from a chain (whole output once if it cannot stream)"""
+    if hasattr(chain, 'astream') and callable(getattr(chain, 'astream')):
+        try:
+            async for chunk in chain.astream(inputs):
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            logger.error('Error streaming chain: %s', e, exc_info=True)
+            raise
+    else:
+        yield await _acall_chain(chain, inputs)
+
+
+async def astream_user_query(user_query: str, memory: Optional[ConversationContext] = None):
+    """Pipeline async dạng stream cho FastAPI.
+
+    Yield ``("status", text)`` cho các bước dài (crawl) và ``("token", text)``
+    cho nội dung câu trả lời. LLM và retriever chạy bằng ``astream``/``ainvoke``;
+    crawl chạy qua ``acrawl_all_platforms`` (executor giới hạn), SQLite và
+    semantic cache chạy trong ``_blocking_executor`` nên event loop không bị chặn.
+    """
+    logger.info(f"User query (async): {user_query}")
+    try:
+        reply = None
+        local = _follow_up_intent(user_query, memory) or _local_intent(user_query)
+        if local is not None:
+            intent, product_name, filters = local
+        else:
+            intent, product_name, filters, reply = _remember_llm_intent(
+                user_query, await _aclassify_intent_with_llm(user_query, memory), memory
+            )
+        filters = filters or QueryFilters()
+
+        if intent == INTENT_CHAT:
+            if reply:
+                yield "token", reply
+                return
+            async for chunk in get_chat_model().astream(_chat_prompt(user_query, memory)):
+                if chunk.content:
+                    yield "token", chunk.content
+            return
+
+        product_name = product_name or user_query
+        logger.info(f"Extracted product name: {product_name}")
+        if memory is not None:
+            memory.product_name, memory.filters = product_name, filters
+
+        search_question = product_name + filters.describe()
+        cached_answer = await _run_blocking(_cached_answer, search_question)
+        if cached_answer:
+            yield "token", cached_answer
+            return
+
+        retrieval = await _run_blocking(
+            retrieve_products, get_vector_db(), search_question, product_name, filters
+        )
+        if retrieval.hit:
+            age_note = _revalidate_if_stale(product_name, retrieval)
+            answer_parts = []
+            async for chunk in _astream_chain(product_answer_chain, _answer_inputs(search_question, retrieval)):
+                answer_parts.append(chunk)
+                yield "token", chunk
+            if age_note:
+                yield "token", age_note
+                return
+            await _run_blocking(_cache_answer, search_question, "".join(answer_parts), product_name)
+            return
+
+        yield "status", f"Đang tìm {product_name} trên các sàn thương mại điện tử..."
+        all_products = await acrawl_all_platforms(product_name, limit=None)
+        await _run_blocking(_store_crawled_products, product_name, all_products)
+        if not all_products:
+            yield "token", NOT_FOUND_MESSAGE
+            return
+
+        yield "status", f"Đang so sánh {len(all_products)} sản phẩm..."
+        comparison_parts = []
+        try:
+            async for chunk in _astream_chain(
+                price_comparison_chain, _comparison_inputs(product_name, all_products, filters)
+            ):
+                comparison_parts.append(chunk)
+                yield "token", chunk
+            if not comparison_parts:
+                yield "token", "Xin lỗi, không thể phân tích giá sản phẩm lúc này."
+        except Exception as e:
+            logger.error(f"Error during price comparison: {str(e)}")
+            if not comparison_parts:
+                yield "token", "Xin lỗi, có lỗi xảy ra khi phân tích giá sản phẩm."
+            return
+
+        await _run_blocking(_cache_answer, search_question, "".join(comparison_parts), product_name)
+
+    except Exception as e:
+        logger.error(f"Error processing query: {str(e)}")
+        yield "token", ERROR_MESSAGE
+
+
+async def aprocess_user_query(user_query: str, memory: Optional[ConversationContext] = None) -> str:
+    """Bản async của process_user_query: gom các token của astream_user_query"""
+    parts = []
+    async for kind, text in astream_user_query(user_query, memory):
+        if kind == "token":
+            parts.append(text)
+    return "".join(parts)
+
 
 def chat_loop():
     """Main chat loop"""
@@ -143,6 +468,8 @@ def chat_loop():
     print("3. Phân tích và đưa ra đề xuất mua sắm")
     print("\nĐể thoát, bạn có thể gõ 'quit' hoặc 'exit'")
     print("="*50)
+    # Không có bảng messages: giữ vài lượt gần nhất và sản phẩm đang hỏi trong bộ nhớ
+    memory = ConversationContext()
     
     while True:
         try:
@@ -156,7 +483,8 @@ def chat_loop():
                 print("\nCảm ơn bạn đã sử dụng dịch vụ. Hẹn gặp lại!")
                 break
                 
-            response = process_user_query(user_input)
+            response = process_user_query(user_input, memory)
+            memory.add_turn(user_input, response)
             print(f"\nSophie: {response}")
             
         except EOFError:
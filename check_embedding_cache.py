@@ -0,0 +1,112 @@
+"""Re-crawling an unchanged product must not embed it again.
+
+A crawl gives every listing a new ``id`` (``<platform>_<epoch>_<idx>``) and
+``timestamp``. When those were part of the embedded text, the embedding cache
+(keyed by sha256 of the text) missed on every re-crawl. This check saves the
+same products twice, as two crawls would, through the real write path
+(``ProductRecord`` -> ``VectorIndexer`` -> ``CachedEmbeddings``) into a
+temporary NumPy vector store and embedding cache, and counts the calls that
+reach the embedding model:
+
+  - the first crawl embeds every product once,
+  - the second crawl (new ids / timestamps, same name, price, seller ...)
+    must embed nothing,
+  - a product whose price changed must be embedded again.
+
+Runs offline (``HashingEmbeddings``), exit code 1 on failure.
+
+Usage:
+    python check_embedding_cache.py
+"""
+import shutil
+import sys
+import tempfile
+import time
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from Crawl_Data.product_record import ProductRecord
+from backend.vector_indexer import VectorIndexer
+from embedding_cache import CachedEmbeddings, EmbeddingStore
+from numpy_vector_store import NumpyVectorStore
+from offline_models import HashingEmbeddings
+
+PRODUCTS = [
+    {"name": "Apple iPhone 15 128GB", "price": 15990000, "seller": "Tiki Trading", "rating": 4.8,
+     "review_count": 120, "sold_count": 900, "url": "https://tiki.vn/apple-iphone-15-p1.html?spid=11",
+     "platform": "tiki"},
+    {"name": "Samsung Galaxy S24 256GB", "price": 18490000, "seller": "Samsung Official", "rating": 4.7,
+     "review_count": 80, "sold_count": 300, "url": "https://tiki.vn/samsung-galaxy-s24-p2.html?spid=22",
+     "platform": "tiki"},
+]
+
+
+class _CountingEmbeddings(Embeddings):
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+        self.texts = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts += len(texts)
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.texts += 1
+        return self.underlying.embed_query(text)
+
+
+def crawl(products: List[dict], crawl_index: int) -> List[ProductRecord]:
+    """Records as a crawler would build them: fresh id and timestamp every crawl."""
+    epoch = int(time.time()) + crawl_index
+    return [ProductRecord.from_dict({**product, "id": f"{product['platform']}_{epoch}_{i}",
+                                     "timestamp": f"2026-01-0{crawl_index + 1}T10:00:00"})
+            for i, product in enumerate(products)]
+
+
+def save(indexer: VectorIndexer, records: List[ProductRecord], timeout: float = 10.0):
+    """Same documents and ids as ``chatbot._store_crawled_products``; waits until indexed."""
+    target = indexer.stats()["indexed"] + len(records)
+    indexer.enqueue([Document(page_content=r.to_document_text(), metadata=r.to_metadata()) for r in records],
+                    ids=[r.key for r in records])
+    deadline = time.monotonic() + timeout
+    while indexer.stats()["indexed"] < target:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"indexer did not finish: {indexer.stats()}")
+        time.sleep(0.05)
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="check_embedding_cache_")
+    try:
+        counting = _CountingEmbeddings(HashingEmbeddings())
+        embeddings = CachedEmbeddings(counting, "check", store=EmbeddingStore(f"{workdir}/embedding_cache.db"))
+        store = NumpyVectorStore(f"{workdir}/vectors", embedding_function=embeddings)
+        indexer = VectorIndexer(lambda: store, flush_seconds=0.05, rate_per_second=0)
+
+        results = []
+        save(indexer, crawl(PRODUCTS, 0))
+        results.append(("first crawl embeds every product", counting.texts, len(PRODUCTS)))
+        before = counting.texts
+        save(indexer, crawl(PRODUCTS, 1))
+        results.append(("unchanged re-crawl embeds nothing", counting.texts - before, 0))
+        before = counting.texts
+        save(indexer, crawl([{**PRODUCTS[0], "price": 14990000}], 2))
+        results.append(("changed price is embedded again", counting.texts - before, 1))
+        indexer.stop()
+        store.close()
+
+        failed = False
+        for label, got, expected in results:
+            ok = got == expected
+            failed = failed or not ok
+            print(f"{'ok  ' if ok else 'FAIL'}  {label}: {got} embedding calls (expected {expected})")
+        print("\nFAIL" if failed else "\nOK")
+        sys.exit(1 if failed else 0)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Cold-start budget for the API server.
+
+``import main`` used to pull in the chatbot, LangChain / OpenAI, Chroma and
+every crawler (Selenium, Playwright, webdriver_manager, BeautifulSoup), and
+opened Chroma before ``/health`` could answer. Those are now imported on first
+use or by the background warm-up. This check keeps it that way:
+
+  - runs ``python -X importtime -c "import main"`` in fresh interpreters
+    (``--runs``, median), prints the slowest imports,
+  - fails if the cumulative import time of ``main`` is above
+    ``STARTUP_BUDGET_MS`` (``--budget-ms``),
+  - fails if any of ``DEFERRED_MODULES`` is imported at startup, whatever the
+    timing on this machine.
+
+Exit code 1 on failure, so CI or a pre-deploy step can run it as is.
+
+Usage:
+    python check_startup_time.py
+    python check_startup_time.py --runs 5 --budget-ms 1000 --top 30
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+# Chỉ được import khi có request chat / crawl đầu tiên (hoặc trong warm-up nền)
+DEFERRED_MODULES = (
+    "chatbot", "tool", "create_chain_with_template", "Crawl_Data",
+    "playwright", "selenium", "webdriver_manager", "bs4",
+    "langchain_openai", "openai", "langchain_chroma", "chromadb",
+)
+
+
+def run_importtime(module: str = "main") -> List[Tuple[int, int, str]]:
+    """(self_us, cumulative_us, indented name) for every import of one cold start."""
+    # Không warm-up / không key thật: chỉ đo phần import
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-startup-check"),
+           "WARM_UP_ON_STARTUP": "0"}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to print")
+    args = parser.parse_args()
+
+    run_importtime(args.module)  # lần đầu ghi .pyc, không tính
+    runs = [run_importtime(args.module) for _ in range(max(1, args.runs))]
+    totals = [next(cum for _, cum, name in rows if name.strip() == args.module) / 1000 for rows in runs]
+    total_ms = statistics.median(totals)
+
+    slowest: Dict[str, int] = {}
+    for _, cumulative, name in runs[-1]:
+        slowest[name.strip()] = max(slowest.get(name.strip(), 0), cumulative)
+    print(f"import {args.module}: median {total_ms:.0f} ms over {len(totals)} runs "
+          f"({', '.join(f'{t:.0f}' for t in totals)}), budget {args.budget_ms:.0f} ms")
+    for name, cumulative in sorted(slowest.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    imported = {name.strip() for _, _, name in runs[-1]}
+    leaked = sorted({name for name in imported if name.split(".")[0] in DEFERRED_MODULES})
+    failed = False
+    if leaked:
+        failed = True
+        print(f"\nFAIL: imported at startup but should be deferred: {', '.join(leaked[:20])}"
+              f"{' ...' if len(leaked) > 20 else ''}")
+    if total_ms > args.budget_ms:
+        failed = True
+        print(f"\nFAIL: cold start {total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if not failed:
+        print("\nOK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
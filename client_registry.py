@@ -0,0 +1,260 @@
+"""One lazily initialized set of LLM, embedding and vector-store clients.
+
+``create_chain_with_template`` built its own ``ChatOpenAI``, ``OpenAIEmbeddings``
+and ``Chroma`` at import time, ``tool`` lazily built a second set and
+``chatbot`` / the indexer / the semantic cache pulled theirs from ``tool``, so
+the persistent ``chroma_data/`` directory was opened twice and every OpenAI
+client kept its own HTTP connection pool. ``ClientRegistry`` owns exactly one
+of each:
+
+  - one ``httpx.Client`` and one ``httpx.AsyncClient``, shared by the chat model
+    and the embeddings. ``OPENAI_MAX_CONNECTIONS`` /
+    ``OPENAI_MAX_KEEPALIVE_CONNECTIONS`` bound the pool, and
+    ``OPENAI_TIMEOUT_SECONDS`` / ``OPENAI_MAX_RETRIES`` apply to both clients,
+  - the chat model (``CHAT_MODEL``, streaming so ``astream`` yields tokens),
+  - ``CachedEmbeddings`` over ``OpenAIEmbeddings`` (``EMBEDDING_MODEL``),
+  - the products vector store: ``Chroma`` at ``PRODUCTS_CHROMA_PATH``, or with
+    ``VECTOR_BACKEND=numpy`` the memory-mapped ``NumpyVectorStore`` at
+    ``PRODUCTS_NUMPY_PATH``.
+
+``CHAT_BACKEND=scripted`` / ``EMBEDDING_BACKEND=hashing`` swap in the offline
+stand-ins from ``offline_models`` (no API key, no network). Hashing vectors
+are not comparable with OpenAI ones, so that backend gets its own Chroma
+directory (``chroma_data_offline/`` unless ``PRODUCTS_CHROMA_PATH`` is set).
+
+Nothing is created until first use. ``main`` calls ``warm_up_clients()`` on
+startup, so the first request does not pay for opening Chroma, and
+``close_clients()`` on shutdown to close the HTTP pools.
+
+Usage:
+    from client_registry import get_chat_model, get_embeddings, get_vector_db
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from logger_config import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# "openai" (mặc định) hoặc "scripted" / "hashing" cho benchmark, load test offline
+CHAT_BACKEND = os.getenv("CHAT_BACKEND", "openai").lower()
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+PRODUCTS_CHROMA_PATH = os.getenv(
+    "PRODUCTS_CHROMA_PATH", "chroma_data_offline/" if EMBEDDING_BACKEND == "hashing" else "chroma_data/"
+)
+# "chroma" (mặc định) hoặc "numpy" (numpy_vector_store: memmap float16 + SQLite)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+PRODUCTS_NUMPY_PATH = os.getenv(
+    "PRODUCTS_NUMPY_PATH", "numpy_data_offline/" if EMBEDDING_BACKEND == "hashing" else "numpy_data/"
+)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+
+class ClientRegistry:
+    def __init__(self, max_connections: int = OPENAI_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                 timeout_seconds: float = OPENAI_TIMEOUT_SECONDS,
+                 max_retries: int = OPENAI_MAX_RETRIES):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        # RLock: vector_db() gọi embeddings() khi đang giữ lock
+        self._lock = threading.RLock()
+        self._http_client = None
+        self._http_async_client = None
+        self._chat_model = None
+        self._embeddings = None
+        self._vector_db = None
+        self._created: Dict[str, float] = {}
+
+    def _limits(self):
+        import httpx
+
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections)
+
+    def http_client(self):
+        with self._lock:
+            if self._http_client is None:
+                import httpx
+
+                self._http_client = httpx.Client(limits=self._limits(), timeout=self.timeout_seconds)
+                self._created["http_client"] = time.time()
+            return self._http_client
+
+    def http_async_client(self):
+        with self._lock:
+            if self._http_async_client is None:
+                import httpx
+
+                self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=self.timeout_seconds)
+                self._created["http_async_client"] = time.time()
+            return self._http_async_client
+
+    def chat_model(self):
+        with self._lock:
+            if self._chat_model is None and CHAT_BACKEND == "scripted":
+                from offline_models import ScriptedChatModel
+
+                self._chat_model = ScriptedChatModel()
+                self._created["chat_model"] = time.time()
+                logger.info("ClientRegistry: using scripted offline chat model")
+            if self._chat_model is None:
+                from langchain_openai import ChatOpenAI
+
+                self._chat_model = ChatOpenAI(
+                    model=CHAT_MODEL,
+                    temperature=0,
+                    # Token được đẩy tới client qua astream (SSE), không in ra stdout
+                    streaming=True,
+                    timeout=self.timeout_seconds,
+                    max_retries=self.max_retries,
+                    http_client=self.http_client(),
+                    http_async_client=self.http_async_client(),
+                )
+                self._created["chat_model"] = time.time()
+                logger.info("ClientRegistry: created chat model %s", CHAT_MODEL)
+            return self._chat_model
+
+    def embeddings(self):
+        with self._lock:
+            if self._embeddings is None and EMBEDDING_BACKEND == "hashing":
+                from offline_models import HashingEmbeddings
+
+                # Không qua CachedEmbeddings: hash còn nhanh hơn tra SQLite, và load test
+                # không ghi vào embedding_cache.db
+                self._embeddings = HashingEmbeddings()
+                self._created["embeddings"] = time.time()
+                logger.info("ClientRegistry: using hashing offline embeddings (%s)", self._embeddings.model)
+            if self._embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
+                from embedding_cache import CachedEmbeddings
+
+                # Cache vector theo (model, hash nội dung) để không embed lại text cũ
+                self._embeddings = CachedEmbeddings(
+                    OpenAIEmbeddings(
+                        openai_api_key=os.getenv("OPENAI_API_KEY"),
+                        model=EMBEDDING_MODEL,
+                        request_timeout=self.timeout_seconds,
+                        max_retries=self.max_retries,
+                        http_client=self.http_client(),
+                        http_async_client=self.http_async_client(),
+                    ),
+                    model=EMBEDDING_MODEL,
+                )
+                self._created["embeddings"] = time.time()
+                logger.info("ClientRegistry: created embeddings %s", EMBEDDING_MODEL)
+            return self._embeddings
+
+    def vector_db(self):
+        with self._lock:
+            if self._vector_db is None and VECTOR_BACKEND == "numpy":
+                from numpy_vector_store import NumpyVectorStore
+
+                self._vector_db = NumpyVectorStore(PRODUCTS_NUMPY_PATH, embedding_function=self.embeddings())
+                self._created["vector_db"] = time.time()
+                logger.info("ClientRegistry: opened NumPy vector store at %s", PRODUCTS_NUMPY_PATH)
+            if self._vector_db is None:
+                from langchain_chroma import Chroma
+
+                self._vector_db = Chroma(
+                    persist_directory=PRODUCTS_CHROMA_PATH,
+                    embedding_function=self.embeddings(),
+                )
+                self._created["vector_db"] = time.time()
+                logger.info("ClientRegistry: opened Chroma at %s", PRODUCTS_CHROMA_PATH)
+            return self._vector_db
+
+    def warm_up(self) -> Dict:
+        """Create every client and open the Chroma collection; failures are logged, not raised."""
+        timings = {}
+        for name, factory in (("chat_model", self.chat_model), ("embeddings", self.embeddings),
+                              ("vector_db", self.vector_db)):
+            started = time.perf_counter()
+            try:
+                client = factory()
+                if name == "vector_db" and hasattr(client, "_collection"):
+                    # Ép Chroma nạp collection (SQLite + HNSW) ngay bây giờ
+                    client._collection.count()
+                timings[name] = round((time.perf_counter() - started) * 1000, 1)
+            except Exception as e:
+                logger.error("ClientRegistry: warm-up of %s failed: %s", name, e)
+                timings[name] = None
+        logger.info("ClientRegistry: warm-up finished (ms): %s", timings)
+        return timings
+
+    async def aclose(self):
+        """Close the HTTP pools and drop every client; the next get_* call recreates them."""
+        with self._lock:
+            http_client, http_async_client = self._http_client, self._http_async_client
+            self._http_client = self._http_async_client = None
+            self._chat_model = self._embeddings = self._vector_db = None
+            self._created.clear()
+        if http_async_client is not None:
+            await http_async_client.aclose()
+        if http_client is not None:
+            http_client.close()
+        logger.info("ClientRegistry: clients closed")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "client_age_seconds": {name: round(time.time() - created, 1) for name, created in self._created.items()},
+                "chat_backend": CHAT_BACKEND,
+                "embedding_backend": EMBEDDING_BACKEND,
+                "vector_backend": VECTOR_BACKEND,
+                "max_connections": self.max_connections,
+                "max_keepalive_connections": self.max_keepalive_connections,
+                "timeout_seconds": self.timeout_seconds,
+                "max_retries": self.max_retries,
+            }
+
+
+# Module-level registry instance
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ClientRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
+
+
+def get_chat_model():
+    return get_registry().chat_model()
+
+
+def get_embeddings():
+    return get_registry().embeddings()
+
+
+def get_vector_db():
+    return get_registry().vector_db()
+
+
+def warm_up_clients() -> Dict:
+    return get_registry().warm_up()
+
+
+async def close_clients():
+    if _registry is not None:
+        await _registry.aclose()
+
+
+def get_client_stats() -> Dict:
+    return get_registry().stats()
@@ -0,0 +1,200 @@
+"""Collapse duplicate products in the Chroma collection and rebuild its index.
+
+Before product keys were used as ids, every crawl added new uuid documents for
+listings that were already indexed, so ``chroma_data/`` kept growing with
+near-duplicate vectors that slow queries down and take several top-k slots
+for the same listing. This job:
+
+  1. reads every record (id, embedding, document, metadata) of the collection,
+  2. groups them by stable product key (``ProductRecord.key``: platform +
+     canonical URL, or the name when there is no URL) and keeps the newest
+     record of each group (crawl ``timestamp``, else ``indexed_at``),
+  3. writes the survivors, re-using their stored embeddings (no embedding API
+     calls), into a fresh collection keyed by product key, so HNSW is rebuilt
+     from scratch,
+  4. rebuilds the FTS5 lexical index from the new collection and swaps the
+     directories (the old one is kept as ``<path>.bak-<time>``).
+
+Size, duplicate share of the top-k and query latency (probe queries with
+stored embeddings, so no network) are reported before and after. Without
+``--apply`` it only reports. Stop the API server before ``--apply``: it holds
+the Chroma files open.
+
+Usage:
+    python compact_vector_db.py                 # dry run: report duplicates
+    python compact_vector_db.py --apply
+"""
+import argparse
+import os
+import random
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from logger_config import get_logger
+
+try:
+    from product_record import product_key
+except ImportError:
+    from Crawl_Data.product_record import product_key
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+PRODUCTS_CHROMA_PATH = "chroma_data"
+# Tên collection mặc định của langchain_chroma
+COLLECTION_NAME = "langchain"
+READ_BATCH_SIZE = 1000
+WRITE_BATCH_SIZE = 500
+
+
+def dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+def record_key(record_id: str, metadata: Dict) -> str:
+    if metadata.get("product_key"):
+        return metadata["product_key"]
+    if not metadata.get("url") and not (metadata.get("name") or metadata.get("title")):
+        # Không đủ thông tin để nhận dạng sản phẩm: giữ nguyên
+        return record_id
+    return product_key(metadata.get("platform"), metadata.get("url", ""),
+                       metadata.get("name") or metadata.get("title") or "")
+
+
+def recency(metadata: Dict) -> float:
+    try:
+        return datetime.fromisoformat(str(metadata.get("timestamp") or "")).timestamp()
+    except ValueError:
+        indexed_at = metadata.get("indexed_at")
+        return float(indexed_at) if isinstance(indexed_at, (int, float)) else 0.0
+
+
+def load_records(collection) -> Dict[str, List]:
+    records = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+    offset = 0
+    while True:
+        page = collection.get(limit=READ_BATCH_SIZE, offset=offset,
+                              include=["embeddings", "documents", "metadatas"])
+        if not page["ids"]:
+            break
+        for field in records:
+            records[field].extend(page[field])
+        offset += len(page["ids"])
+    return records
+
+
+def measure(collection, probes: List, k: int) -> Dict:
+    """Query latency with stored embeddings as probes, and share of top-k slots taken by duplicates."""
+    if not probes:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "duplicate_slots": 0.0}
+    collection.query(query_embeddings=[probes[0]], n_results=k, include=["metadatas"])  # warm-up
+    latencies, slots, duplicates = [], 0, 0
+    for probe in probes:
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[probe], n_results=k, include=["metadatas"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        seen = set()
+        for record_id, metadata in zip(result["ids"][0], result["metadatas"][0]):
+            key = record_key(record_id, metadata or {})
+            slots += 1
+            duplicates += key in seen
+            seen.add(key)
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "duplicate_slots": duplicates / slots if slots else 0.0,
+    }
+
+
+def print_report(before: Dict, after: Dict = None):
+    rows = [("documents", "count", "{:.0f}"), ("size MB", "size_mb", "{:.1f}"),
+            ("query p50 ms", "p50_ms", "{:.2f}"), ("query p95 ms", "p95_ms", "{:.2f}"),
+            ("duplicate top-k slots", "duplicate_slots", "{:.1%}")]
+    print(f"{'':<24}{'before':>12}" + (f"{'after':>12}" if after else ""))
+    for label, key, fmt in rows:
+        line = f"{label:<24}{fmt.format(before[key]):>12}"
+        if after:
+            line += f"{fmt.format(after[key]):>12}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=PRODUCTS_CHROMA_PATH)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--probes", type=int, default=50, help="number of probe queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--apply", action="store_true", help="write the compacted collection and swap it in")
+    args = parser.parse_args()
+
+    import chromadb
+
+    client = chromadb.PersistentClient(path=args.path)
+    collection = client.get_collection(args.collection)
+    records = load_records(collection)
+    total = len(records["ids"])
+
+    keep: Dict[str, int] = {}
+    for index, (record_id, metadata) in enumerate(zip(records["ids"], records["metadatas"])):
+        key = record_key(record_id, metadata or {})
+        if key not in keep or recency(metadata or {}) >= recency(records["metadatas"][keep[key]] or {}):
+            keep[key] = index
+    print(f"{total} documents, {len(keep)} unique products, {total - len(keep)} duplicates")
+
+    # Cùng bộ probe (lấy từ các bản giữ lại) cho cả trước và sau
+    random.seed(0)
+    probe_indexes = random.sample(list(keep.values()), min(args.probes, len(keep)))
+    probes = [records["embeddings"][i] for i in probe_indexes]
+    before = {"count": total, "size_mb": dir_size_mb(args.path), **measure(collection, probes, args.k)}
+
+    if not args.apply:
+        print_report(before)
+        print("\nDry run; re-run with --apply (API server stopped) to compact.")
+        return
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = args.path.rstrip("/")
+    compact_path, backup_path = f"{base}.compact-{stamp}", f"{base}.bak-{stamp}"
+    new_client = chromadb.PersistentClient(path=compact_path)
+    new_collection = new_client.create_collection(args.collection, metadata=collection.metadata)
+    items = list(keep.items())
+    for start in range(0, len(items), WRITE_BATCH_SIZE):
+        batch = items[start:start + WRITE_BATCH_SIZE]
+        new_collection.upsert(
+            ids=[key for key, _ in batch],
+            embeddings=[records["embeddings"][i] for _, i in batch],
+            documents=[records["documents"][i] for _, i in batch],
+            metadatas=[{**(records["metadatas"][i] or {}), "product_key": key} for key, i in batch],
+        )
+    logger.info("Wrote %d compacted documents to %s", len(items), compact_path)
+
+    after = {"count": new_collection.count(), "size_mb": dir_size_mb(compact_path),
+             **measure(new_collection, probes, args.k)}
+
+    # Lexical index dùng cùng ids (product key) với collection mới
+    from hybrid_retrieval import rebuild_lexical_index
+    rebuild_lexical_index(new_collection)
+
+    shutil.move(args.path, backup_path)
+    shutil.move(compact_path, args.path)
+    logger.info("Swapped %s into %s (previous data kept in %s)", compact_path, args.path, backup_path)
+
+    print_report(before, after)
+    print(f"\nPrevious collection kept in {backup_path}")
+
+
+if __name__ == "__main__":
+    main()
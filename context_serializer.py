@@ -0,0 +1,147 @@
+"""Token-budgeted, compact product context for LLM prompts.
+
+Both chains used to receive verbose JSON: keys repeated for every product,
+placeholder strings such as "Không giảm giá" and full tracking URLs. This
+module renders products as one compact pipe-separated table with only the
+columns the prompts need, counts tokens with the model's tokenizer and drops
+the lowest-ranked rows once ``CONTEXT_TOKEN_BUDGET`` is reached.
+
+``serialize_ranked`` is used for the comparison prompt and
+``format_documents`` for the retriever chain, so both go through the same
+path and both log prompt token counts before/after compaction.
+"""
+import json
+import os
+from typing import Any, Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from logger_config import get_logger
+
+try:
+    from product_record import ProductRecord, as_product_record
+except ImportError:
+    from Crawl_Data.product_record import ProductRecord, as_product_record
+
+logger = get_logger(__name__)
+
+CONTEXT_MODEL = os.getenv("CONTEXT_TOKEN_MODEL", "gpt-4o-mini")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+
+# (header, getter) pairs; the header row is emitted once per table
+COLUMNS = (
+    ("#", None),
+    ("tên", lambda p: p.name),
+    ("giá", lambda p: str(p.price) if p.price else "?"),
+    ("sao", lambda p: f"{p.rating:g}" if p.rating else "-"),
+    ("đánh giá", lambda p: str(p.review_count) if p.review_count else "-"),
+    ("đã bán", lambda p: str(p.sold_count) if p.sold_count else "-"),
+    ("người bán", lambda p: p.seller or "-"),
+    ("sàn", lambda p: p.platform.value),
+    ("link", lambda p: short_url(p.url)),
+)
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            try:
+                _encoder = tiktoken.encoding_for_model(CONTEXT_MODEL)
+            except KeyError:
+                _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning("tiktoken unavailable (%s); estimating tokens as len/4", e)
+            _encoder = None
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder()
+    if encoder is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def short_url(url: str) -> str:
+    """Drop scheme, query string and fragment: tracking params cost tokens, not meaning."""
+    if not url or url == "N/A":
+        return "-"
+    parts = urlsplit(url if "//" in url else "//" + url)
+    return (parts.netloc.removeprefix("www.") + parts.path).rstrip("/")
+
+
+def _cell(value: str) -> str:
+    return " ".join(str(value).replace("|", "/").split())
+
+
+def _row(index: int, product: ProductRecord) -> str:
+    return " | ".join(str(index) if getter is None else _cell(getter(product)) for _, getter in COLUMNS)
+
+
+def render_products_table(products: Sequence[Any], budget: Optional[int] = None,
+                          header: str = "") -> str:
+    """Render products (already in rank order) as a table truncated to ``budget`` tokens."""
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    records = [as_product_record(product) for product in products]
+    lines = [header] if header else []
+    lines.append(" | ".join(name for name, _ in COLUMNS))
+    used = count_tokens("\n".join(lines))
+    kept = 0
+    for index, product in enumerate(records, start=1):
+        row = _row(index, product)
+        cost = count_tokens(row) + 1
+        if kept and used + cost > budget:
+            break
+        lines.append(row)
+        used += cost
+        kept += 1
+    if kept < len(records):
+        lines.append(f"(lược bớt {len(records) - kept} sản phẩm xếp hạng thấp hơn)")
+    return "\n".join(lines)
+
+
+def _log_compaction(label: str, verbose: str, compact: str):
+    before, after = count_tokens(verbose), count_tokens(compact)
+    saved = 100 * (before - after) / before if before else 0
+    logger.info("%s context tokens: %d -> %d (%.0f%% smaller)", label, before, after, saved)
+
+
+def serialize_ranked(ranked, budget: Optional[int] = None) -> str:
+    """Comparison context: the three picks by row number, then the shortlist table."""
+    shortlist = list(ranked.shortlist)
+    if not shortlist:
+        return ""
+    pick_lines = []
+    labels = {"cheapest": "TIẾT KIỆM", "balanced": "CÂN BẰNG", "popular": "PHỔ BIẾN"}
+    for key, product in ranked.picks().items():
+        if product is not None and product in shortlist:
+            pick_lines.append(f"{labels[key]}: #{shortlist.index(product) + 1}")
+    header = "Lựa chọn đã xếp hạng - " + ", ".join(pick_lines)
+    compact = render_products_table(shortlist, budget, header=header)
+    _log_compaction("Comparison", json.dumps([p.to_dict() for p in shortlist], ensure_ascii=False), compact)
+    return compact
+
+
+def _document_record(document) -> ProductRecord:
+    try:
+        data = json.loads(document.page_content)
+        if isinstance(data, dict):
+            return as_product_record({**(document.metadata or {}), **data})
+    except (ValueError, TypeError):
+        pass
+    return as_product_record({"name": document.page_content[:120], **(document.metadata or {})})
+
+
+def format_documents(documents: Iterable, budget: Optional[int] = None) -> str:
+    """Retriever chain context: Documents (in retrieval order) rendered as the same table."""
+    documents = list(documents or [])
+    if not documents:
+        return ""
+    compact = render_products_table([_document_record(doc) for doc in documents], budget)
+    _log_compaction("Retriever", "\n".join(str(doc) for doc in documents), compact)
+    return compact
@@ -1,11 +1,32 @@
+"""Bulk-load the product catalog into Chroma and the lexical index.
+
+``python create_vector_database.py --input products.json`` streams the file
+through ``BulkIndexer``: batches of ``BULK_INDEX_BATCH_SIZE`` items, up to
+``BULK_INDEX_CONCURRENCY`` embedded at once, and each batch committed as it
+finishes. An interrupted run resumes from ``<input>.checkpoint.json``, and
+items whose content is already indexed are not embedded again.
+"""
+import argparse
+import hashlib
 import json
+import os
+import threading
+import time
+import uuid
 import dotenv
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional, Tuple
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
 from logger_config import get_logger
+from client_registry import get_embeddings, get_vector_db
+from hybrid_retrieval import get_lexical_index
+
+try:
+    from product_record import product_key
+except ImportError:
+    from Crawl_Data.product_record import product_key
 
 logger = get_logger(__name__)
 
@@ -14,14 +35,19 @@ PRODUCTS_CHROMA_PATH = "chroma_data"
 
 dotenv.load_dotenv()
 
-def load_products_from_json() -> List[Dict]:
-    """Load product data from JSON file"""
-    with open(PRODUCTS_JSON_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
+BULK_BATCH_SIZE = int(os.getenv("BULK_INDEX_BATCH_SIZE", "256"))
+BULK_CONCURRENCY = int(os.getenv("BULK_INDEX_CONCURRENCY", "4"))
+# Đọc file theo khối 1 MiB
+READ_SIZE = 1 << 20
+
+def get_embedding_function():
+    """Embeddings dùng chung (HTTP pool + SQLite embedding cache) từ client_registry"""
+    return get_embeddings()
 
 def create_documents_from_products(products: List[Dict]) -> List[Document]:
     """Convert product data to Document objects for vector store"""
     documents = []
+    now = datetime.now()
     for product in products:
         # Convert product dict to string for embedding
         product_text = json.dumps(product, ensure_ascii=False)
@@ -30,35 +56,229 @@ def create_documents_from_products(products: List[Dict]) -> List[Document]:
             metadata={
                 "title": product.get("title", ""),
                 "image": product.get("image", ""),
-                "price": product.get("price", ""),
-                "timestamp": datetime.now().isoformat()
+                # Số (không phải chuỗi) để Chroma where lọc được theo khoảng giá / độ mới
+                "price": int(product.get("price") or 0),
+                "platform": "tiki",
+                "url": product.get("link", ""),
+                "timestamp": now.isoformat(),
+                "indexed_at": int(now.timestamp()),
+                "product_key": product_key("tiki", product.get("link", ""), product.get("title", ""))
             }
         )
         documents.append(doc)
     return documents
 
-def initialize_vector_store():
-    logger.info("initialize_vector_store called")
-    try:
-        # Load product data
-        products = load_products_from_json()
+def keyed_documents(documents: List[Document]) -> Tuple[List[str], List[Document]]:
+    """Stable product keys as Chroma ids (re-running upserts instead of duplicating),
+    keeping only the last document per key since Chroma rejects duplicate ids in one call"""
+    ids = []
+    for doc in documents:
+        metadata = doc.metadata or {}
+        if metadata.get("product_key"):
+            ids.append(metadata["product_key"])
+        elif metadata.get("url"):
+            ids.append(product_key(metadata.get("platform"), metadata["url"], metadata.get("name", "")))
+        else:
+            ids.append(str(uuid.uuid4()))
+    unique = dict(zip(ids, documents))
+    return list(unique), list(unique.values())
 
-        # Convert to documents
-        documents = create_documents_from_products(products)
+def iter_json_items(path: str, read_size: int = READ_SIZE) -> Iterator[Dict]:
+    """Yield the items of a top-level JSON array (or JSON Lines) without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8-sig") as f:
+        buffer, pos, eof, in_array = "", 0, False, None
+        while True:
+            # Bỏ khoảng trắng và dấu phẩy giữa các phần tử
+            while pos < len(buffer) and (buffer[pos].isspace() or (in_array and buffer[pos] == ",")):
+                pos += 1
+            if pos >= len(buffer) and not eof:
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            if pos >= len(buffer):
+                return
+            if in_array is None:
+                in_array = buffer[pos] == "["
+                pos += in_array
+                continue
+            if in_array and buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                item, end = None, len(buffer)
+            if end >= len(buffer) and not eof:
+                # Phần tử có thể bị cắt ở cuối buffer: đọc thêm rồi parse lại
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield item
+            pos = end
+            if pos > read_size:
+                buffer, pos = buffer[pos:], 0
 
-        # Create and persist vector store
-        vector_store = Chroma.from_documents(
-            documents,
-            OpenAIEmbeddings(),
-            persist_directory=PRODUCTS_CHROMA_PATH
-        )
 
-        logger.info("Successfully created vector store with %d products", len(documents))
-        return vector_store
+def document_hash(document: Document) -> str:
+    return hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
 
-    except Exception as e:
-        logger.error("Error creating vector store: %s", str(e))
-        return None
+
+class BulkIndexer:
+    """Streaming, resumable bulk load of a product JSON file into Chroma + the lexical index.
+
+    Items are parsed incrementally and grouped into batches of ``batch_size``.
+    Up to ``concurrency`` batches are embedded at once, and each batch is
+    upserted (committed) as soon as its embeddings are ready. Before
+    embedding, a batch drops items whose stored document under the same
+    product key has the same ``content_hash``, so a rerun over an unchanged
+    file costs no embedding calls. The checkpoint records how many leading
+    items are committed; a rerun skips them without embedding, and starts
+    over if the input file changed.
+    """
+
+    def __init__(self, input_path: str, batch_size: int = BULK_BATCH_SIZE,
+                 concurrency: int = BULK_CONCURRENCY, checkpoint_path: Optional[str] = None,
+                 vector_db=None, lexical_index=None):
+        self.input_path = input_path
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.checkpoint_path = checkpoint_path or f"{input_path}.checkpoint.json"
+        self.vector_db = vector_db or get_vector_db()
+        self.lexical_index = lexical_index or get_lexical_index()
+        self.embeddings = self.vector_db.embeddings
+        self._write_lock = threading.Lock()
+        self.stats = {"read": 0, "resumed_from": 0, "indexed": 0, "unchanged": 0,
+                      "duplicates": 0, "batches": 0, "failed_batches": 0}
+
+    def _fingerprint(self) -> Dict:
+        stat = os.stat(self.input_path)
+        return {"input": os.path.abspath(self.input_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def load_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if {k: checkpoint.get(k) for k in ("input", "size", "mtime")} != self._fingerprint():
+            logger.info("Checkpoint %s is for a different input file; starting over", self.checkpoint_path)
+            return 0
+        return int(checkpoint.get("next_item", 0))
+
+    def save_checkpoint(self, next_item: int):
+        checkpoint = {**self._fingerprint(), "next_item": next_item, "stats": self.stats,
+                      "updated_at": datetime.now().isoformat()}
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        # Ghi file tạm rồi replace: checkpoint không bao giờ bị ghi dở
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _index_batch(self, products: List[Dict]) -> Dict:
+        ids, documents = keyed_documents(create_documents_from_products(products))
+        counts = {"duplicates": len(products) - len(ids), "unchanged": 0, "indexed": 0}
+        hashes = [document_hash(doc) for doc in documents]
+        existing = self.vector_db.get(ids=ids, include=["metadatas"])
+        stored = {doc_id: (metadata or {}).get("content_hash")
+                  for doc_id, metadata in zip(existing["ids"], existing["metadatas"])}
+        todo = [i for i, doc_id in enumerate(ids) if stored.get(doc_id) != hashes[i]]
+        counts["unchanged"] = len(ids) - len(todo)
+        if not todo:
+            return counts
+        ids = [ids[i] for i in todo]
+        documents = [documents[i] for i in todo]
+        for i, doc in zip(todo, documents):
+            doc.metadata["content_hash"] = hashes[i]
+        # Embed ngoài lock (song song giữa các batch), ghi tuần tự
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        with self._write_lock:
+            if hasattr(self.vector_db, "upsert_embeddings"):
+                # NumpyVectorStore (VECTOR_BACKEND=numpy)
+                self.vector_db.upsert_embeddings(ids, vectors, [doc.page_content for doc in documents],
+                                                 [doc.metadata for doc in documents])
+            else:
+                self.vector_db._collection.upsert(
+                    ids=ids, embeddings=vectors,
+                    documents=[doc.page_content for doc in documents],
+                    metadatas=[doc.metadata for doc in documents],
+                )
+            self.lexical_index.add(documents, ids)
+        counts["indexed"] = len(ids)
+        return counts
+
+    def run(self, restart: bool = False) -> Dict:
+        resume_from = 0 if restart else self.load_checkpoint()
+        self.stats["resumed_from"] = resume_from
+        if resume_from:
+            logger.info("Resuming %s after item %d", self.input_path, resume_from)
+        started = time.perf_counter()
+        watermark = resume_from          # mọi item trước vị trí này đã commit
+        done_ranges: Dict[int, int] = {}  # batch đã xong nhưng chưa liền với watermark
+        pending = {}
+        failed = False
+
+        def collect(block: bool):
+            nonlocal watermark, failed
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED) if block else (
+                [future for future in pending if future.done()], None)
+            for future in finished:
+                start, end = pending.pop(future)
+                try:
+                    counts = future.result()
+                except Exception as e:
+                    failed = True
+                    self.stats["failed_batches"] += 1
+                    logger.error("Bulk index: batch of items %d-%d failed: %s", start, end - 1, e)
+                    continue
+                for key, value in counts.items():
+                    self.stats[key] += value
+                self.stats["batches"] += 1
+                done_ranges[start] = end
+            advanced = watermark
+            while watermark in done_ranges:
+                watermark = done_ranges.pop(watermark)
+            if watermark != advanced:
+                self.save_checkpoint(watermark)
+                logger.info("Bulk index: %d items committed (%s)", watermark, self.stats)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk-index") as pool:
+            batch, batch_start = [], resume_from
+            for position, item in enumerate(iter_json_items(self.input_path)):
+                if failed:
+                    break
+                self.stats["read"] += 1
+                if position < resume_from:
+                    continue
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+                # Giới hạn số batch đang giữ trong bộ nhớ
+                while len(pending) >= self.concurrency * 2:
+                    collect(block=True)
+                pending[pool.submit(self._index_batch, batch)] = (batch_start, position + 1)
+                batch, batch_start = [], position + 1
+                collect(block=False)
+            if batch and not failed:
+                pending[pool.submit(self._index_batch, batch)] = (batch_start, batch_start + len(batch))
+            while pending:
+                collect(block=True)
+
+        elapsed = time.perf_counter() - started
+        self.stats["elapsed_seconds"] = round(elapsed, 1)
+        self.stats["completed"] = not failed
+        self.save_checkpoint(watermark)
+        logger.info("Bulk index of %s %s: %s", self.input_path,
+                    "finished" if not failed else "stopped (rerun to resume)", self.stats)
+        return self.stats
+
+
+def initialize_vector_store(input_path: str = PRODUCTS_JSON_PATH, restart: bool = False, **kwargs) -> Dict:
+    logger.info("initialize_vector_store called for %s", input_path)
+    return BulkIndexer(input_path, **kwargs).run(restart=restart)
 
 def add_documents_to_vector_db(documents_data: List[Dict]):
     """
@@ -72,28 +292,30 @@ def add_documents_to_vector_db(documents_data: List[Dict]):
         
         # Convert to Document objects
         documents = []
+        indexed_at = int(datetime.now().timestamp())
         for doc_data in documents_data:
             doc = Document(
                 page_content=doc_data['content'],
-                metadata=doc_data.get('metadata', {})
+                metadata={"indexed_at": indexed_at, **doc_data.get('metadata', {})}
             )
             documents.append(doc)
+        ids, documents = keyed_documents(documents)
         
         # Load existing vector store or create new one
         try:
-            vector_store = Chroma(
-                persist_directory=PRODUCTS_CHROMA_PATH,
-                embedding_function=OpenAIEmbeddings()
-            )
+            # Cùng instance Chroma với chatbot / indexer, không mở thư mục lần nữa
+            vector_store = get_vector_db()
             # Add documents to existing store
-            vector_store.add_documents(documents)
+            vector_store.add_documents(documents, ids=ids)
         except Exception:
             # If store doesn't exist, create new one
             vector_store = Chroma.from_documents(
                 documents,
-                OpenAIEmbeddings(),
-                persist_directory=PRODUCTS_CHROMA_PATH
+                get_embedding_function(),
+                persist_directory=PRODUCTS_CHROMA_PATH,
+                ids=ids
             )
+        get_lexical_index().add(documents, ids)
         
         logger.info(f"Successfully added {len(documents)} documents to vector database")
         
@@ -102,4 +324,13 @@ def add_documents_to_vector_db(documents_data: List[Dict]):
 
 
 if __name__ == "__main__":
-    initialize_vector_store()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=PRODUCTS_JSON_PATH, help="JSON array or JSON Lines of products")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY)
+    parser.add_argument("--checkpoint", default=None, help="default: <input>.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint (unchanged items are still skipped)")
+    args = parser.parse_args()
+    stats = initialize_vector_store(args.input, restart=args.restart, batch_size=args.batch_size,
+                                    concurrency=args.concurrency, checkpoint_path=args.checkpoint)
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,165 @@
+"""Persistent embedding cache (CacheBackedEmbeddings-style).
+
+``tool.get_embeddings`` and the ``OpenAIEmbeddings`` instances in
+``create_chain_with_template`` / ``create_vector_database`` used to re-embed
+the same texts over and over: repeated queries, and every re-crawl of an
+unchanged product that ``process_user_query`` re-adds with ``add_documents``.
+
+``CachedEmbeddings`` wraps any LangChain ``Embeddings`` and stores vectors in
+SQLite keyed by ``(model, sha256(text))``. Lookups are batched (one ``IN``
+query per chunk), only the misses are sent to the underlying model in a single
+call, and vectors are stored as packed float32 blobs. All wrappers in the
+process share one database file, so a text embedded by the indexer is a cache
+hit for the retriever and vice versa.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+# SQLite limits host parameters per statement; stay well below it
+LOOKUP_CHUNK_SIZE = 500
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite table of float32 vectors keyed by (model, content hash)"""
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), LOOKUP_CHUNK_SIZE):
+                chunk = unique[start:start + LOOKUP_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = [(model, key, len(vector), array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def count(self, model: Optional[str] = None) -> int:
+        with self._lock:
+            if model:
+                return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(db_path: str = EMBEDDING_CACHE_PATH) -> EmbeddingStore:
+    with _stores_lock:
+        path = os.path.abspath(db_path)
+        if path not in _stores:
+            _stores[path] = EmbeddingStore(db_path)
+        return _stores[path]
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends texts missing from the SQLite cache."""
+
+    def __init__(self, underlying: Embeddings, model: str, store: Optional[EmbeddingStore] = None):
+        self.underlying = underlying
+        self.model = model
+        self.store = store or get_embedding_store()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        hashes = [content_hash(text) for text in texts]
+        cached = self.store.get_many(self.model, hashes)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.store.put_many(self.model, fresh)
+            cached.update(fresh)
+
+        with self._stats_lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        if missing:
+            logger.info("Embedding cache: %d/%d texts embedded (model=%s)", len(missing), len(texts), self.model)
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Repeated questions are common, so queries are cached too
+        key = content_hash(text)
+        cached = self.store.get_many(self.model, [key])
+        if key in cached:
+            with self._stats_lock:
+                self.hits += 1
+            return cached[key]
+        vector = self.underlying.embed_query(text)
+        self.store.put_many(self.model, {key: vector})
+        with self._stats_lock:
+            self.misses += 1
+        return vector
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "model": self.model,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 3) if total else 0.0,
+            "stored": self.store.count(self.model),
+        }
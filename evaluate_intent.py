@@ -0,0 +1,54 @@
+"""Offline check of the local intent classifier against a labelled query set.
+
+Each query in ``intent_eval_queries.json`` has the expected intent and, for
+"compare", the expected product name. A local decision is either correct,
+wrong (wrong intent or wrong product span: the LLM would have been skipped
+with a bad answer) or a fallback to the LLM. Fallbacks cost a round trip but
+are never wrong, so the number that must stay at zero is ``wrong``.
+
+Usage:
+    python evaluate_intent.py
+    python evaluate_intent.py --queries my_queries.json --threshold 0.7
+"""
+import argparse
+import json
+
+from intent_classifier import CONFIDENCE_THRESHOLD, IntentClassifier, strip_accents
+
+DEFAULT_QUERIES_PATH = "intent_eval_queries.json"
+
+
+def _same_name(found, expected) -> bool:
+    return strip_accents(found or "").strip() == strip_accents(expected or "").strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES_PATH)
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = json.load(f)["queries"]
+    classifier = IntentClassifier(threshold=args.threshold)
+
+    counts = {"correct": 0, "wrong": 0, "llm": 0}
+    for item in queries:
+        result = classifier.classify(item["query"])
+        if result is None:
+            outcome, detail = "llm", ""
+        else:
+            ok = result.intent == item["intent"] and (
+                item["intent"] != "compare" or _same_name(result.product_name, item.get("product_name")))
+            outcome = "correct" if ok else "wrong"
+            detail = f"{result.intent} {result.product_name!r} ({result.confidence:.2f} {result.source})"
+        counts[outcome] += 1
+        print(f"{outcome:<8}{item['query']!r:<50}{detail}")
+
+    total = len(queries) or 1
+    print(f"\n{len(queries)} queries, threshold={args.threshold}: "
+          + ", ".join(f"{name}={value} ({value / total:.0%})" for name, value in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Offline recall@k / latency comparison of vector, lexical and hybrid retrieval.
+
+The labelled set (``retrieval_eval_queries.json``) lists, for each query, the
+names of the products that should be retrieved. By default the catalog named in
+that file is loaded into a temporary in-memory vector store and a temporary
+FTS5 index, so the live ``chroma_data/`` and ``lexical_index.db`` are never
+touched; ``--live`` evaluates against them instead.
+
+Usage:
+    python evaluate_retrieval.py
+    python evaluate_retrieval.py --k 1 5 10 --vector-weight 1 --lexical-weight 1.5 --rrf-k 30
+    python evaluate_retrieval.py --live --queries my_queries.json
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from hybrid_retrieval import (
+    HYBRID_LEXICAL_WEIGHT,
+    HYBRID_RRF_K,
+    HYBRID_VECTOR_WEIGHT,
+    HybridRetriever,
+    LexicalIndex,
+    document_name,
+    get_lexical_index,
+    lexical_text,
+)
+
+load_dotenv()
+
+DEFAULT_QUERIES_PATH = "retrieval_eval_queries.json"
+
+
+def load_labelled_queries(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _EvalVectorStore(InMemoryVectorStore):
+    def _select_relevance_score_fn(self):
+        # InMemoryVectorStore đã trả về cosine similarity
+        return lambda score: score
+
+
+def build_offline_stores(catalog_path: str):
+    """Temporary in-memory vector store + FTS5 index over a catalog JSON file."""
+    from create_vector_database import create_documents_from_products, get_embedding_function
+
+    with open(catalog_path, "r", encoding="utf-8") as f:
+        products = json.load(f)
+    documents = create_documents_from_products(products)
+    ids = [str(i) for i in range(len(documents))]
+
+    vector_db = _EvalVectorStore(get_embedding_function())
+    vector_db.add_documents(documents, ids=ids)
+    lexical_index = LexicalIndex(os.path.join(tempfile.mkdtemp(prefix="lexical_eval_"), "lexical.db"))
+    lexical_index.add(documents, ids)
+    return vector_db, lexical_index
+
+
+def evaluate(retriever: HybridRetriever, queries: List[Dict], ks: List[int]) -> Dict:
+    recalls = {k: [] for k in ks}
+    latencies = []
+    for item in queries:
+        relevant = {lexical_text(name) for name in item["relevant"]}
+        started = time.perf_counter()
+        matches = retriever.search(item["query"], max(ks))
+        latencies.append((time.perf_counter() - started) * 1000)
+        names = [lexical_text(document_name(match.document)) for match in matches]
+        for k in ks:
+            found = relevant & set(names[:k])
+            recalls[k].append(len(found) / len(relevant) if relevant else 1.0)
+    latencies.sort()
+    return {
+        "recall": {k: statistics.mean(values) for k, values in recalls.items()},
+        "latency_p50_ms": latencies[len(latencies) // 2],
+        "latency_p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES_PATH)
+    parser.add_argument("--catalog", help="catalog JSON (default: the one named in the queries file)")
+    parser.add_argument("--live", action="store_true", help="use chroma_data/ and lexical_index.db")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--vector-weight", type=float, default=HYBRID_VECTOR_WEIGHT)
+    parser.add_argument("--lexical-weight", type=float, default=HYBRID_LEXICAL_WEIGHT)
+    parser.add_argument("--rrf-k", type=int, default=HYBRID_RRF_K)
+    args = parser.parse_args()
+
+    labelled = load_labelled_queries(args.queries)
+    queries = labelled["queries"]
+    if args.live:
+        from client_registry import get_vector_db
+        vector_db, lexical_index = get_vector_db(), get_lexical_index()
+    else:
+        vector_db, lexical_index = build_offline_stores(args.catalog or labelled["catalog"])
+
+    modes = {
+        "vector": (1.0, 0.0),
+        "lexical": (0.0, 1.0),
+        "hybrid": (args.vector_weight, args.lexical_weight),
+    }
+    print(f"{len(queries)} queries, fetch_k={args.fetch_k}, rrf_k={args.rrf_k}, "
+          f"weights vector={args.vector_weight} lexical={args.lexical_weight}")
+    header = f"{'mode':<8}" + "".join(f"  recall@{k:<3}" for k in args.k) + "   p50 ms   p95 ms"
+    print(header)
+    print("-" * len(header))
+    for mode, (vector_weight, lexical_weight) in modes.items():
+        retriever = HybridRetriever(
+            vector_db=vector_db, lexical_index=lexical_index, k=max(args.k), fetch_k=args.fetch_k,
+            vector_weight=vector_weight, lexical_weight=lexical_weight, rrf_k=args.rrf_k,
+        )
+        result = evaluate(retriever, queries, args.k)
+        print(f"{mode:<8}" + "".join(f"  {result['recall'][k]:<10.3f}" for k in args.k)
+              + f"  {result['latency_p50_ms']:7.1f}  {result['latency_p95_ms']:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
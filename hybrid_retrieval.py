@@ -0,0 +1,352 @@
+"""Hybrid lexical (SQLite FTS5 BM25) + vector (Chroma) product retrieval.
+
+Pure vector similarity treats "iPhone 15 Pro Max 256GB" and "iPhone 15 128GB"
+as near neighbours, so exact model / storage tokens were often missing from
+the top 5 and the query fell through to a crawl. ``HybridRetriever`` runs two
+searches and merges them with weighted reciprocal rank fusion (RRF):
+
+  - ``LexicalIndex``: an FTS5 table over product names, ranked by ``bm25()``.
+    Names and queries are accent-stripped and "128 GB" is folded to "128gb".
+    A row must contain every model / number token of the query ("13", "s24")
+    and ``HYBRID_LEXICAL_MIN_COVERAGE`` of its other words, so a generic word
+    such as "iphone" alone does not pull half the catalog into the fusion,
+  - the Chroma store: ``similarity_search_with_relevance_scores``.
+
+Each document scores ``sum(weight / (rrf_k + rank))`` over the lists it
+appears in. Tunables (env): ``HYBRID_K`` final documents, ``HYBRID_FETCH_K``
+candidates per list, ``HYBRID_VECTOR_WEIGHT`` / ``HYBRID_LEXICAL_WEIGHT`` and
+``HYBRID_RRF_K`` and ``HYBRID_LEXICAL_MIN_COVERAGE``.
+
+The lexical index is written by ``backend.vector_indexer`` next to Chroma. To
+backfill it from an existing Chroma store run ``python hybrid_retrieval.py
+--rebuild``; ``evaluate_retrieval.py`` compares the three modes offline.
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from client_registry import EMBEDDING_BACKEND
+from intent_classifier import normalize_query
+from logger_config import get_logger
+from query_filters import QueryFilters, to_chroma_where, to_sql_conditions
+
+logger = get_logger(__name__)
+
+# Index đi cùng collection Chroma: backend hashing (offline) có Chroma riêng nên index riêng
+LEXICAL_INDEX_PATH = os.getenv(
+    "LEXICAL_INDEX_PATH", "lexical_index_offline.db" if EMBEDDING_BACKEND == "hashing" else "lexical_index.db"
+)
+HYBRID_K = int(os.getenv("HYBRID_K", "5"))
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Tỉ lệ tối thiểu các từ (không phải số / model) của câu hỏi phải có trong tên sản phẩm
+HYBRID_LEXICAL_MIN_COVERAGE = float(os.getenv("HYBRID_LEXICAL_MIN_COVERAGE", "0.6"))
+
+# "128 GB" / "1 TB" / "6.1 inch" -> một token, khớp với "128GB" trong tên sản phẩm
+_UNIT_RE = re.compile(r"\b(\d+)\s+(gb|tb|mb|mah|inch|hz|w)\b")
+_CAPACITY_RE = re.compile(r"\d+(gb|tb|mb)")
+
+
+def lexical_text(text: str) -> str:
+    """Accent-stripped, lowercase text with number+unit pairs joined."""
+    return _UNIT_RE.sub(r"\1\2", normalize_query(text))
+
+
+def _split_tokens(text: str) -> Tuple[set, set]:
+    """(model / number tokens such as "13", "s24", "m3"; the other words) of ``lexical_text``.
+
+    Capacities ("256gb") count as words: listing names often leave them out.
+    """
+    tokens = set(lexical_text(text).split())
+    numeric = {token for token in tokens if any(ch.isdigit() for ch in token) and not _CAPACITY_RE.fullmatch(token)}
+    return numeric, tokens - numeric
+
+
+def document_name(document: Document) -> str:
+    metadata = document.metadata or {}
+    name = metadata.get("name") or metadata.get("title")
+    if not name:
+        try:
+            data = json.loads(document.page_content)
+            if isinstance(data, dict):
+                name = data.get("name") or data.get("title")
+        except (ValueError, TypeError):
+            pass
+    return str(name or document.page_content[:200])
+
+
+def document_key(document: Document) -> str:
+    """Identity used to merge the two result lists (url, else id, else content)."""
+    metadata = document.metadata or {}
+    return str(metadata.get("url") or getattr(document, "id", None) or document.page_content)
+
+
+class LexicalIndex:
+    """FTS5 index over product names; stores the full document for retrieval."""
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Chỉ cột name được đánh chỉ mục; content/metadata để dựng lại Document
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+            "doc_id UNINDEXED, name, content UNINDEXED, metadata UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        # doc_id -> rowid của FTS: xoá theo rowid, không quét cả bảng FTS theo cột UNINDEXED
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS products_docs (doc_id TEXT PRIMARY KEY, fts_rowid INTEGER NOT NULL)"
+        )
+        if self._conn.execute("SELECT 1 FROM products_docs LIMIT 1").fetchone() is None:
+            # Index tạo trước khi có bảng ánh xạ: dựng ánh xạ từ các dòng FTS hiện có
+            self._conn.execute("INSERT OR REPLACE INTO products_docs SELECT doc_id, rowid FROM products_fts")
+        self._conn.commit()
+
+    def add(self, documents: Sequence[Document], ids: Optional[Sequence[str]] = None) -> int:
+        ids = list(ids) if ids else [getattr(doc, "id", None) or document_key(doc) for doc in documents]
+        rows = [
+            (doc_id, lexical_text(document_name(doc)), doc.page_content,
+             json.dumps(doc.metadata or {}, ensure_ascii=False))
+            for doc_id, doc in zip(ids, documents)
+        ]
+        with self._lock:
+            # FTS5 không có UNIQUE: xoá bản cũ cùng doc_id (theo rowid) rồi chèn (upsert)
+            for row in rows:
+                old = self._conn.execute("SELECT fts_rowid FROM products_docs WHERE doc_id = ?", (row[0],)).fetchone()
+                if old:
+                    self._conn.execute("DELETE FROM products_fts WHERE rowid = ?", old)
+                rowid = self._conn.execute("INSERT INTO products_fts VALUES (?, ?, ?, ?)", row).lastrowid
+                self._conn.execute("INSERT OR REPLACE INTO products_docs VALUES (?, ?)", (row[0], rowid))
+            self._conn.commit()
+        return len(rows)
+
+    def _known_words(self, words: set) -> set:
+        # Từ không tài liệu nào chứa thì không tính vào tỉ lệ phủ
+        return {word for word in words if self._conn.execute(
+            "SELECT 1 FROM products_fts WHERE products_fts MATCH ? LIMIT 1", ('"%s"' % word.replace('"', ''),)
+        ).fetchone()}
+
+    @staticmethod
+    def _coverage(numeric: set, words: set, name: str) -> float:
+        name_tokens = set(lexical_text(name).split())
+        if not numeric <= name_tokens:
+            return 0.0
+        return len(words & name_tokens) / len(words) if words else 1.0
+
+    def coverage(self, query: str, names: Sequence[str]) -> List[float]:
+        """Share of the query's words found in each name; 0 if a model / number token is missing.
+
+        Words that no indexed product contains ("mua", "mỏng nhẹ") are ignored.
+        """
+        numeric, words = _split_tokens(query)
+        with self._lock:
+            words = self._known_words(words)
+        return [self._coverage(numeric, words, name) for name in names]
+
+    def search(self, query: str, k: int = HYBRID_FETCH_K, filters: Optional[QueryFilters] = None,
+               min_coverage: float = HYBRID_LEXICAL_MIN_COVERAGE) -> List[Tuple[Document, float]]:
+        """BM25-ranked documents with at least ``min_coverage``; the score is ``-bm25()`` (higher is better).
+
+        A plain OR of the tokens let "apple" / "iphone" / "chính hãng" alone match
+        most of the catalog, and those rows still got rank credit in the fusion.
+        """
+        numeric, words = _split_tokens(query)
+        if not numeric and not words:
+            return []
+
+        def quote(token: str) -> str:
+            return '"%s"' % token.replace('"', '')
+
+        condition, params = to_sql_conditions(filters)
+        with self._lock:
+            words = self._known_words(words)
+            # Model / số bắt buộc (AND); các từ còn lại OR, rồi lọc theo tỉ lệ phủ ở dưới
+            clauses = [quote(token) for token in sorted(numeric)]
+            if words:
+                clauses.append("(" + " OR ".join(quote(token) for token in sorted(words)) + ")")
+            if not clauses:
+                return []
+            rows = self._conn.execute(
+                "SELECT doc_id, name, content, metadata, bm25(products_fts) AS score FROM products_fts "
+                f"WHERE products_fts MATCH ? {'AND ' + condition if condition else ''} ORDER BY score LIMIT ?",
+                (" AND ".join(clauses), *params, k * 4),
+            ).fetchall()
+        query_tokens = numeric | words
+        ranked = []
+        for doc_id, name, content, metadata, score in rows:
+            if self._coverage(numeric, words, name) < min_coverage:
+                continue
+            # Từ có trong hơn nửa catalog có bm25 ~ 0: khi hoà điểm, tên ít từ thừa ("Apple iPhone 13")
+            # đứng trước ốp lưng liệt kê hàng chục model
+            name_tokens = name.split()
+            precision = sum(token in query_tokens for token in name_tokens) / max(len(name_tokens), 1)
+            document = Document(id=doc_id, page_content=content, metadata=json.loads(metadata or "{}"))
+            ranked.append((round(-score, 3), precision, document))
+        ranked.sort(key=lambda item: (-item[0], -item[1]))
+        return [(document, score) for score, _, document in ranked[:k]]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products_fts").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM products_fts")
+            self._conn.execute("DELETE FROM products_docs")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class HybridMatch:
+    document: Document
+    score: float                              # fused RRF score
+    vector_score: Optional[float] = None      # relevance score, None if only matched lexically
+    vector_rank: Optional[int] = None
+    lexical_rank: Optional[int] = None
+    coverage: Optional[float] = None          # LexicalIndex.coverage of the query in the name
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[Sequence[Any]], weights: Sequence[float],
+                           rrf_k: int = HYBRID_RRF_K, key=document_key) -> List[Tuple[Any, float]]:
+    """Merge ranked lists: ``score(d) = sum(w / (rrf_k + rank))`` with 1-based ranks."""
+    scores: Dict[str, float] = {}
+    first: Dict[str, Any] = {}
+    for items, weight in zip(ranked_lists, weights):
+        for rank, item in enumerate(items, start=1):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + weight / (rrf_k + rank)
+            first.setdefault(item_key, item)
+    return sorted(((first[k], s) for k, s in scores.items()), key=lambda pair: -pair[1])
+
+
+class HybridRetriever(BaseRetriever):
+    """LangChain retriever fusing Chroma similarity with the FTS5 BM25 index."""
+
+    vector_db: Any = None
+    lexical_index: Any = None
+    k: int = HYBRID_K
+    fetch_k: int = HYBRID_FETCH_K
+    vector_weight: float = HYBRID_VECTOR_WEIGHT
+    lexical_weight: float = HYBRID_LEXICAL_WEIGHT
+    rrf_k: int = HYBRID_RRF_K
+
+    def search(self, query: str, k: Optional[int] = None,
+               filters: Optional[QueryFilters] = None) -> List[HybridMatch]:
+        """Fused matches; ``filters`` are applied inside both searches, not after them."""
+        k = k or self.k
+        vector_hits: List[Tuple[Document, float]] = []
+        lexical_hits: List[Tuple[Document, float]] = []
+        if self.vector_db is not None and self.vector_weight > 0:
+            where = to_chroma_where(filters)
+            try:
+                if where:
+                    vector_hits = self.vector_db.similarity_search_with_relevance_scores(
+                        query, k=self.fetch_k, filter=where
+                    )
+                else:
+                    vector_hits = self.vector_db.similarity_search_with_relevance_scores(query, k=self.fetch_k)
+            except Exception as e:
+                logger.error("Hybrid retrieval: vector search failed: %s", e)
+        if self.lexical_index is not None and self.lexical_weight > 0:
+            try:
+                lexical_hits = self.lexical_index.search(query, self.fetch_k, filters)
+            except Exception as e:
+                logger.error("Hybrid retrieval: lexical search failed: %s", e)
+
+        vector_info = {document_key(doc): (rank, score) for rank, (doc, score) in enumerate(vector_hits, start=1)}
+        lexical_rank = {document_key(doc): rank for rank, (doc, _) in enumerate(lexical_hits, start=1)}
+        # Ưu tiên Document từ Chroma (metadata đầy đủ) khi trùng khoá
+        fused = reciprocal_rank_fusion(
+            [[doc for doc, _ in vector_hits], [doc for doc, _ in lexical_hits]],
+            [self.vector_weight, self.lexical_weight],
+            self.rrf_k,
+        )
+        fused = fused[:k]
+        coverages = [None] * len(fused)
+        if self.lexical_index is not None and fused:
+            try:
+                coverages = self.lexical_index.coverage(query, [document_name(doc) for doc, _ in fused])
+            except Exception as e:
+                logger.error("Hybrid retrieval: coverage lookup failed: %s", e)
+        matches = []
+        for (document, score), coverage in zip(fused, coverages):
+            doc_key = document_key(document)
+            vector_rank, vector_score = vector_info.get(doc_key, (None, None))
+            matches.append(HybridMatch(document, score, vector_score, vector_rank, lexical_rank.get(doc_key),
+                                       coverage))
+        logger.info("Hybrid retrieval for %r: %d vector + %d lexical -> %d fused",
+                    query, len(vector_hits), len(lexical_hits), len(matches))
+        return matches
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [match.document for match in self.search(query)]
+
+
+# Module-level lexical index instance (mở lazily)
+_lexical_index: Optional[LexicalIndex] = None
+_lexical_lock = threading.Lock()
+
+
+def get_lexical_index() -> LexicalIndex:
+    global _lexical_index
+    if _lexical_index is None:
+        with _lexical_lock:
+            if _lexical_index is None:
+                _lexical_index = LexicalIndex()
+    return _lexical_index
+
+
+def get_hybrid_retriever(vector_db, **kwargs) -> HybridRetriever:
+    return HybridRetriever(vector_db=vector_db, lexical_index=get_lexical_index(), **kwargs)
+
+
+def rebuild_lexical_index(vector_db, batch_size: int = 1000) -> int:
+    """Backfill the FTS index from every document already stored in Chroma."""
+    index = get_lexical_index()
+    index.clear()
+    total, offset = 0, 0
+    while True:
+        page = vector_db.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+        ids = page.get("ids") or []
+        if not ids:
+            break
+        documents = [
+            Document(id=doc_id, page_content=content or "", metadata=metadata or {})
+            for doc_id, content, metadata in zip(ids, page["documents"], page["metadatas"])
+        ]
+        total += index.add(documents, ids)
+        offset += len(ids)
+    logger.info("Rebuilt lexical index with %d documents", total)
+    return total
+
+
+if __name__ == "__main__":
+    from client_registry import get_vector_db
+
+    if "--rebuild" in sys.argv:
+        print(f"Indexed {rebuild_lexical_index(get_vector_db())} documents into {LEXICAL_INDEX_PATH}")
+    else:
+        retriever = get_hybrid_retriever(get_vector_db())
+        for query in [arg for arg in sys.argv[1:]] or ["iphone 15 pro max 256gb"]:
+            print(f"\n== {query}")
+            for match in retriever.search(query):
+                print(f"{match.score:.4f}  vec={match.vector_rank}  lex={match.lexical_rank}  "
+                      f"cov={match.coverage if match.coverage is None else round(match.coverage, 2)}  "
+                      f"{document_name(match.document)[:80]}")
@@ -0,0 +1,362 @@
+"""Local intent classifier used before falling back to the LLM.
+
+``chatbot.process_user_query`` used to spend one ``chat_model.invoke`` round
+trip on every message just to decide between "chat" and "compare" and to pull
+out the product name. Most product queries are easy to recognise locally:
+
+  1. a brand/model lexicon (``iphone``, ``galaxy s23``, ``256gb`` ...) and
+     small-talk phrases give high-confidence decisions,
+  2. otherwise a multinomial naive Bayes model over character n-grams of the
+     accent-stripped query (trained at import time on a small seed corpus)
+     gives a probability,
+  3. results are kept in an LRU cache with a TTL keyed by the normalized
+     query, so repeated questions never reach the model or the LLM.
+
+``classify`` returns ``None`` when it is not confident enough; the caller then
+asks the LLM and stores the answer with ``remember`` so the next identical
+query is served from the cache.
+
+``QueryIntent`` is the structured output schema for that LLM fallback: one
+call returns the intent, the normalized product name, optional filters and,
+for small talk, the reply itself.
+"""
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from logger_config import get_logger
+from query_filters import QueryFilters, extract_filters
+
+logger = get_logger(__name__)
+
+INTENT_CHAT = "chat"
+INTENT_COMPARE = "compare"
+
+# Below this confidence the LLM decides instead
+CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("INTENT_CACHE_TTL", "3600"))
+
+# Brand / product-line tokens (accent-stripped, lowercase)
+BRANDS = {
+    "iphone", "ipad", "macbook", "imac", "airpods", "apple",
+    "samsung", "galaxy", "xiaomi", "redmi", "poco", "oppo", "reno", "vivo",
+    "realme", "nokia", "huawei", "honor", "oneplus", "pixel", "sony", "xperia",
+    "asus", "rog", "zenbook", "vivobook", "dell", "inspiron", "xps", "hp",
+    "lenovo", "thinkpad", "legion", "ideapad", "acer", "nitro", "msi", "lg",
+    "jbl", "marshall", "anker", "baseus", "logitech", "canon", "nikon", "fujifilm",
+    "tecno", "infinix", "itel", "masstel", "nintendo", "playstation", "ps5", "xbox",
+}
+# Generic product categories
+CATEGORIES = {
+    "dien thoai", "laptop", "may tinh", "tai nghe", "tablet", "may tinh bang",
+    "dong ho", "dong ho thong minh", "smartwatch", "loa", "chuot", "ban phim",
+    "man hinh", "tivi", "tu lanh", "may giat", "dieu hoa", "may anh", "camera", "sac du phong",
+    "cap sac", "cu sac", "op lung", "router", "o cung", "ssd", "usb",
+}
+# Words that ask for prices / shopping
+SHOPPING_WORDS = {
+    "gia", "so sanh", "mua", "tim", "re nhat", "bao nhieu", "bao nhieu tien",
+    "khuyen mai", "giam gia", "san pham", "shop", "dat hang", "order", "price",
+    "compare", "deal", "sale",
+}
+# Phrases that are clearly small talk
+CHAT_PHRASES = {
+    "xin chao", "chao ban", "chao", "hello", "hi", "hey", "cam on", "thanks",
+    "thank you", "tam biet", "bye", "ban la ai", "ban ten gi", "ban khoe khong",
+    "ban co the lam gi", "ban giup duoc gi", "hom nay the nao", "vui qua", "ok",
+    "oke", "good morning", "chuc ngu ngon", "ke chuyen", "ban bao nhieu tuoi",
+}
+# Filler stripped from the ends of an extracted product name
+FILLER_WORDS = {
+    "so", "sanh", "gia", "cua", "mua", "tim", "kiem", "cho", "toi", "minh", "em",
+    "anh", "chi", "xem", "giup", "voi", "nhe", "nha", "a", "ah", "oi", "bao",
+    "nhieu", "tien", "la", "o", "dau", "re", "nhat", "hien", "nay", "muon",
+    "can", "hay", "the", "nao", "khong", "co", "ban", "san", "pham", "hang",
+    "tot", "nen", "loai", "nao", "mot", "cai", "chiec", "con", "di", "duoc",
+    "?", "!", ".", ",",
+}
+
+_MODEL_RE = re.compile(
+    r"\b(\d{2,4}\s?(gb|tb|mah|inch|hz|w)|[a-z]{1,3}\d{1,4}[a-z]{0,3}|pro|max|plus|ultra|mini|lite|fe)\b"
+)
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_CATEGORY_WORDS = [category.split() for category in CATEGORIES]
+
+# Seed corpus for the naive Bayes model (accents are stripped before training)
+SEED_CORPUS: List[Tuple[str, str]] = [
+    (INTENT_CHAT, "xin chào"), (INTENT_CHAT, "chào bạn nhé"), (INTENT_CHAT, "bạn là ai vậy"),
+    (INTENT_CHAT, "bạn tên gì"), (INTENT_CHAT, "cảm ơn bạn nhiều"), (INTENT_CHAT, "hôm nay trời đẹp quá"),
+    (INTENT_CHAT, "kể cho tôi một câu chuyện cười"), (INTENT_CHAT, "bạn có khỏe không"),
+    (INTENT_CHAT, "tạm biệt nhé"), (INTENT_CHAT, "bạn làm được những gì"), (INTENT_CHAT, "hello"),
+    (INTENT_CHAT, "thời tiết hôm nay thế nào"), (INTENT_CHAT, "tôi buồn quá"), (INTENT_CHAT, "ok cảm ơn"),
+    (INTENT_CHAT, "bạn thích ăn gì"), (INTENT_CHAT, "mấy giờ rồi"), (INTENT_CHAT, "chúc ngủ ngon"),
+    (INTENT_CHAT, "bạn có người yêu chưa"), (INTENT_CHAT, "hướng dẫn tôi dùng trang web này"),
+    (INTENT_CHAT, "bạn được ai tạo ra"), (INTENT_CHAT, "vui quá đi"), (INTENT_CHAT, "haha hay đấy"),
+    (INTENT_COMPARE, "giá iphone 15 pro max"), (INTENT_COMPARE, "so sánh giá samsung galaxy s23"),
+    (INTENT_COMPARE, "mua laptop dell ở đâu rẻ nhất"), (INTENT_COMPARE, "tai nghe airpods pro giá bao nhiêu"),
+    (INTENT_COMPARE, "tìm điện thoại xiaomi dưới 5 triệu"), (INTENT_COMPARE, "macbook air m2 bao nhiêu tiền"),
+    (INTENT_COMPARE, "so sánh giá ipad gen 10"), (INTENT_COMPARE, "tôi muốn mua iphone 13 128gb"),
+    (INTENT_COMPARE, "đồng hồ thông minh nào tốt giá rẻ"), (INTENT_COMPARE, "giá tủ lạnh samsung"),
+    (INTENT_COMPARE, "oppo reno 10 có giá bao nhiêu"), (INTENT_COMPARE, "tìm loa bluetooth jbl"),
+    (INTENT_COMPARE, "chuột logitech giá tốt"), (INTENT_COMPARE, "máy tính bảng cho học sinh giá rẻ"),
+    (INTENT_COMPARE, "sạc dự phòng anker 20000mah"), (INTENT_COMPARE, "bàn phím cơ giá bao nhiêu"),
+    (INTENT_COMPARE, "xem giá redmi note 13"), (INTENT_COMPARE, "laptop gaming asus rog giá"),
+    (INTENT_COMPARE, "mua màn hình lg 27 inch"), (INTENT_COMPARE, "so sánh iphone 14 và iphone 15"),
+    (INTENT_COMPARE, "điện thoại vivo mới nhất giá"), (INTENT_COMPARE, "shop nào bán ps5 rẻ"),
+]
+
+
+def strip_accents(text: str) -> str:
+    """Lowercase and remove Vietnamese diacritics (``đ`` -> ``d``)."""
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+
+
+def normalize_query(text: str) -> str:
+    """Cache key: accent-stripped, punctuation-free, single-spaced."""
+    text = re.sub(r"[^\w\s]", " ", strip_accents(text or ""))
+    return " ".join(text.split())
+
+
+def _ngrams(text: str, sizes=(2, 3, 4)) -> List[str]:
+    features = []
+    for word in text.split():
+        padded = f" {word} "
+        for n in sizes:
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        features.append(f"w:{word}")
+    return features
+
+
+class NaiveBayesIntentModel:
+    """Multinomial naive Bayes over character n-grams (Laplace smoothing)."""
+
+    def __init__(self, alpha: float = 1.0, temperature: float = 8.0):
+        self.alpha = alpha
+        # Log-likelihoods are averaged per feature and scaled by ``temperature``;
+        # raw sums over dozens of correlated n-grams give absurd 0.9999 posteriors.
+        self.temperature = temperature
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._totals: Dict[str, int] = {}
+        self._docs: Dict[str, int] = {}
+        self._vocab = set()
+
+    def fit(self, samples: List[Tuple[str, str]]) -> "NaiveBayesIntentModel":
+        for label, text in samples:
+            counts = self._counts.setdefault(label, {})
+            self._docs[label] = self._docs.get(label, 0) + 1
+            for feature in _ngrams(normalize_query(text)):
+                counts[feature] = counts.get(feature, 0) + 1
+                self._totals[label] = self._totals.get(label, 0) + 1
+                self._vocab.add(feature)
+        return self
+
+    def predict_proba(self, normalized: str) -> Dict[str, float]:
+        features = _ngrams(normalized)
+        n_docs = sum(self._docs.values())
+        vocab = len(self._vocab) or 1
+        scores = {}
+        for label, counts in self._counts.items():
+            denom = self._totals[label] + self.alpha * vocab
+            likelihood = sum(math.log((counts.get(feature, 0) + self.alpha) / denom) for feature in features)
+            scores[label] = math.log(self._docs[label] / n_docs) + self.temperature * likelihood / max(len(features), 1)
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exp.values())
+        return {label: value / total for label, value in exp.items()}
+
+
+class QueryIntent(BaseModel):
+    """Structured result of the single LLM intent call"""
+
+    intent: Literal["chat", "compare"] = Field(
+        description="'chat' nếu chỉ trò chuyện; 'compare' nếu muốn tìm/xem/so sánh giá sản phẩm"
+    )
+    product_name: Optional[str] = Field(
+        None, description="Tên sản phẩm kèm đặc điểm đã chuẩn hóa, ví dụ 'iPhone 14 Pro 128GB' (chỉ khi compare)"
+    )
+    filters: QueryFilters = Field(default_factory=QueryFilters)
+    reply: Optional[str] = Field(
+        None, description="Câu trả lời tự nhiên, thân thiện cho người dùng (chỉ khi chat)"
+    )
+
+
+@dataclass
+class IntentResult:
+    intent: str
+    product_name: Optional[str]
+    confidence: float
+    source: str  # "lexicon" | "model" | "llm" (+ "cache" on cache hits)
+    filters: Optional[QueryFilters] = None
+
+
+class IntentClassifier:
+    """Lexicon + naive Bayes classifier with an LRU/TTL cache"""
+
+    def __init__(self, threshold: float = CONFIDENCE_THRESHOLD,
+                 cache_size: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.model = NaiveBayesIntentModel().fit(SEED_CORPUS)
+        self._cache: "OrderedDict[str, Tuple[float, IntentResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "cache_hits": 0, "local_hits": 0, "llm_fallbacks": 0}
+
+    # ---- cache -----------------------------------------------------------
+    def _cache_get(self, key: str) -> Optional[IntentResult]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return result
+
+    def _cache_put(self, key: str, result: IntentResult):
+        with self._lock:
+            self._cache[key] = (time.monotonic(), result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    # ---- lexicon ---------------------------------------------------------
+    @staticmethod
+    def _has_phrase(normalized: str, phrases) -> bool:
+        padded = f" {normalized} "
+        return any(f" {phrase} " in padded for phrase in phrases)
+
+    @staticmethod
+    def _category_at(plain: List[str], i: int) -> int:
+        """Number of tokens of the longest category phrase starting at ``plain[i]`` (0 if none)."""
+        return max((len(words) for words in _CATEGORY_WORDS if plain[i:i + len(words)] == words), default=0)
+
+    def extract_product_name(self, query: str) -> Optional[str]:
+        """Cut the product span out of the query, e.g. "giá iPhone 14 Pro bao nhiêu" -> "iPhone 14 Pro".
+
+        The span starts at a brand or a whole category phrase ("bạn", "ở", "cấp"
+        alone are not products) and stops at the first filler word after it.
+        """
+        tokens = _TOKEN_RE.findall(query or "")
+        plain = [strip_accents(token) for token in tokens]
+        start = next((i for i, token in enumerate(plain)
+                      if token in BRANDS or self._category_at(plain, i)), None)
+        if start is None:
+            return None
+        end = start + max(self._category_at(plain, start), 1)
+        while end < len(tokens):
+            length = self._category_at(plain, end)
+            if length:
+                end += length
+            elif plain[end] in FILLER_WORDS:
+                break
+            else:
+                end += 1
+        name = " ".join(tokens[start:end]).strip(" ?!.,")
+        return name or None
+
+    def _classify_local(self, query: str, normalized: str) -> IntentResult:
+        has_brand = any(word in BRANDS for word in normalized.split())
+        has_category = self._has_phrase(normalized, CATEGORIES)
+        has_shopping = self._has_phrase(normalized, SHOPPING_WORDS)
+        has_model = bool(_MODEL_RE.search(normalized))
+        is_chat = self._has_phrase(normalized, CHAT_PHRASES)
+
+        # Cắt "dưới 20 triệu", "trên Tiki"... khỏi câu trước khi lấy tên sản phẩm
+        filters, remainder = extract_filters(query)
+        filters = None if filters.is_empty() else filters
+        product_name = self.extract_product_name(remainder) if (has_brand or has_category) else None
+        # "apple là công ty gì" -> chỉ một tên hãng, không có từ mua sắm/model: có thể chỉ là hỏi chuyện
+        bare_brand = bool(product_name) and strip_accents(product_name) in BRANDS
+        if product_name and (has_shopping or has_model or (has_brand and not bare_brand)):
+            return IntentResult(INTENT_COMPARE, product_name, 0.95 if has_brand else 0.85, "lexicon", filters)
+        if is_chat and not (has_brand or has_category or has_shopping):
+            return IntentResult(INTENT_CHAT, None, 0.95, "lexicon")
+
+        proba = self.model.predict_proba(normalized)
+        intent = max(proba, key=proba.get)
+        confidence = proba[intent]
+        if intent == INTENT_CHAT and (has_shopping or product_name):
+            # Có từ mua sắm / tên sản phẩm nhưng model nghiêng về chat -> không chắc chắn
+            confidence = min(confidence, self.threshold - 0.01)
+        if intent == INTENT_COMPARE and bare_brand:
+            confidence = min(confidence, self.threshold - 0.01)
+        if intent == INTENT_COMPARE and not product_name:
+            # Biết là hỏi giá nhưng không cắt được tên sản phẩm -> để LLM trích xuất
+            confidence = min(confidence, self.threshold - 0.01)
+        if intent == INTENT_COMPARE:
+            return IntentResult(intent, product_name, confidence, "model", filters)
+        return IntentResult(intent, None, confidence, "model")
+
+    # ---- public API ------------------------------------------------------
+    def classify(self, query: str) -> Optional[IntentResult]:
+        """Return a confident local decision, or ``None`` to let the LLM decide."""
+        normalized = normalize_query(query)
+        self._count("queries")
+        if not normalized:
+            return None
+
+        cached = self._cache_get(normalized)
+        if cached is not None:
+            self._count("cache_hits")
+            return IntentResult(cached.intent, cached.product_name, cached.confidence,
+                                f"cache:{cached.source}", cached.filters)
+
+        result = self._classify_local(query, normalized)
+        if result.confidence >= self.threshold:
+            self._count("local_hits")
+            self._cache_put(normalized, result)
+            return result
+
+        self._count("llm_fallbacks")
+        logger.info("Intent confidence %.2f below threshold for %r; falling back to LLM",
+                    result.confidence, normalized)
+        return None
+
+    def remember(self, query: str, intent: str, product_name: Optional[str] = None,
+                 filters: Optional[QueryFilters] = None):
+        """Cache an LLM decision so the same query skips the LLM next time."""
+        normalized = normalize_query(query)
+        if normalized:
+            self._cache_put(normalized, IntentResult(intent, product_name, 1.0, "llm", filters))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cache_size"] = len(self._cache)
+        stats["llm_calls_avoided"] = stats["cache_hits"] + stats["local_hits"]
+        queries = stats["queries"] or 1
+        stats["avoided_ratio"] = round(stats["llm_calls_avoided"] / queries, 3)
+        return stats
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier() -> IntentClassifier:
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = IntentClassifier()
+        return _classifier
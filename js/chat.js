@@ -11,9 +11,10 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     let currentChatId = localStorage.getItem('current_chat_id') ? parseInt(localStorage.getItem('current_chat_id'), 10) : null;
 
+    const baseURL = 'http://localhost:8010';
+
     // --- Hàm gọi API chung ---
     async function fetchAPI(url, options = {}) {
-        const baseURL = 'http://localhost:8010';
         const fullURL = url.startsWith('http') ? url : baseURL + url;
         
         const defaultOptions = {
@@ -191,6 +192,61 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 
 
+    // --- Hàm nhận phản hồi dạng stream (server-sent events qua fetch) ---
+    // Event: status {text} (đang crawl...), token {text} (từng đoạn câu trả lời), done {message_id}
+    async function streamBotResponse(chatId, userText) {
+        const response = await fetch(`${baseURL}/conversations/${chatId}/chat/stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify({ message: userText })
+        });
+        if (!response.ok) {
+            if (response.status === 401) { logoutUser(); }
+            const errorText = await response.text();
+            throw new Error(`API Error ${response.status}: ${errorText || response.statusText}`);
+        }
+
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message bot';
+        messageDiv.innerHTML = '<div class="text"></div>';
+        const textDiv = messageDiv.querySelector('.text');
+        messagesContainer.appendChild(messageDiv);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const rawEvent of events) {
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                if (!data) continue;
+                const payload = JSON.parse(data);
+                if (eventName === 'token') {
+                    answer += payload.text;
+                    textDiv.innerHTML = answer.replace(/\n/g, '<br>');
+                } else if (eventName === 'status' && !answer) {
+                    textDiv.innerHTML = `<em>${payload.text}</em>`;
+                }
+                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            }
+        }
+        if (!answer) messageDiv.remove();
+        return answer;
+    }
+
     // --- Hàm Gửi tin nhắn ---
     async function sendMessage() {
         const userText = chatInput.value.trim();
@@ -238,16 +294,9 @@ document.addEventListener('DOMContentLoaded', async () => {
                  } else { throw new Error("Không thể tạo cuộc trò chuyện mới."); }
              }
 
-             // *** API GỬI MESSAGE & NHẬN PHẢN HỒI: /conversations/{id}/chat (POST) ***
-             const botResponseData = await fetchAPI(`/conversations/${tempChatId}/chat`, {
-                 method: 'POST',
-                 body: JSON.stringify({ message: userText }) // Backend expects { message: str }
-             });
-
-             if (botResponseData && botResponseData.response) { // API trả về { response: str, conversation_id: str, message_id: str }
-                 addMessageToUI('bot', botResponseData.response);
-             } else {
-                  console.warn("API did not return expected bot response.", botResponseData);
+             // *** API GỬI MESSAGE & NHẬN PHẢN HỒI (stream): /conversations/{id}/chat/stream (POST, SSE) ***
+             const botResponse = await streamBotResponse(tempChatId, userText);
+             if (!botResponse) {
                   addMessageToUI('bot', 'Lỗi khi nhận phản hồi từ Bot.');
              }
 
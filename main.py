@@ -2,6 +2,8 @@
 Sophie Chatbot API - Main Entry Point
 File main.py đã được tách nhỏ thành các module trong thư mục backend/
 """
+import os
+import threading
 from fastapi import FastAPI
 from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
@@ -17,6 +19,10 @@ except ImportError:
 
 # Import từ backend modules
 from backend.database import init_database
+from backend.vector_indexer import start_vector_indexer, stop_vector_indexer
+from backend.revalidator import stop_revalidator
+from backend.conversation_memory import stop_conversation_memory
+from client_registry import close_clients, warm_up_clients
 from backend.routes import auth_routes, conversation_routes, admin_routes
 from backend.routes import product_routes
 # Initialize FastAPI app
@@ -35,13 +41,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Mở client (OpenAI, Chroma) và import chatbot nền, /health trả lời được ngay
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "1") == "1"
+
+
+def _warm_up():
+    """Open the shared clients and import the chatbot so the first chat does not pay for it"""
+    warm_up_clients()
+    conversation_routes.get_chatbot()
+    logger.info("Background warm-up finished")
+
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize database, start background workers and the client warm-up"""
     init_database()
+    start_vector_indexer()
+    if WARM_UP_ON_STARTUP:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
     logger.info("FastAPI application started")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending vector index writes, drop queued re-crawls and summary folds, close client pools"""
+    stop_revalidator()
+    stop_conversation_memory()
+    stop_vector_indexer()
+    await close_clients()
+
 # Register routers
 app.include_router(auth_routes.router, tags=["Authentication"])
 app.include_router(conversation_routes.router, tags=["Conversations"])
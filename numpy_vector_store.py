@@ -0,0 +1,525 @@
+"""Memory-mapped NumPy vector store for the products catalog (alternative to Chroma).
+
+At our catalog size (tens of thousands of products) Chroma's on-disk HNSW and
+its Rust bindings cost more at startup and in resident memory than the
+approximate search saves, and on some machines the bindings do not load at
+all. ``NumpyVectorStore`` is a LangChain ``VectorStore`` that keeps:
+
+  - unit-normalized embeddings as float16 in ``vectors.npy``, opened with
+    ``mmap_mode`` so only the pages a search touches are resident and opening
+    the store is O(1),
+  - ids, documents and metadata in SQLite (``metadata.db``); ``row`` is the
+    row of the vector in ``vectors.npy`` and rows stay dense (delete moves
+    the last row into the hole),
+  - exact top-k: cosine scores via matrix products over blocks of
+    ``NUMPY_SEARCH_BATCH_ROWS`` rows (several queries at once in
+    ``search_by_vectors``), merged with ``argpartition``,
+  - optional IVF: ``build_ivf(nlist)`` runs spherical k-means, stores the
+    centroids and one list id per row; searches then score only the rows of
+    the ``NUMPY_IVF_NPROBE`` nearest lists. Rows added later are assigned to
+    their nearest centroid, so the index stays valid without a rebuild.
+
+Chroma-style ``where`` filters (as produced by ``query_filters.to_chroma_where``)
+are compiled to ``json_extract`` conditions on the metadata column, so
+filtering happens before ranking as it does in Chroma. Relevance scores use the
+same scale as ``langchain_chroma`` with its default l2 space (``1 - (2 - 2 cos)
+/ sqrt(2)`` for unit vectors), so ``RETRIEVAL_SCORE_THRESHOLD`` carries over.
+
+Select it with ``VECTOR_BACKEND=numpy`` (see ``client_registry``); migrate the
+existing data with ``python numpy_vector_store.py --import-chroma`` and
+compare both backends with ``benchmark_vector_store.py``.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Mỗi block được đổi float16 -> float32 trước khi nhân: 8192 x 1536 chiều ~ 50 MB tạm
+NUMPY_SEARCH_BATCH_ROWS = int(os.getenv("NUMPY_SEARCH_BATCH_ROWS", "8192"))
+NUMPY_IVF_NPROBE = int(os.getenv("NUMPY_IVF_NPROBE", "8"))
+INITIAL_CAPACITY = 1024
+# SQLite giới hạn số tham số mỗi câu lệnh
+SQL_CHUNK_SIZE = 500
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.db"
+CENTROIDS_FILE = "ivf_centroids.npy"
+ASSIGNMENTS_FILE = "ivf_assignments.npy"
+
+_FIELD_RE = re.compile(r"^\w+$")
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_to_sql(where: Optional[Dict], column: str = "metadata") -> Tuple[str, List]:
+    """Compile a Chroma ``where`` dict into a SQLite condition on a JSON metadata column."""
+    if not where:
+        return "", []
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(item, column) for item in value]
+            parts = [(sql, p) for sql, p in parts if sql]
+            if parts:
+                joiner = " AND " if key == "$and" else " OR "
+                clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+                params.extend(param for _, p in parts for param in p)
+            continue
+        if not _FIELD_RE.match(key):
+            raise ValueError(f"Unsupported metadata field in filter: {key!r}")
+        field = f"json_extract({column}, '$.{key}')"
+        operators = value if isinstance(value, dict) else {"$eq": value}
+        for operator, operand in operators.items():
+            if operator in _COMPARISONS:
+                clauses.append(f"{field} {_COMPARISONS[operator]} ?")
+                params.append(operand)
+            elif operator in ("$in", "$nin"):
+                operand = list(operand)
+                if not operand:
+                    clauses.append("0" if operator == "$in" else "1")
+                    continue
+                placeholders = ",".join("?" * len(operand))
+                clauses.append(f"{field} {'IN' if operator == '$in' else 'NOT IN'} ({placeholders})")
+                params.extend(operand)
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator!r}")
+    return " AND ".join(clauses), params
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _merge_top_k(best_scores: np.ndarray, best_rows: np.ndarray, scores: np.ndarray,
+                 rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the k highest scores per query from the running best and a new block."""
+    all_scores = np.concatenate([best_scores, scores], axis=1)
+    all_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+    if all_scores.shape[1] > k:
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        all_scores = np.take_along_axis(all_scores, top, axis=1)
+        all_rows = np.take_along_axis(all_rows, top, axis=1)
+    return all_scores, all_rows
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact (or IVF) cosine search over a float16 memmap, metadata in SQLite."""
+
+    def __init__(self, path: str, embedding_function: Optional[Embeddings] = None,
+                 nprobe: int = NUMPY_IVF_NPROBE, search_batch_rows: int = NUMPY_SEARCH_BATCH_ROWS):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._embedding = embedding_function
+        self.nprobe = nprobe
+        self.search_batch_rows = search_batch_rows
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, METADATA_FILE), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, document TEXT, metadata TEXT)"
+        )
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        self._vectors: Optional[np.memmap] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.memmap] = None
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        if os.path.exists(vectors_path):
+            self._vectors = np.load(vectors_path, mmap_mode="r+")
+        if os.path.exists(os.path.join(path, CENTROIDS_FILE)):
+            self._centroids = np.load(os.path.join(path, CENTROIDS_FILE))
+            self._assignments = np.load(os.path.join(path, ASSIGNMENTS_FILE), mmap_mode="r+")
+
+    # ---- LangChain VectorStore interface ----
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def count(self) -> int:
+        return self._count
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        if self._embedding is None:
+            raise ValueError("NumpyVectorStore needs an embedding_function to add texts")
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        return self.upsert_embeddings(ids, vectors, texts, metadatas)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            for doc_id in ids:
+                row = self._conn.execute("SELECT row FROM records WHERE id = ?", (doc_id,)).fetchone()
+                if row is None:
+                    continue
+                row, last = row[0], self._count - 1
+                self._conn.execute("DELETE FROM records WHERE row = ?", (row,))
+                if row != last:
+                    # Giữ các row liên tục: chuyển row cuối vào chỗ trống
+                    self._vectors[row] = self._vectors[last]
+                    if self._assignments is not None:
+                        self._assignments[row] = self._assignments[last]
+                    self._conn.execute("UPDATE records SET row = ? WHERE row = ?", (row, last))
+                self._count -= 1
+            self._conn.commit()
+            self._lists = None
+        return True
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Documents with their cosine similarity (higher is better)."""
+        if self._embedding is None:
+            raise ValueError("NumpyVectorStore needs an embedding_function to search by text")
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search_with_score_by_vector(self, embedding: Sequence[float], k: int = 4,
+                                               filter: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        # Một lần giữ lock cho cả chấm điểm và tra document: delete() không được chuyển row ở giữa
+        with self._lock:
+            hits = self.search_by_vectors([embedding], k, filter)[0]
+            documents = self._documents_for_rows([row for row, _ in hits])
+        return [(documents[row], score) for row, score in hits if row in documents]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Cùng thang điểm với langchain_chroma (l2 trên vector đơn vị): ngưỡng retrieval dùng lại được.
+        # float16 đẩy cosine của bản khớp chính xác lên 1.0004: kẹp về [-1, 1], điểm về [0, 1]
+        def relevance(cosine: float) -> float:
+            cosine = min(1.0, max(-1.0, cosine))
+            return min(1.0, max(0.0, 1.0 - (2.0 - 2.0 * cosine) / math.sqrt(2)))
+
+        return relevance
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, path: str = "numpy_data", **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(path, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    # ---- Storage ----
+
+    def _unmap(self, name: str):
+        """Flush and unmap ``self.<name>`` so its file can be replaced (Windows refuses while mapped)."""
+        array = getattr(self, name)
+        setattr(self, name, None)
+        if array is None:
+            return
+        array.flush()
+        handle = array._mmap
+        del array
+        if handle is not None:
+            handle.close()
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        if self._vectors is not None and self._vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match the store ({self._vectors.shape[1]})")
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, INITIAL_CAPACITY)
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        tmp_path = vectors_path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(capacity, dim))
+        if self._vectors is not None:
+            grown[:len(self._vectors)] = self._vectors
+        grown.flush()
+        del grown
+        self._unmap("_vectors")
+        os.replace(tmp_path, vectors_path)
+        self._vectors = np.load(vectors_path, mmap_mode="r+")
+        if self._assignments is not None:
+            assignments_path = os.path.join(self.path, ASSIGNMENTS_FILE)
+            grown = np.lib.format.open_memmap(assignments_path + ".tmp", mode="w+", dtype=np.int32, shape=(capacity,))
+            grown[:len(self._assignments)] = self._assignments
+            grown.flush()
+            del grown
+            self._unmap("_assignments")
+            os.replace(assignments_path + ".tmp", assignments_path)
+            self._assignments = np.load(assignments_path, mmap_mode="r+")
+
+    def upsert_embeddings(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+                          documents: Optional[Sequence[str]] = None,
+                          metadatas: Optional[Sequence[Optional[dict]]] = None) -> List[str]:
+        """Insert or replace records with precomputed embeddings (last one wins for repeated ids)."""
+        ids = list(ids)
+        if not ids:
+            return []
+        documents = list(documents) if documents is not None else [""] * len(ids)
+        metadatas = list(metadatas) if metadatas is not None else [{}] * len(ids)
+        latest = {doc_id: i for i, doc_id in enumerate(ids)}
+        order = list(latest.values())
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32)[order])
+        unique_ids = [ids[i] for i in order]
+        with self._lock:
+            existing: Dict[str, int] = {}
+            for start in range(0, len(unique_ids), SQL_CHUNK_SIZE):
+                chunk = unique_ids[start:start + SQL_CHUNK_SIZE]
+                existing.update(self._conn.execute(
+                    f"SELECT id, row FROM records WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+            rows = []
+            for doc_id in unique_ids:
+                if doc_id not in existing:
+                    existing[doc_id] = self._count
+                    self._count += 1
+                rows.append(existing[doc_id])
+            self._ensure_capacity(self._count, vectors.shape[1])
+            rows_array = np.asarray(rows)
+            self._vectors[rows_array] = vectors.astype(np.float16)
+            if self._centroids is not None:
+                self._assignments[rows_array] = np.argmax(vectors @ self._centroids.T, axis=1)
+                self._lists = None
+            self._vectors.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(row, ids[i], documents[i] or "", json.dumps(metadatas[i] or {}, ensure_ascii=False))
+                 for row, i in zip(rows, order)],
+            )
+            self._conn.commit()
+        return unique_ids
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict] = None,
+            limit: Optional[int] = None, offset: int = 0,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, List]:
+        """Chroma-compatible ``get``: records by id or filter, in row order."""
+        condition, params = where_to_sql(where)
+        clauses = [condition] if condition else []
+        if ids is not None:
+            ids = list(ids)
+            if not ids:
+                return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+            clauses.append(f"id IN ({','.join('?' * len(ids))})")
+            params = params + ids
+        sql = "SELECT row, id, document, metadata FROM records"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY row"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [-1 if limit is None else limit, offset]
+        with self._lock:
+            records = self._conn.execute(sql, params).fetchall()
+            if "embeddings" in include:
+                rows = np.asarray([record[0] for record in records], dtype=np.int64)
+                embeddings = self._vectors[rows].astype(np.float32).tolist() if len(rows) else []
+        result = {"ids": [record[1] for record in records]}
+        if "documents" in include:
+            result["documents"] = [record[2] for record in records]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(record[3] or "{}") for record in records]
+        if "embeddings" in include:
+            result["embeddings"] = embeddings
+        return result
+
+    def _documents_for_rows(self, rows: List[int]) -> Dict[int, Document]:
+        if not rows:
+            return {}
+        with self._lock:
+            records = self._conn.execute(
+                f"SELECT row, id, document, metadata FROM records WHERE row IN ({','.join('?' * len(rows))})",
+                [int(row) for row in rows],
+            ).fetchall()
+        return {row: Document(id=doc_id, page_content=document or "", metadata=json.loads(metadata or "{}"))
+                for row, doc_id, document, metadata in records}
+
+    def _allowed_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        condition, params = where_to_sql(where)
+        if not condition:
+            return None
+        with self._lock:
+            rows = self._conn.execute(f"SELECT row FROM records WHERE {condition}", params).fetchall()
+        return np.fromiter((row for row, in rows), dtype=np.int64, count=len(rows))
+
+    # ---- Search ----
+
+    def search_by_vectors(self, queries: Sequence[Sequence[float]], k: int = 4,
+                          filter: Optional[Dict] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k ``(row, cosine)`` per query, best first.
+
+        Runs under the store lock: ``delete`` moves the last row into the hole
+        and growth swaps the memmap, so rows are only meaningful while it is held.
+        """
+        queries = _normalize(queries)
+        with self._lock:
+            return self._search(queries, k, filter)
+
+    def _search(self, queries: np.ndarray, k: int, filter: Optional[Dict]) -> List[List[Tuple[int, float]]]:
+        vectors, count = self._vectors, self._count
+        use_ivf = self._centroids is not None and self.nprobe > 0
+        if vectors is None or count == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+        allowed = self._allowed_rows(filter)
+        if allowed is not None and len(allowed) == 0:
+            return [[] for _ in range(len(queries))]
+        if use_ivf:
+            return [self._search_ivf(query, k, allowed, vectors, count) for query in queries]
+
+        k = min(k, count)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        if allowed is not None:
+            # Bộ lọc hẹp: chỉ chấm điểm các row thoả điều kiện
+            blocks = [allowed[i:i + self.search_batch_rows] for i in range(0, len(allowed), self.search_batch_rows)]
+            for rows in blocks:
+                scores = queries @ vectors[rows].astype(np.float32).T
+                best_scores, best_rows = _merge_top_k(best_scores, best_rows, scores, rows, k)
+        else:
+            for start in range(0, count, self.search_batch_rows):
+                end = min(count, start + self.search_batch_rows)
+                scores = queries @ vectors[start:end].astype(np.float32).T
+                best_scores, best_rows = _merge_top_k(best_scores, best_rows, scores, np.arange(start, end), k)
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([(int(rows[i]), float(scores[i])) for i in order if np.isfinite(scores[i])])
+        return results
+
+    def _ivf_lists(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._lists is None:
+                assignments = np.asarray(self._assignments[:count])
+                order = np.argsort(assignments, kind="stable")
+                bounds = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+                self._lists = (order, bounds)
+            return self._lists
+
+    def _search_ivf(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray],
+                    vectors: np.ndarray, count: int) -> List[Tuple[int, float]]:
+        order, bounds = self._ivf_lists(count)
+        nprobe = min(self.nprobe, len(self._centroids))
+        probes = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probes])
+        if allowed is not None:
+            rows = rows[np.isin(rows, allowed)]
+        if len(rows) == 0:
+            return []
+        rows = np.sort(rows)
+        scores = vectors[rows].astype(np.float32) @ query
+        top = np.argsort(-scores)[:k]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def build_ivf(self, nlist: int, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """Partition rows into ``nlist`` lists with spherical k-means; searches then probe ``nprobe`` lists."""
+        with self._lock:
+            count, dim = self._count, self._vectors.shape[1]
+            if count < nlist:
+                raise ValueError(f"Need at least {nlist} vectors to build {nlist} IVF lists (have {count})")
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(count, size=min(count, sample_size), replace=False))
+            sample = self._vectors[sample_rows].astype(np.float32)
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros((nlist, dim), dtype=np.float32)
+                np.add.at(sums, labels, sample)
+                empty = ~sums.any(axis=1)
+                # List rỗng: lấy lại một điểm ngẫu nhiên làm tâm
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+                centroids = _normalize(sums)
+            assignments_path = os.path.join(self.path, ASSIGNMENTS_FILE)
+            assignments = np.lib.format.open_memmap(assignments_path + ".tmp", mode="w+", dtype=np.int32,
+                                                    shape=(self._vectors.shape[0],))
+            for start in range(0, count, self.search_batch_rows):
+                end = min(count, start + self.search_batch_rows)
+                assignments[start:end] = np.argmax(self._vectors[start:end].astype(np.float32) @ centroids.T, axis=1)
+            assignments.flush()
+            del assignments
+            self._unmap("_assignments")
+            os.replace(assignments_path + ".tmp", assignments_path)
+            np.save(os.path.join(self.path, CENTROIDS_FILE), centroids)
+            self._centroids = centroids
+            self._assignments = np.load(assignments_path, mmap_mode="r+")
+            self._lists = None
+        logger.info("NumpyVectorStore: built IVF with %d lists over %d vectors", nlist, count)
+
+    def drop_ivf(self):
+        with self._lock:
+            self._unmap("_assignments")
+            for name in (CENTROIDS_FILE, ASSIGNMENTS_FILE):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+            self._centroids = self._lists = None
+
+    def close(self):
+        with self._lock:
+            self._unmap("_vectors")
+            self._unmap("_assignments")
+            self._conn.close()
+
+
+def import_from_chroma(store: NumpyVectorStore, chroma_path: str, collection_name: str = "langchain",
+                       batch_size: int = 1000) -> int:
+    """Copy every record (with its stored embedding, no API calls) from a Chroma directory."""
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=chroma_path).get_collection(collection_name)
+    total, offset = 0, 0
+    while True:
+        page = collection.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not page["ids"]:
+            break
+        store.upsert_embeddings(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+        total += len(page["ids"])
+        offset += len(page["ids"])
+    logger.info("Imported %d records from Chroma at %s into %s", total, chroma_path, store.path)
+    return total
+
+
+if __name__ == "__main__":
+    from client_registry import PRODUCTS_CHROMA_PATH, PRODUCTS_NUMPY_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=PRODUCTS_NUMPY_PATH)
+    parser.add_argument("--import-chroma", nargs="?", const=PRODUCTS_CHROMA_PATH, metavar="CHROMA_PATH",
+                        help="copy records and embeddings from Chroma")
+    parser.add_argument("--build-ivf", type=int, metavar="NLIST", help="partition into NLIST lists (0 drops IVF)")
+    args = parser.parse_args()
+
+    numpy_store = NumpyVectorStore(args.path)
+    if args.import_chroma:
+        print(f"Imported {import_from_chroma(numpy_store, args.import_chroma)} records into {args.path}")
+    if args.build_ivf is not None:
+        if args.build_ivf:
+            numpy_store.build_ivf(args.build_ivf)
+        else:
+            numpy_store.drop_ivf()
+    print(f"{numpy_store.count()} vectors in {args.path}"
+          f"{'' if numpy_store._centroids is None else f', IVF with {len(numpy_store._centroids)} lists'}")
+    numpy_store.close()
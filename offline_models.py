@@ -0,0 +1,176 @@
+"""Offline, deterministic stand-ins for the OpenAI chat and embedding models.
+
+Benchmarks and load tests of ``process_user_query`` / the chat routes used to
+need an API key and the network, and their numbers moved with OpenAI latency.
+``client_registry`` serves these instead when selected by environment:
+
+  - ``EMBEDDING_BACKEND=hashing``: ``HashingEmbeddings`` hashes word tokens and
+    character n-grams of the accent-stripped text into ``OFFLINE_EMBEDDING_DIM``
+    signed buckets (feature hashing) and L2-normalizes the result. Texts that
+    share model names / capacities land close together, which is enough for
+    retrieval and the semantic cache to behave realistically. It uses blake2b,
+    not ``hash()``, so vectors are identical across processes and runs,
+  - ``CHAT_BACKEND=scripted``: ``ScriptedChatModel`` answers without a network
+    call. It waits ``OFFLINE_CHAT_LATENCY_MS`` before the first token, then
+    emits ``OFFLINE_CHAT_TOKENS_PER_SECOND`` tokens per second (0 = no delay)
+    through ``invoke`` / ``stream`` / ``astream``. The reply text is a pure
+    function of the prompt: intent prompts get a JSON classification (also
+    via ``with_structured_output``), and other prompts get a fixed-length
+    answer that quotes the first product rows of the context.
+
+Usage:
+    CHAT_BACKEND=scripted EMBEDDING_BACKEND=hashing python benchmark_chat.py
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from typing import Any, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from intent_classifier import normalize_query
+
+OFFLINE_EMBEDDING_DIM = int(os.getenv("OFFLINE_EMBEDDING_DIM", "256"))
+OFFLINE_NGRAM_SIZE = int(os.getenv("OFFLINE_NGRAM_SIZE", "3"))
+OFFLINE_CHAT_LATENCY_MS = float(os.getenv("OFFLINE_CHAT_LATENCY_MS", "300"))
+OFFLINE_CHAT_TOKENS_PER_SECOND = float(os.getenv("OFFLINE_CHAT_TOKENS_PER_SECOND", "50"))
+OFFLINE_CHAT_REPLY_TOKENS = int(os.getenv("OFFLINE_CHAT_REPLY_TOKENS", "120"))
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashed word + character n-gram vectors of a fixed dimension."""
+
+    def __init__(self, dimension: int = OFFLINE_EMBEDDING_DIM, ngram_size: int = OFFLINE_NGRAM_SIZE):
+        self.dimension = dimension
+        self.ngram_size = ngram_size
+
+    @property
+    def model(self) -> str:
+        return f"hashing-{self.dimension}-{self.ngram_size}"
+
+    def _features(self, text: str) -> List[str]:
+        words = normalize_query(text).split()
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f" {word} "
+            features.extend(f"c:{padded[i:i + self.ngram_size]}"
+                            for i in range(max(1, len(padded) - self.ngram_size + 1)))
+        return features
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            # Bit cao quyết định dấu: các va chạm bucket triệt tiêu nhau thay vì cộng dồn
+            vector[value % self.dimension] += -1.0 if value >> 63 else 1.0
+        norm = math.sqrt(sum(x * x for x in vector))
+        return [x / norm for x in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+_QUOTED_RE = re.compile(r'"([^"]{1,200})"')
+_CONTEXT_ROW_RE = re.compile(r"^\s*\d+\s*\|.*$", re.MULTILINE)
+_CHAT_WORDS = {"xin", "chao", "hello", "hi", "cam", "on", "ban", "la", "ai", "tam", "biet", "khoe", "khong"}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model with a scripted, deterministic reply and a simulated token stream."""
+
+    first_token_latency_ms: float = OFFLINE_CHAT_LATENCY_MS
+    tokens_per_second: float = OFFLINE_CHAT_TOKENS_PER_SECOND
+    reply_tokens: int = OFFLINE_CHAT_REPLY_TOKENS
+    # Nếu có: trả lần lượt (vòng lại) thay cho câu trả lời sinh theo prompt
+    responses: Optional[List[str]] = None
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _intent_reply(self, prompt: str) -> str:
+        quoted = _QUOTED_RE.findall(prompt)
+        sentence = quoted[-1] if quoted else prompt[-200:]
+        if set(normalize_query(sentence).split()) <= _CHAT_WORDS:
+            return json.dumps({"intent": "chat", "product_name": None, "filters": {},
+                               "reply": "Chào bạn, mình là Sophie (offline). Bạn muốn tìm sản phẩm gì?"},
+                              ensure_ascii=False)
+        return json.dumps({"intent": "compare", "product_name": sentence, "filters": {}, "reply": None},
+                          ensure_ascii=False)
+
+    def _reply(self, messages: Sequence[BaseMessage]) -> str:
+        self.calls += 1
+        if self.responses:
+            return self.responses[(self.calls - 1) % len(self.responses)]
+        prompt = "\n".join(str(message.content) for message in messages)
+        if "intent" in prompt and "product_name" in prompt:
+            return self._intent_reply(prompt)
+        rows = [row.strip() for row in _CONTEXT_ROW_RE.findall(prompt)[:3]]
+        words = ("Sophie (offline) gợi ý: " + " ; ".join(rows)).split()
+        seed = int.from_bytes(hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).digest(), "little")
+        while len(words) < self.reply_tokens:
+            words.append(f"token{(seed + len(words)) % 997}")
+        return " ".join(words[:max(self.reply_tokens, 1)])
+
+    def _tokens(self, text: str) -> List[str]:
+        words = text.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text = self._reply(messages)
+        time.sleep(self.first_token_latency_ms / 1000 + self._token_delay() * len(self._tokens(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text = self._reply(messages)
+        await asyncio.sleep(self.first_token_latency_ms / 1000 + self._token_delay() * len(self._tokens(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens(self._reply(messages))
+        time.sleep(self.first_token_latency_ms / 1000)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any):
+        tokens = self._tokens(self._reply(messages))
+        await asyncio.sleep(self.first_token_latency_ms / 1000)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        """Parse the scripted JSON reply into ``schema`` (a pydantic model)."""
+
+        def parse(message: AIMessage):
+            text = str(message.content)
+            return schema.model_validate_json(text[text.index("{"):text.rindex("}") + 1])
+
+        return self | RunnableLambda(parse)
@@ -0,0 +1,93 @@
+"""Deterministic pre-ranking of crawled products before the comparison prompt.
+
+``price_comparison_chain`` used to receive every field of every crawled
+product and had to find the cheapest, the balanced and the most popular option
+itself. ``rank_products`` computes those three picks and a top-N shortlist in
+Python from the numeric price, rating, review and sold counts, so the LLM only
+words the result: prompts are smaller, generation is faster and the picks are
+reproducible.
+"""
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+try:
+    from product_record import ProductRecord, as_product_record
+except ImportError:
+    from Crawl_Data.product_record import ProductRecord, as_product_record
+
+SHORTLIST_SIZE = int(os.getenv("COMPARISON_SHORTLIST_SIZE", "8"))
+
+# Weights of the "balanced" score; price is inverted so cheaper scores higher
+PRICE_WEIGHT = 0.45
+RATING_WEIGHT = 0.30
+POPULARITY_WEIGHT = 0.25
+# Ratings backed by fewer reviews are pulled towards this prior
+RATING_PRIOR = 3.5
+RATING_PRIOR_REVIEWS = 5
+
+
+def _popularity(product: ProductRecord) -> int:
+    return (product.sold_count or 0) + (product.review_count or 0)
+
+
+def _weighted_rating(product: ProductRecord) -> float:
+    """Bayesian average so a single 5-star review does not beat 500 reviews at 4.8."""
+    reviews = product.review_count or 0
+    rating = product.rating or 0.0
+    if not rating:
+        return RATING_PRIOR * 0.8
+    return (rating * reviews + RATING_PRIOR * RATING_PRIOR_REVIEWS) / (reviews + RATING_PRIOR_REVIEWS)
+
+
+@dataclass
+class RankedProducts:
+    cheapest: Optional[ProductRecord] = None
+    balanced: Optional[ProductRecord] = None
+    popular: Optional[ProductRecord] = None
+    shortlist: List[ProductRecord] = field(default_factory=list)
+    scores: Dict[int, float] = field(default_factory=dict)  # id(record) -> balanced score
+
+    def picks(self) -> Dict[str, Optional[ProductRecord]]:
+        return {"cheapest": self.cheapest, "balanced": self.balanced, "popular": self.popular}
+
+    def to_context(self) -> str:
+        """Compact, token-budgeted table of the picks and the shortlist for the comparison prompt."""
+        from context_serializer import serialize_ranked
+        return serialize_ranked(self)
+
+
+def rank_products(products: List[Any], shortlist_size: int = SHORTLIST_SIZE) -> RankedProducts:
+    """Pick cheapest / balanced / popular and a shortlist ordered by the balanced score."""
+    records = [as_product_record(product) for product in products]
+    priced = [product for product in records if product.price and product.price > 0]
+    if not priced:
+        return RankedProducts()
+
+    min_price = min(product.price for product in priced)
+    max_price = max(product.price for product in priced)
+    max_popularity = max(_popularity(product) for product in priced)
+
+    scores: Dict[int, float] = {}
+    for product in priced:
+        price_score = 1.0 if max_price == min_price else (max_price - product.price) / (max_price - min_price)
+        rating_score = _weighted_rating(product) / 5.0
+        popularity_score = math.log1p(_popularity(product)) / math.log1p(max_popularity) if max_popularity else 0.0
+        scores[id(product)] = (PRICE_WEIGHT * price_score + RATING_WEIGHT * rating_score
+                               + POPULARITY_WEIGHT * popularity_score)
+
+    cheapest = min(priced, key=lambda p: (p.price, -_weighted_rating(p), -_popularity(p)))
+    popular = max(priced, key=lambda p: (_popularity(p), _weighted_rating(p), -p.price))
+    by_score = sorted(priced, key=lambda p: (-scores[id(p)], p.price))
+    # Prefer a balanced pick that differs from the other two when there is a choice
+    balanced = next((p for p in by_score if p is not cheapest and p is not popular), by_score[0])
+
+    shortlist: List[ProductRecord] = []
+    for product in [cheapest, balanced, popular] + by_score:
+        if product not in shortlist:
+            shortlist.append(product)
+        if len(shortlist) >= max(shortlist_size, 3):
+            break
+
+    return RankedProducts(cheapest, balanced, popular, shortlist, scores)
@@ -0,0 +1,203 @@
+"""Score-thresholded product retrieval that decides hit/miss before generation.
+
+A vector-DB miss used to be detected by running the whole
+``product_search_chain`` generation and then checking the answer for "tôi sẽ
+tìm kiếm", so every miss paid for one full LLM call before the crawl started.
+``retrieve_products`` instead takes the hybrid (BM25 + vector) candidates with
+their Chroma relevance scores and keeps only documents that
+
+  - score at least ``RETRIEVAL_SCORE_THRESHOLD``; documents found only by
+    the lexical index have no vector score and must instead contain every
+    word of the product name (``HybridMatch.coverage`` of 1),
+  - were crawled within the hard TTL (``RETRIEVAL_HARD_TTL_HOURS``),
+  - have a price and a URL, contain every model number / capacity token of
+    the product name (``iPhone 13`` never matches ``iPhone 15``), and pass the
+    user's platform / price / rating filters (pushed down into the search as
+    metadata filters, re-checked here for documents indexed without them),
+  - are not an accessory (``ACCESSORY_PHRASES``: "Ốp lưng cho iPhone 13")
+    unless the user asked for one: such listings name the phone's model
+    numbers and embed close to it, but a 45.000₫ case is not an iPhone.
+
+With at least ``RETRIEVAL_MIN_DOCS`` such documents, or one whose name
+contains every word of the product name (an exact listing), the query is a
+hit and goes to generation with exactly those documents; otherwise it goes
+straight to crawling. A hit whose documents are older than the soft TTL
+(``RETRIEVAL_SOFT_TTL_HOURS``) is marked ``stale``: the caller answers from it
+right away, shows the data age and re-crawls in the background
+(stale-while-revalidate). When a product was crawled several times only its
+most recent document is kept, so a finished re-crawl replaces the old prices.
+
+The threshold depends on the embedding model and distance function. Run
+``python product_retrieval.py "iphone 13" "tai nghe sony"`` against the live
+store to see the scores of known hits and misses and pick a cutoff between them.
+"""
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from client_registry import EMBEDDING_BACKEND
+from hybrid_retrieval import document_key, document_name, get_hybrid_retriever
+from intent_classifier import normalize_query
+from query_filters import QueryFilters
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "10"))
+# Ngưỡng phụ thuộc mô hình embedding: vector hashing (offline) cho điểm thấp hơn OpenAI
+RETRIEVAL_SCORE_THRESHOLD = float(os.getenv(
+    "RETRIEVAL_SCORE_THRESHOLD", "0.3" if EMBEDDING_BACKEND == "hashing" else "0.65"
+))
+# Quá soft TTL: vẫn trả lời ngay nhưng crawl lại nền; quá hard TTL: bỏ, phải crawl
+RETRIEVAL_SOFT_TTL_HOURS = float(os.getenv("RETRIEVAL_SOFT_TTL_HOURS", "6"))
+RETRIEVAL_HARD_TTL_HOURS = float(os.getenv("RETRIEVAL_HARD_TTL_HOURS", os.getenv("RETRIEVAL_MAX_AGE_HOURS", "72")))
+RETRIEVAL_MIN_DOCS = int(os.getenv("RETRIEVAL_MIN_DOCS", "2"))
+# Phụ kiện (bỏ dấu): chỉ giữ khi chính câu hỏi nhắc tới
+ACCESSORY_PHRASES = {
+    "op lung", "op", "bao da", "case", "kinh cuong luc", "cuong luc", "mieng dan", "dan man hinh",
+    "dan lung", "cap sac", "cu sac", "bo sac", "de sac", "sac du phong", "day deo", "gia do",
+    "phu kien", "bao ve camera",
+}
+
+
+@dataclass
+class RetrievalResult:
+    hit: bool
+    documents: List = field(default_factory=list)
+    best_score: Optional[float] = None
+    reason: str = ""
+    age_hours: Optional[float] = None  # age of the oldest kept document
+    stale: bool = False                # hit, but past the soft TTL -> revalidate
+
+
+def _numeric_tokens(text: str) -> set:
+    return {token for token in normalize_query(text).split() if any(ch.isdigit() for ch in token)}
+
+
+def _age_hours(metadata: dict, now: datetime) -> Optional[float]:
+    """Hours since the product was crawled (``timestamp``), else since it was indexed."""
+    try:
+        crawled_at = datetime.fromisoformat(str(metadata.get("timestamp") or ""))
+        if crawled_at.tzinfo is not None:
+            crawled_at = crawled_at.astimezone().replace(tzinfo=None)
+    except ValueError:
+        indexed_at = metadata.get("indexed_at")
+        if not isinstance(indexed_at, (int, float)):
+            return None
+        crawled_at = datetime.fromtimestamp(indexed_at)
+    return max(0.0, (now - crawled_at).total_seconds() / 3600)
+
+
+def format_age(hours: float) -> str:
+    if hours < 1:
+        return f"{max(1, round(hours * 60))} phút"
+    if hours < 48:
+        return f"{round(hours)} giờ"
+    return f"{round(hours / 24)} ngày"
+
+
+def _matches_filters(metadata: dict, filters: QueryFilters) -> bool:
+    price = metadata.get("price") or 0
+    if filters.min_price is not None and price < filters.min_price:
+        return False
+    if filters.max_price is not None and price > filters.max_price:
+        return False
+    if filters.platforms and str(metadata.get("platform", "")).lower() not in {p.lower() for p in filters.platforms}:
+        return False
+    if filters.min_rating is not None and (metadata.get("rating") or 0) < filters.min_rating:
+        return False
+    return True
+
+
+def _is_accessory(name: str, product_name: str) -> bool:
+    asked = f" {normalize_query(product_name)} "
+    padded = f" {normalize_query(name)} "
+    return any(f" {phrase} " in padded and f" {phrase} " not in asked for phrase in ACCESSORY_PHRASES)
+
+
+def score_documents(vector_db, question: str, k: int = RETRIEVAL_K, filters: Optional[QueryFilters] = None
+                    ) -> List[Tuple[object, Optional[float], Optional[float]]]:
+    """Hybrid candidates in fused order: (document, vector relevance score or None if lexical only, coverage)."""
+    matches = get_hybrid_retriever(vector_db).search(question, k, filters=filters)
+    return [(match.document, match.vector_score, match.coverage) for match in matches]
+
+
+def retrieve_products(vector_db, question: str, product_name: str,
+                      filters: Optional[QueryFilters] = None,
+                      threshold: float = RETRIEVAL_SCORE_THRESHOLD,
+                      soft_ttl_hours: float = RETRIEVAL_SOFT_TTL_HOURS,
+                      hard_ttl_hours: float = RETRIEVAL_HARD_TTL_HOURS,
+                      min_docs: int = RETRIEVAL_MIN_DOCS) -> RetrievalResult:
+    """Decide hit/miss from scores and metadata, without calling the LLM.
+
+    Filters are pushed down into the search, so the search text is the bare
+    product name rather than ``question`` with its filter description.
+    """
+    filters = filters or QueryFilters()
+    try:
+        scored = score_documents(vector_db, product_name or question, filters=filters)
+    except Exception as e:
+        logger.error("Vector search failed, treating as miss: %s", e)
+        return RetrievalResult(False, reason=f"search error: {e}")
+    if not scored:
+        return RetrievalResult(False, reason="empty store")
+
+    required = _numeric_tokens(product_name)
+    now = datetime.now()
+    kept, ages, exact = {}, {}, set()
+    rejected = {"score": 0, "lexical": 0, "expired": 0, "metadata": 0, "model": 0, "accessory": 0,
+                "filters": 0, "superseded": 0}
+    for document, score, coverage in scored:
+        metadata = document.metadata or {}
+        age = _age_hours(metadata, now)
+        key = document_key(document)
+        if score is not None and score < threshold:
+            rejected["score"] += 1
+        elif score is None and (coverage or 0) < 1.0:
+            # Chỉ BM25 tìm thấy: không có điểm vector để chặn, nên phải chứa đủ mọi từ của tên sản phẩm
+            rejected["lexical"] += 1
+        elif age is None or age > hard_ttl_hours:
+            rejected["expired"] += 1
+        elif not metadata.get("price") or not metadata.get("url"):
+            rejected["metadata"] += 1
+        elif not required <= _numeric_tokens(f"{metadata.get('name', '')} {document.page_content[:300]}"):
+            rejected["model"] += 1
+        elif _is_accessory(document_name(document), product_name or question):
+            rejected["accessory"] += 1
+        elif not _matches_filters(metadata, filters):
+            rejected["filters"] += 1
+        elif key in kept and ages[key] <= age:
+            rejected["superseded"] += 1
+        else:
+            # Cùng sản phẩm (url) đã crawl nhiều lần: giữ bản mới nhất, đúng thứ hạng đầu tiên
+            if key in kept:
+                rejected["superseded"] += 1
+            kept[key], ages[key] = document, age
+            if coverage is not None and coverage >= 1.0:
+                exact.add(key)
+
+    best_score = max((score for _, score, _ in scored if score is not None), default=None)
+    # Một listing khớp đủ mọi từ ("Apple iPhone 17 Pro Max") đã đủ để trả lời, không cần crawl
+    hit = len(kept) >= min_docs or bool(exact)
+    age_hours = max(ages.values()) if hit else None
+    stale = hit and age_hours > soft_ttl_hours
+    reason = f"kept {len(kept)}/{len(scored)} (rejected {rejected})"
+    logger.info("Retrieval %s for %r: best_score=%s, age=%s%s, %s", "HIT" if hit else "MISS", question,
+                "-" if best_score is None else f"{best_score:.3f}",
+                "-" if age_hours is None else f"{age_hours:.1f}h", " (stale)" if stale else "", reason)
+    return RetrievalResult(hit, list(kept.values()) if hit else [], best_score, reason, age_hours, stale)
+
+
+if __name__ == "__main__":
+    # Calibration helper: print relevance scores for sample queries
+    from client_registry import get_vector_db
+
+    db = get_vector_db()
+    for query in sys.argv[1:] or ["iphone 13 128gb"]:
+        print(f"\n== {query}")
+        for document, score, coverage in score_documents(db, query):
+            metadata = document.metadata or {}
+            print(f"{'  lex' if score is None else f'{score:.3f}'}  cov={coverage if coverage is None else round(coverage, 2)}  "
+                  f"{metadata.get('timestamp', '')[:19]}  {metadata.get('name', document.page_content[:60])}")
@@ -0,0 +1,259 @@
+"""Query filters (price range, platform, rating, freshness) and their push-down.
+
+Queries such as "iPhone dưới 20 triệu trên Tiki" used to retrieve the 5
+nearest neighbours of the whole sentence and leave the constraints to the LLM,
+so the real matches were often outside the top 5. ``extract_filters`` pulls
+the constraints out of the query with regexes (no LLM call) and returns the
+remaining text for the product name; ``to_chroma_where`` /
+``to_sql_conditions`` turn them into a Chroma ``where`` clause and an SQLite
+condition on the numeric metadata written at index time (``price``,
+``rating``, ``platform``, ``indexed_at`` epoch seconds), so retrieval only
+returns documents that satisfy them.
+
+    filters, rest = extract_filters("iPhone 15 dưới 20 triệu trên Tiki")
+    # filters.max_price == 20_000_000, filters.platforms == ["tiki"], rest == "iPhone 15"
+"""
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+# "20 triệu", "20tr", "15.5 củ", "500k", "20.000.000đ"; không khớp "128GB", "4 sao"
+_NUMBER = r"(\d{1,3}(?:[.,]\d{3})+|\d+(?:[.,]\d+)?)\s*"
+_UNIT = r"(triệu|trieu|tr|củ|cu|m|nghìn|nghin|ngàn|ngan|k|vnđ|vnd|đồng|dong|đ|d)"
+# Số không đơn vị ("dưới 20" = 20 triệu) nhưng không phải "dưới 2 năm tuổi", "dưới 6 inch"
+_NOT_PRICE_UNIT = (r"(?!\s*(?:năm|nam|tháng|thang|tuần|tuan|ngày|ngay|giờ|gio|phút|phut|tuổi|tuoi"
+                   r"|inch|gb|tb|mah|hz|kg|cm|mm|sao|người|nguoi|lần|lan)\b)")
+_AMOUNT = rf"{_NUMBER}(?:{_UNIT}|{_NOT_PRICE_UNIT})(?![\w.,])"
+# "trên 2 camera", "iphone 13-14" không phải giá: cận dưới / "tầm" / khoảng phải có đơn vị
+_AMOUNT_WITH_UNIT = rf"{_NUMBER}{_UNIT}(?![\w.,])"
+_UNITS = {
+    "triệu": 1_000_000, "trieu": 1_000_000, "tr": 1_000_000, "củ": 1_000_000, "cu": 1_000_000,
+    "m": 1_000_000, "nghìn": 1_000, "nghin": 1_000, "ngàn": 1_000, "ngan": 1_000, "k": 1_000,
+}
+
+_PRICE_WORD = r"(?:giá\s+|gia\s+|tầm\s+giá\s+|tam\s+gia\s+)?"
+_RANGE_RE = re.compile(
+    rf"(?<!\w)(?:(?:từ|tu|trong\s+khoảng|khoảng|khoang)\s+)?{_PRICE_WORD}{_AMOUNT}"
+    rf"\s*(?:-|–|đến|den|tới|toi)\s*{_AMOUNT_WITH_UNIT}"
+)
+_MAX_RE = re.compile(
+    rf"(?<!\w){_PRICE_WORD}(?:(?:dưới|duoi|tối\s+đa|toi\s+da|không\s+quá|khong\s+qua|ko\s+quá|max|"
+    rf"rẻ\s+hơn|re\s+hon|thấp\s+hơn|thap\s+hon)\s+|<=?\s*){_AMOUNT}"
+)
+_MIN_RE = re.compile(
+    rf"(?<!\w){_PRICE_WORD}(?:(?:trên|tren|hơn|hon|từ|tu|tối\s+thiểu|toi\s+thieu|ít\s+nhất|it\s+nhat|min)\s+"
+    rf"|>=?\s*){_AMOUNT_WITH_UNIT}"
+)
+_AROUND_RE = re.compile(rf"(?<!\w)(?:tầm|tam|khoảng|khoang|cỡ)\s+{_PRICE_WORD}{_AMOUNT_WITH_UNIT}")
+_RATING_RE = re.compile(
+    r"(?:(?:rating|đánh\s*giá|danh\s*gia)\s*(?:từ|tu|trên|tren|>=?)?\s*(\d(?:[.,]\d)?)(?:\s*sao)?"
+    r"|(?:từ|tu|trên|tren|>=?)?\s*(\d(?:[.,]\d)?)\s*(?:sao|star|⭐)\s*(?:trở\s*lên|tro\s*len)?)"
+)
+_AGE_RE = re.compile(
+    r"(?:trong\s*(\d+)\s*(giờ|gio|ngày|ngay|tuần|tuan)\s*(?:qua|gần\s*đây|gan\s*day)?"
+    r"|(hôm\s*nay|hom\s*nay|tuần\s*này|tuan\s*nay))"
+)
+_PLATFORM_RE = re.compile(
+    r"(?:(?:trên|tren|ở|tại|tai|của|cua|bên|ben|sàn|san)\s+)?"
+    r"\b(tiki|lazada|cellphones?|cellphone\s*s|điện\s*thoại\s*vui|dien\s*thoai\s*vui|dienthoaivui)\b"
+)
+_PLATFORMS = {"tiki": "tiki", "lazada": "lazada", "cellphone": "cellphones", "cellphones": "cellphones",
+              "dienthoaivui": "dienthoaivui"}
+
+# Khoảng "tầm 15 triệu" -> 15 triệu ± 10%
+AROUND_TOLERANCE = 0.10
+
+
+class QueryFilters(BaseModel):
+    """Ràng buộc tùy chọn người dùng nêu trong câu hỏi"""
+
+    min_price: Optional[int] = Field(None, description="Giá tối thiểu (VNĐ), nếu người dùng nêu")
+    max_price: Optional[int] = Field(None, description="Giá tối đa (VNĐ), ví dụ 'dưới 10 triệu' -> 10000000")
+    platforms: List[str] = Field(default_factory=list, description="Chỉ các sàn: tiki, lazada, cellphones, dienthoaivui")
+    min_rating: Optional[float] = Field(None, description="Rating tối thiểu (0-5)")
+    max_age_hours: Optional[float] = Field(
+        None, description="Chỉ dữ liệu cập nhật trong N giờ gần đây, ví dụ 'hôm nay' -> 24"
+    )
+
+    def is_empty(self) -> bool:
+        return (self.min_price is None and self.max_price is None and not self.platforms
+                and self.min_rating is None and self.max_age_hours is None)
+
+    def describe(self) -> str:
+        """Human-readable suffix for prompts, e.g. " (giá tối đa 10.000.000 VNĐ, sàn: tiki)"."""
+        parts = []
+        if self.min_price is not None:
+            parts.append(f"giá tối thiểu {self.min_price:,} VNĐ".replace(",", "."))
+        if self.max_price is not None:
+            parts.append(f"giá tối đa {self.max_price:,} VNĐ".replace(",", "."))
+        if self.platforms:
+            parts.append("sàn: " + ", ".join(self.platforms))
+        if self.min_rating is not None:
+            parts.append(f"rating từ {self.min_rating:g} sao")
+        if self.max_age_hours is not None:
+            parts.append(f"cập nhật trong {self.max_age_hours:g} giờ")
+        return f" ({', '.join(parts)})" if parts else ""
+
+    def merge(self, other: Optional["QueryFilters"]) -> "QueryFilters":
+        """Fill the fields not set here from ``other`` (e.g. LLM filters + regex filters)."""
+        if other is None:
+            return self
+        return QueryFilters(
+            min_price=self.min_price if self.min_price is not None else other.min_price,
+            max_price=self.max_price if self.max_price is not None else other.max_price,
+            platforms=self.platforms or other.platforms,
+            min_rating=self.min_rating if self.min_rating is not None else other.min_rating,
+            max_age_hours=self.max_age_hours if self.max_age_hours is not None else other.max_age_hours,
+        )
+
+    def apply(self, products: list) -> list:
+        """Filter ProductRecord-like objects; returns the input unchanged if nothing matches."""
+        if self.is_empty():
+            return products
+        platforms = {p.lower() for p in self.platforms}
+        kept = []
+        for product in products:
+            price = getattr(product, "price", 0) or 0
+            platform = str(getattr(getattr(product, "platform", ""), "value", getattr(product, "platform", ""))).lower()
+            if self.min_price is not None and price < self.min_price:
+                continue
+            if self.max_price is not None and price > self.max_price:
+                continue
+            if platforms and platform not in platforms:
+                continue
+            if self.min_rating is not None and (getattr(product, "rating", 0) or 0) < self.min_rating:
+                continue
+            kept.append(product)
+        return kept or products
+
+
+def parse_amount(number: str, unit: Optional[str]) -> int:
+    """VNĐ value of a matched amount; a bare number below 1000 is read as triệu."""
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", number):
+        value = float(re.sub(r"[.,]", "", number))
+    else:
+        value = float(number.replace(",", "."))
+    if unit in _UNITS:
+        return int(value * _UNITS[unit])
+    if not unit and value < 1000:
+        return int(value * 1_000_000)
+    return int(value)
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+
+
+def _cut(text: str, match: re.Match) -> str:
+    return text[:match.start()] + " " + text[match.end():]
+
+
+def extract_filters(query: str) -> Tuple[QueryFilters, str]:
+    """Return the filters found in ``query`` and the query with those phrases removed."""
+    text = (query or "").lower()
+    rest = query or ""
+    filters = QueryFilters()
+
+    def consume(pattern: re.Pattern):
+        nonlocal text, rest
+        match = pattern.search(text)
+        if match:
+            text, rest = _cut(text, match), _cut(rest, match)
+        return match
+
+    # Rating trước giá để "từ 4 sao" không bị đọc thành "từ 4 triệu"
+    match = consume(_RATING_RE)
+    if match:
+        filters.min_rating = min(5.0, float((match.group(1) or match.group(2)).replace(",", ".")))
+
+    match = consume(_AGE_RE)
+    if match:
+        if match.group(3):
+            filters.max_age_hours = 24.0 if _fold(match.group(3)).startswith("hom") else 168.0
+        else:
+            unit = _fold(match.group(2))
+            filters.max_age_hours = float(match.group(1)) * {"gio": 1, "ngay": 24, "tuan": 168}[unit]
+
+    match = consume(_RANGE_RE)
+    if match:
+        low_unit = match.group(2) or match.group(4)
+        low, high = parse_amount(match.group(1), low_unit), parse_amount(match.group(3), match.group(4))
+        filters.min_price, filters.max_price = min(low, high), max(low, high)
+    else:
+        match = consume(_MAX_RE)
+        if match:
+            filters.max_price = parse_amount(match.group(1), match.group(2))
+        match = consume(_MIN_RE)
+        if match:
+            filters.min_price = parse_amount(match.group(1), match.group(2))
+        if filters.min_price is None and filters.max_price is None:
+            match = consume(_AROUND_RE)
+            if match:
+                amount = parse_amount(match.group(1), match.group(2))
+                filters.min_price = int(amount * (1 - AROUND_TOLERANCE))
+                filters.max_price = int(amount * (1 + AROUND_TOLERANCE))
+
+    platforms = []
+    while True:
+        match = consume(_PLATFORM_RE)
+        if not match:
+            break
+        platform = _PLATFORMS.get(re.sub(r"\s+", "", _fold(match.group(1))))
+        if platform and platform not in platforms:
+            platforms.append(platform)
+    filters.platforms = platforms
+
+    rest = re.sub(r"\s+", " ", rest).strip(" ,.?!")
+    # Bỏ liên từ còn sót ở cuối ("iPhone 15 và" sau khi cắt "trên tiki")
+    rest = re.sub(r"(?:\s+(?:và|va|hoặc|hoac|trên|tren|ở|o|giá|gia))+$", "", rest, flags=re.IGNORECASE)
+    return filters, rest
+
+
+def to_chroma_where(filters: Optional[QueryFilters], now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Chroma ``where`` clause for the numeric metadata, or None when there is nothing to filter."""
+    if filters is None:
+        return None
+    conditions: List[Dict[str, Any]] = []
+    if filters.min_price is not None:
+        conditions.append({"price": {"$gte": filters.min_price}})
+    if filters.max_price is not None:
+        conditions.append({"price": {"$lte": filters.max_price}})
+    if filters.platforms:
+        conditions.append({"platform": {"$in": [p.lower() for p in filters.platforms]}})
+    if filters.min_rating is not None:
+        conditions.append({"rating": {"$gte": filters.min_rating}})
+    if filters.max_age_hours is not None:
+        now = time.time() if now is None else now
+        conditions.append({"indexed_at": {"$gte": int(now - filters.max_age_hours * 3600)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def to_sql_conditions(filters: Optional[QueryFilters], column: str = "metadata",
+                      now: Optional[float] = None) -> Tuple[str, list]:
+    """The same constraints as an SQLite condition on a JSON metadata column ("" if none)."""
+    if filters is None:
+        return "", []
+    conditions, params = [], []
+    if filters.min_price is not None:
+        conditions.append(f"json_extract({column}, '$.price') >= ?")
+        params.append(filters.min_price)
+    if filters.max_price is not None:
+        conditions.append(f"json_extract({column}, '$.price') <= ?")
+        params.append(filters.max_price)
+    if filters.platforms:
+        conditions.append(f"lower(json_extract({column}, '$.platform')) IN ({', '.join('?' for _ in filters.platforms)})")
+        params.extend(p.lower() for p in filters.platforms)
+    if filters.min_rating is not None:
+        conditions.append(f"json_extract({column}, '$.rating') >= ?")
+        params.append(filters.min_rating)
+    if filters.max_age_hours is not None:
+        now = time.time() if now is None else now
+        conditions.append(f"json_extract({column}, '$.indexed_at') >= ?")
+        params.append(int(now - filters.max_age_hours * 3600))
+    return " AND ".join(conditions), params
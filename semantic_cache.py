@@ -0,0 +1,160 @@
+"""Semantic answer cache for the product search chain.
+
+Compare traffic is dominated by a few dozen hot products asked in slightly
+different words ("iphone 15 pro 128gb giá", "giá iPhone 15 Pro 128GB"). Each
+of those used to run full retrieval plus generation. ``SemanticCache`` keeps
+recent answers together with the embedding of the question that produced
+them; a new question whose embedding has cosine similarity above
+``threshold`` with a cached one gets the cached answer back.
+
+Entries expire after ``ttl`` seconds and are dropped when the canonical item
+they belong to is re-crawled (``invalidate``), so a fresh crawl is never
+hidden behind a stale answer.
+
+Embeddings rate "iPhone 14" and "iPhone 15" as near-identical, so a hit also
+requires the numeric tokens (model numbers, capacities) of both questions to
+match.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from intent_classifier import normalize_query
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL", "1800"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+
+
+def _numeric_signature(text: str) -> frozenset:
+    return frozenset(token for token in normalize_query(text).split() if any(ch.isdigit() for ch in token))
+
+
+@dataclass
+class _Entry:
+    question: str
+    canonical: str
+    answer: str
+    created_at: float
+    signature: frozenset
+
+
+class SemanticCache:
+    """In-memory answer cache keyed by question embedding (cosine similarity)"""
+
+    def __init__(self, embed_query: Callable[[str], List[float]],
+                 threshold: float = SIMILARITY_THRESHOLD,
+                 ttl: float = CACHE_TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.embed_query = embed_query
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: List[_Entry] = []
+        self._vectors: Optional[np.ndarray] = None  # unit-normalized rows, aligned with _entries
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "invalidated": 0, "expired": 0}
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, keep: List[bool]):
+        # Caller holds the lock
+        self._entries = [entry for entry, k in zip(self._entries, keep) if k]
+        if self._vectors is not None:
+            self._vectors = self._vectors[np.asarray(keep, dtype=bool)] if self._entries else None
+
+    def _expire(self, now: float):
+        keep = [now - entry.created_at <= self.ttl for entry in self._entries]
+        expired = keep.count(False)
+        if expired:
+            self._stats["expired"] += expired
+            self._drop(keep)
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Return the cached answer for a semantically equivalent question, if any."""
+        vector = self._embed(question)
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._expire(time.time())
+            if self._vectors is not None:
+                scores = self._vectors @ vector
+                signature = _numeric_signature(question)
+                for best in np.argsort(-scores):
+                    if scores[best] < self.threshold:
+                        break
+                    entry = self._entries[int(best)]
+                    if entry.signature != signature:
+                        continue
+                    self._stats["hits"] += 1
+                    logger.info("Semantic cache hit (%.3f): %r ~ %r", float(scores[best]), question, entry.question)
+                    return entry.answer
+            self._stats["misses"] += 1
+        return None
+
+    def store(self, question: str, answer: str, canonical: Optional[str] = None):
+        """Cache ``answer``; ``canonical`` is the product the answer is about."""
+        if not answer:
+            return
+        vector = self._embed(question)
+        with self._lock:
+            self._entries.append(_Entry(question, normalize_query(canonical or question), answer,
+                                        time.time(), _numeric_signature(question)))
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            if len(self._entries) > self.max_entries:
+                overflow = len(self._entries) - self.max_entries
+                self._drop([i >= overflow for i in range(len(self._entries))])
+            self._stats["stores"] += 1
+
+    def invalidate(self, canonical: str) -> int:
+        """Drop answers about ``canonical`` (exact canonical key or semantically equal)."""
+        key = normalize_query(canonical)
+        vector = self._embed(canonical)
+        with self._lock:
+            if not self._entries:
+                return 0
+            scores = self._vectors @ vector
+            signature = _numeric_signature(canonical)
+            keep = [entry.canonical != key and (float(score) < self.threshold or entry.signature != signature)
+                    for entry, score in zip(self._entries, scores)]
+            dropped = keep.count(False)
+            if dropped:
+                self._drop(keep)
+                self._stats["invalidated"] += dropped
+                logger.info("Semantic cache invalidated %d entries for %r", dropped, canonical)
+            return dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["hit_ratio"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["threshold"] = self.threshold
+        return stats
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            from client_registry import get_embeddings
+            _semantic_cache = SemanticCache(get_embeddings().embed_query)
+        return _semantic_cache